@@ -7,6 +7,13 @@ from flask import Blueprint
 from .iocs.routes import iocs_bp
 from .reports.routes import reports_bp
 from .hunting_queries import hunting_queries_bp
+from .events import events_bp
+from .retrohunt import retrohunt_bp
+from .metrics import metrics_bp, init_metrics
+from .profiling import profiling_bp, init_profiling
+from .retrohunt.commands import retrohunt_command
+from .iocs.commands import backfill_digests_command, backfill_networks_command, backfill_hosts_command
+from .reports.commands import backfill_report_signatures_command
 
 # Create main API blueprint
 api_bp = Blueprint('api', __name__)
@@ -15,7 +22,18 @@ api_bp = Blueprint('api', __name__)
 api_bp.register_blueprint(iocs_bp)
 api_bp.register_blueprint(reports_bp)
 api_bp.register_blueprint(hunting_queries_bp)
+api_bp.register_blueprint(events_bp)
+api_bp.register_blueprint(retrohunt_bp)
+api_bp.register_blueprint(metrics_bp)
+api_bp.register_blueprint(profiling_bp)
 
 # Function to register API with the app
 def register_api(app):
-    app.register_blueprint(api_bp)
\ No newline at end of file
+    app.register_blueprint(api_bp)
+    init_metrics(app)
+    init_profiling(app)
+    app.cli.add_command(retrohunt_command)
+    app.cli.add_command(backfill_digests_command)
+    app.cli.add_command(backfill_networks_command)
+    app.cli.add_command(backfill_hosts_command)
+    app.cli.add_command(backfill_report_signatures_command)
\ No newline at end of file
@@ -0,0 +1,46 @@
+"""
+Conditional GET support backed by the data version counters.
+
+GET endpoints decorated with `versioned` emit an ETag derived from the
+version counters of the data they return, and answer a matching
+If-None-Match with 304 Not Modified before running the view at all.
+"""
+from functools import wraps
+from flask import request, make_response
+from models import DataVersion
+
+
+def compute_etag(keys):
+    """Build an ETag from the current version of each key"""
+    versions = DataVersion.current(keys)
+    return '-'.join(f'{key}.{versions[key]}' for key in keys)
+
+
+def versioned(*key_templates):
+    """Decorate a GET view with ETag / If-None-Match handling.
+
+    Args:
+        key_templates: Version keys the response depends on. They are
+            formatted with the view's URL arguments, e.g. 'ioc:{ioc_id}'.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            keys = [template.format(**kwargs) for template in key_templates]
+
+            # Read the versions before the view runs so a concurrent write can
+            # only make the ETag older than the body, never newer
+            etag = compute_etag(keys)
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,10 @@
+"""
+Server-Sent Events API module.
+"""
+from flask import Blueprint
+
+# Create blueprint for the event stream
+events_bp = Blueprint('events', __name__)
+
+# Import routes at the end to avoid circular imports
+from . import routes
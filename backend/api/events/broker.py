@@ -0,0 +1,102 @@
+"""
+In-process event fan-out for the Server-Sent Events stream.
+
+Each subscriber owns a bounded queue. Publishing never blocks: a subscriber
+whose queue is full is dropped and its stream ends, so the client's
+EventSource reconnects and refetches instead of slowing down writers.
+
+Events only reach subscribers connected to the same process. With several
+server workers each client sees the writes handled by its own worker, which
+is why clients should refetch (or use GET /api/iocs/changes) on reconnect
+and treat the stream as a hint to do so, not as the full change log.
+"""
+import itertools
+import json
+import queue
+import threading
+from typing import Any, Dict, Optional
+
+
+class Subscription:
+    """A single client's view of the event stream."""
+
+    def __init__(self, buffer_size: int):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+    def get(self, timeout: float) -> Optional[str]:
+        """Wait for the next formatted event, None on timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventBroker:
+    """Fan out published events to every current subscriber."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._ids = itertools.count(1)
+
+    def subscribe(self, buffer_size: int = 100, limit: Optional[int] = None) -> Optional[Subscription]:
+        """Add a subscriber, None if limit subscribers are already connected."""
+        subscription = Subscription(buffer_size)
+        with self._lock:
+            if limit and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def close(self):
+        """End every open stream, e.g. on shutdown so workers can exit."""
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._subscribers.clear()
+        for subscription in subscribers:
+            subscription.dropped = True
+            try:
+                subscription.queue.put_nowait(None)  # Wake the waiting stream
+            except queue.Full:
+                pass
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, event_type: str, data: Dict[str, Any]):
+        """Publish an event to all subscribers without blocking.
+
+        Args:
+            event_type: SSE event name, e.g. 'ioc.created'
+            data: JSON serializable payload
+        """
+        with self._lock:
+            if not self._subscribers:
+                return
+            event_id = next(self._ids)
+            subscribers = list(self._subscribers)
+
+        # Serialize once, however many clients are listening
+        message = f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+
+# Shared broker for this process
+broker = EventBroker()
+
+
+def publish(event_type: str, data: Dict[str, Any]):
+    """Publish an event on the shared broker."""
+    broker.publish(event_type, data)
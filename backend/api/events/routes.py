@@ -0,0 +1,40 @@
+"""
+Routes for the Server-Sent Events API.
+"""
+from flask import Response, current_app, jsonify
+from . import events_bp
+from .broker import broker
+
+
+@events_bp.route('/api/events/stream', methods=['GET'])
+def event_stream():
+    """Stream IoC and hunting query events as Server-Sent Events"""
+    # Subscribe before the response starts so no event published after the
+    # request arrived is missed
+    subscription = broker.subscribe(current_app.config['SSE_CLIENT_BUFFER'],
+                                    limit=current_app.config['SSE_MAX_STREAMS'])
+    if subscription is None:
+        # Every stream holds a server thread for as long as it is open
+        return jsonify({"error": "Too many open event streams"}), 503, {'Retry-After': '30'}
+    heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while not subscription.dropped:
+                message = subscription.get(timeout=heartbeat)
+                if subscription.dropped:
+                    break
+                # Comments keep proxies from closing an idle connection
+                yield message if message is not None else ": keepalive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # A stream closed before its first chunk never runs the finally above,
+    # and would keep counting against SSE_MAX_STREAMS
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
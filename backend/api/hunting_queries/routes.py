@@ -6,8 +6,11 @@ from models import db, HuntingQuery, IoC
 from . import hunting_queries_bp
 from utils.kql.query_generator import generate_query
 from utils.ioc.detector import detect_ioc_type, IoC_Type
+from api.conditional import versioned
+from api.events.broker import publish
 
 @hunting_queries_bp.route('/api/hunting_queries', methods=['GET'])
+@versioned('hunting_queries')
 def get_all_hunting_queries():
     """Get all hunting queries"""
     queries = HuntingQuery.query.all()
@@ -16,6 +19,7 @@ def get_all_hunting_queries():
     })
 
 @hunting_queries_bp.route('/api/hunting_queries/<int:query_id>', methods=['GET'])
+@versioned('hunting_queries')
 def get_hunting_query(query_id):
     """Get a hunting query by ID"""
     query = HuntingQuery.query.get_or_404(query_id)
@@ -60,6 +64,8 @@ def create_hunting_query():
     db.session.add(hunting_query)
     db.session.commit()
     
+    publish('query.created', {'queries': [hunting_query.to_event()]})
+    
     return jsonify({
         'message': 'Hunting query created successfully',
         'hunting_query': hunting_query.to_dict()
@@ -81,20 +87,26 @@ def update_hunting_query(query_id):
     if 'query_type' in data:
         query.query_type = data['query_type']
     
+    # Serialize before commit expires the query, saving a reload
+    db.session.flush()
+    result = query.to_dict()
     db.session.commit()
     
     return jsonify({
         'message': 'Hunting query updated successfully',
-        'hunting_query': query.to_dict()
+        'hunting_query': result
     })
 
 @hunting_queries_bp.route('/api/hunting_queries/<int:query_id>', methods=['DELETE'])
 def delete_hunting_query(query_id):
     """Delete a hunting query"""
     query = HuntingQuery.query.get_or_404(query_id)
+    ioc_id = query.ioc_id
     db.session.delete(query)
     db.session.commit()
     
+    publish('query.deleted', {'queries': [{'id': query_id, 'ioc_id': ioc_id}]})
+    
     return jsonify({
         'success': True,
         'message': f'Hunting query {query_id} deleted'
@@ -145,6 +157,8 @@ def generate_ioc_query(ioc_id):
         db.session.add(hunting_query)
         db.session.commit()
         
+        publish('query.generated', {'queries': [hunting_query.to_event()]})
+        
         return jsonify({
             'exists': False,
             'hunting_query': hunting_query.to_dict()
@@ -155,6 +169,7 @@ def generate_ioc_query(ioc_id):
         }), 500
 
 @hunting_queries_bp.route('/api/iocs/<int:ioc_id>/hunting_queries', methods=['GET'])
+@versioned('ioc:{ioc_id}')
 def get_ioc_hunting_queries(ioc_id):
     """Get all hunting queries for a specific IoC ID"""
     # Verify IoC exists
@@ -181,10 +196,12 @@ def generate_multiple_ioc_queries():
     
     # Track processed IoCs and generated queries
     generated_queries = []
+    saved_queries = []
     failed_iocs = []
     
+    iocs = IoC.get_many(ioc_ids)
     for ioc_id in ioc_ids:
-        ioc = IoC.query.get(ioc_id)
+        ioc = iocs.get(ioc_id)
         if not ioc:
             failed_iocs.append({
                 'ioc_id': ioc_id,
@@ -217,6 +234,7 @@ def generate_multiple_ioc_queries():
             )
             
             db.session.add(hunting_query)
+            saved_queries.append(hunting_query)
             generated_queries.append({
                 'ioc_id': ioc.id,
                 'query_id': hunting_query.id,
@@ -228,9 +246,14 @@ def generate_multiple_ioc_queries():
                 'reason': str(e)
             })
     
-    # Commit all changes
+    # Commit all changes, building event payloads before commit expires the objects
+    db.session.flush()
+    query_events = [q.to_event() for q in saved_queries]
     db.session.commit()
     
+    if query_events:
+        publish('query.generated', {'queries': query_events})
+    
     return jsonify({
         'generated_queries': generated_queries,
         'failed_iocs': failed_iocs,
@@ -0,0 +1,108 @@
+"""
+Change feed over the iocs table and its delete tombstones.
+
+A position in the feed is a pair of (change_version, id) high-water marks,
+one for upserted IoCs and one for tombstones, plus the iocs version it has
+seen every change up to. Clients only ever see it as an opaque cursor string.
+
+A row's change_version is the iocs data version its transaction committed.
+Writers hold that counter locked until they commit, so once version V is
+committed every row with a version up to V is visible, and no later commit
+can add a row behind a cursor handed out. Timestamps give no such guarantee:
+a long transaction commits rows stamped with its start time.
+"""
+import base64
+import binascii
+import json
+from typing import Optional
+
+from sqlalchemy import and_, or_
+from models import IoC, IoCTombstone, DataVersion
+
+STREAMS = ('upserted', 'deleted')
+
+# Stream position of a client that has seen nothing yet
+EPOCH = (0, 0)
+
+
+def encode_cursor(position: dict) -> str:
+    """Encode feed positions as an opaque URL-safe cursor."""
+    raw = json.dumps({**{key: list(position[key]) for key in STREAMS}, 'version': position['version']})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> dict:
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed."""
+    if not cursor:
+        return {**dict.fromkeys(STREAMS, EPOCH), 'version': 0}
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # Cursors from before change versions held timestamps, int() rejects them
+        position = {key: (int(raw[key][0]), int(raw[key][1])) for key in STREAMS}
+        position['version'] = int(raw['version'])
+        return position
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def _horizon() -> int:
+    """Latest committed iocs version: rows up to it are all visible."""
+    return DataVersion.current(['iocs'])['iocs']
+
+
+def _rows_after(query, version_column, id_column, position, horizon, limit):
+    """Fetch rows ordered by (version, id) strictly after position, up to limit + 1."""
+    version, row_id = position
+    query = query.filter(or_(
+        version_column > version,
+        and_(version_column == version, id_column > row_id)
+    )).filter(version_column <= horizon).order_by(version_column, id_column)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query.all()
+
+
+def changes_since(position: dict, limit: Optional[int] = None):
+    """
+    Fetch IoCs upserted and deleted after a feed position.
+
+    Args:
+        position: Output of decode_cursor
+        limit: Maximum rows per stream, None for everything
+
+    Returns:
+        Tuple of (upserted IoCs, tombstones, next cursor, has_more)
+    """
+    horizon = _horizon()
+    upserted = _rows_after(IoC.query, IoC.change_version, IoC.id,
+                           position['upserted'], horizon, limit)
+    deleted = _rows_after(IoCTombstone.query, IoCTombstone.change_version, IoCTombstone.id,
+                          position['deleted'], horizon, limit)
+    has_more = limit is not None and (len(upserted) > limit or len(deleted) > limit)
+    if limit is not None:
+        upserted, deleted = upserted[:limit], deleted[:limit]
+
+    # Advance each stream to its last returned row; an empty stream keeps its position
+    position = dict(position)
+    if upserted:
+        position['upserted'] = (upserted[-1].change_version, upserted[-1].id)
+    if deleted:
+        position['deleted'] = (deleted[-1].change_version, deleted[-1].id)
+    if not has_more:
+        position['version'] = horizon
+
+    return upserted, deleted, encode_cursor(position), has_more
+
+
+def current_cursor() -> str:
+    """Cursor positioned after every committed change, without loading any rows."""
+    horizon = _horizon()
+    position = {}
+    for key, model in (('upserted', IoC), ('deleted', IoCTombstone)):
+        latest = model.query.with_entities(model.change_version, model.id) \
+            .filter(model.change_version <= horizon) \
+            .order_by(model.change_version.desc(), model.id.desc()) \
+            .first()
+        position[key] = tuple(latest) if latest else EPOCH
+    position['version'] = horizon
+    return encode_cursor(position)
@@ -0,0 +1,109 @@
+"""
+CLI commands for IoC maintenance.
+"""
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from models import db, IoC
+from utils.ioc.digest import hash_digest, digest_hex
+from utils.ioc.index import indicator_host, to_network
+
+def _backfill(column, compute, update_sql: str, batch_size: int) -> int:
+    """
+    Walk the rows where column is NULL in id order, one committed batch at a
+    time, so a backfill can run against a live database and resume if
+    interrupted. compute(id, value) returns the update parameters or None.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(IoC.id, IoC.value) \
+            .filter(column.is_(None), IoC.id > last_id) \
+            .order_by(IoC.id).limit(batch_size).all()
+        if not rows:
+            return updated
+        last_id = rows[-1].id
+
+        params = [p for p in (compute(ioc_id, value) for ioc_id, value in rows) if p is not None]
+        if params:
+            # Plain executemany: a bulk backfill must not bump updated_at
+            db.session.execute(text(update_sql), params)
+        db.session.commit()
+        updated += len(params)
+
+
+def backfill_digests(batch_size: int = 1000) -> int:
+    """
+    Store binary digests for hash IoCs saved before the digest column existed.
+
+    Returns:
+        Number of IoCs updated
+    """
+    def compute(ioc_id, value):
+        digest = hash_digest(value)
+        if digest is None:
+            return None
+        return {'id': ioc_id, 'digest': digest, 'value': digest_hex(digest)}
+
+    return _backfill(IoC.digest, compute, 'UPDATE iocs SET digest = :digest, value = :value WHERE id = :id',
+                     batch_size)
+
+
+def backfill_networks(batch_size: int = 1000) -> int:
+    """
+    Store networks for IP and CIDR IoCs saved before the network column existed.
+
+    Returns:
+        Number of IoCs updated
+    """
+    def compute(ioc_id, value):
+        network = to_network(value)
+        if network is None:
+            return None
+        return {'id': ioc_id, 'network': network}
+
+    cast = 'CAST(:network AS cidr)' if db.engine.dialect.name == 'postgresql' else ':network'
+    return _backfill(IoC.network, compute, f'UPDATE iocs SET network = {cast} WHERE id = :id', batch_size)
+
+
+def backfill_hosts(batch_size: int = 1000) -> int:
+    """
+    Store hosts for domain, URL and email IoCs saved before they had one.
+
+    Returns:
+        Number of IoCs updated
+    """
+    def compute(ioc_id, value):
+        host = indicator_host(value)
+        if host is None:
+            return None
+        return {'id': ioc_id, 'host': host}
+
+    return _backfill(IoC.host, compute, 'UPDATE iocs SET host = :host WHERE id = :id', batch_size)
+
+
+@click.command('backfill-digests')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows updated per transaction.')
+@with_appcontext
+def backfill_digests_command(batch_size):
+    """Populate binary digests for existing MD5/SHA1/SHA256 IoCs."""
+    updated = backfill_digests(batch_size)
+    click.echo(f"Backfilled {updated} hash IoCs")
+
+
+@click.command('backfill-networks')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows updated per transaction.')
+@with_appcontext
+def backfill_networks_command(batch_size):
+    """Populate networks for existing IPv4, IPv6 and CIDR range IoCs."""
+    updated = backfill_networks(batch_size)
+    click.echo(f"Backfilled {updated} IP IoCs")
+
+
+@click.command('backfill-hosts')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows updated per transaction.')
+@with_appcontext
+def backfill_hosts_command(batch_size):
+    """Populate hosts for existing domain, URL and email IoCs."""
+    updated = backfill_hosts(batch_size)
+    click.echo(f"Backfilled {updated} domain, URL and email IoCs")
@@ -0,0 +1,67 @@
+"""
+Export the stored IoCs as binary snapshots for offline sensors.
+"""
+import io
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import or_
+
+from models import db, IoC, DataVersion
+from utils.ioc.digest import hash_digest
+from utils.ioc.snapshot import write_snapshot
+from .changes import changes_since, current_cursor, decode_cursor
+
+# Bound parameters per IN (...) clause
+SQL_CHUNK_SIZE = 5000
+
+
+def build_snapshot(since: Optional[str] = None, base_version: Optional[int] = None) -> Tuple[bytes, int]:
+    """
+    Build a full snapshot, or a delta when a change feed cursor is given.
+
+    The snapshot metadata carries the change feed cursor the next delta
+    should be requested from. A delta is stamped with the version that
+    cursor was taken at, which is the version of the snapshot it applies to.
+
+    Args:
+        since: Cursor stored in the base snapshot's metadata
+        base_version: Version of the base snapshot the client holds, checked
+            against the cursor when given
+
+    Returns:
+        Tuple of (snapshot bytes, data version)
+
+    Raises:
+        ValueError: If the cursor is malformed or does not match base_version
+    """
+    version = DataVersion.current(['iocs'])['iocs']
+    out = io.BytesIO()
+
+    if since is None:
+        # Take the cursor before reading rows: anything written meanwhile is
+        # re-sent by the next delta, which is harmless as adds are idempotent
+        cursor = current_cursor()
+        values = (value for value, in db.session.query(IoC.value).yield_per(10000))
+        write_snapshot(out, values, data_version=version,
+                       metadata={'cursor': cursor, 'generated_at': datetime.utcnow().isoformat()})
+        return out.getvalue(), version
+
+    position = decode_cursor(since)
+    if base_version is not None and base_version != position['version']:
+        raise ValueError(f"The cursor belongs to version {position['version']}, not base_version {base_version}")
+    upserted, deleted, cursor, _ = changes_since(position)
+    added = {ioc.value for ioc in upserted}
+
+    # A deleted value may still be stored under another IoC row
+    removed = {tombstone.value for tombstone in deleted} - added
+    candidates = list(removed)
+    for start in range(0, len(candidates), SQL_CHUNK_SIZE):
+        chunk = candidates[start:start + SQL_CHUNK_SIZE]
+        digests = [digest for digest in map(hash_digest, chunk) if digest is not None]
+        criterion = or_(IoC.text_value_in(chunk), IoC.digest.in_(digests))
+        removed.difference_update(value for value, in db.session.query(IoC.value).filter(criterion))
+
+    write_snapshot(out, added, data_version=version, removed=removed, base_version=position['version'],
+                   metadata={'cursor': cursor, 'generated_at': datetime.utcnow().isoformat()})
+    return out.getvalue(), version
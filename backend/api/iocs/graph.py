@@ -0,0 +1,138 @@
+"""
+IoC co-occurrence graph backed by an in-memory CooccurrenceGraph.
+
+The graph follows the 'report_iocs' data version, bumped whenever report
+membership changes. Like the indicator index it answers on its own when its
+tag is current and falls back to SQL while a stale graph is rebuilt.
+
+Report IoC sets changed through this process's session (Report.set_iocs,
+report and IoC deletes) are applied to the graph in place when they commit.
+"""
+from typing import Dict, Set
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, select
+from models import db, IoC, Report, report_iocs
+from utils.ioc.graph import CooccurrenceGraph, k_hop_neighbours
+from .lookup import IndexHolder, SQL_CHUNK_SIZE
+
+
+def _build_graph() -> CooccurrenceGraph:
+    rows = db.session.query(report_iocs.c.report_id, report_iocs.c.ioc_id).yield_per(50000)
+    return CooccurrenceGraph.build(rows)
+
+
+def _apply_graph_change(graph: CooccurrenceGraph, change: tuple):
+    """Apply a ('set', report id, ioc ids) or ('remove', report id, ioc id) change"""
+    operation, report_id, payload = change
+    if operation == 'set':
+        graph.set_report(report_id, payload)
+    else:
+        graph.remove_member(report_id, payload)
+
+
+cooccurrence_graph = IndexHolder('report_iocs', _build_graph, _apply_graph_change)
+
+
+@event.listens_for(db.session, 'before_flush')
+def _collect_removed_members(session, flush_context, instances):
+    """Deleted IoCs leave their reports, read the memberships before they go"""
+    deleted = [obj.id for obj in session.deleted if isinstance(obj, IoC)]
+    changes = session.info.setdefault('graph_changes', [])
+    if not deleted or changes is None:
+        return
+    rows = session.connection().execute(
+        select(report_iocs.c.report_id, report_iocs.c.ioc_id).where(report_iocs.c.ioc_id.in_(deleted))
+    )
+    changes.extend(('remove', report_id, ioc_id) for report_id, ioc_id in rows)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_graph_changes(session, flush_context):
+    """Record the report membership writes of this transaction"""
+    changes = session.info.setdefault('graph_changes', [])
+    if changes is None:
+        return
+    for obj in session.deleted:
+        if isinstance(obj, Report):
+            changes.append(('set', obj.id, ()))
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Report) and inspect(obj).attrs.iocs.history.has_changes():
+            changes.append(('set', obj.id, [ioc.id for ioc in obj.iocs]))
+
+    if 'report_iocs' in session.info.get('bumped_versions', ()) and 'graph_version' not in session.info:
+        session.info['graph_version'] = session.info['data_versions']['report_iocs']
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _invalidate_graph_changes(orm_execute_state):
+    """Bulk writes are not tracked, leave the graph to a full rebuild"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ in (IoC, Report):
+            orm_execute_state.session.info['graph_changes'] = None
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_graph_changes(session):
+    changes = session.info.pop('graph_changes', None)
+    version = session.info.pop('graph_version', None)
+    if changes is not None and version is not None:
+        cooccurrence_graph.apply(changes, version)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_graph_changes(session):
+    session.info.pop('graph_changes', None)
+    session.info.pop('graph_version', None)
+
+
+def _adjacency_from_database(frontier: Set[int]) -> Dict[int, Dict[int, int]]:
+    """Weighted adjacency of a frontier from a report_iocs self-join."""
+    a = report_iocs.alias('a')
+    b = report_iocs.alias('b')
+    adjacency = {}
+    ids = sorted(frontier)
+    for start in range(0, len(ids), SQL_CHUNK_SIZE):
+        rows = db.session.query(a.c.ioc_id, b.c.ioc_id, func.count()) \
+            .select_from(a) \
+            .join(b, b.c.report_id == a.c.report_id) \
+            .filter(a.c.ioc_id.in_(ids[start:start + SQL_CHUNK_SIZE]), b.c.ioc_id != a.c.ioc_id) \
+            .group_by(a.c.ioc_id, b.c.ioc_id)
+        for ioc_id, neighbour_id, shared in rows:
+            adjacency.setdefault(ioc_id, {})[neighbour_id] = shared
+    return adjacency
+
+
+def find_neighbours(ioc_id: int, hops: int, min_weight: int = 1, limit: int = 100) -> dict:
+    """
+    Find the IoCs reachable from an IoC through shared reports.
+
+    Args:
+        ioc_id: IoC to pivot from
+        hops: Largest number of hops to follow
+        min_weight: Ignore links with fewer shared reports
+        limit: Largest number of neighbours to return
+
+    Returns:
+        Dictionary with the 'neighbours' (closest and strongest first) and
+        the 'source' that answered
+    """
+    max_nodes = current_app.config['GRAPH_MAX_NODES']
+    with cooccurrence_graph.current() as graph:
+        if graph is not None:
+            source = 'index'
+            found = k_hop_neighbours(ioc_id, hops, graph.source, min_weight=min_weight, limit=limit,
+                                     max_nodes=max_nodes)
+    if graph is None:
+        source = 'database'
+        found = k_hop_neighbours(ioc_id, hops, _adjacency_from_database, min_weight=min_weight, limit=limit,
+                                 max_nodes=max_nodes)
+    ids = [neighbour_id for neighbour_id, _, _ in found]
+    iocs = {}
+    for start in range(0, len(ids), SQL_CHUNK_SIZE):
+        iocs.update((ioc.id, ioc) for ioc in IoC.query.filter(IoC.id.in_(ids[start:start + SQL_CHUNK_SIZE])))
+
+    neighbours = [{"ioc": iocs[neighbour_id].to_dict(), "hops": hop, "weight": weight}
+                  for neighbour_id, hop, weight in found if neighbour_id in iocs]
+    return {"neighbours": neighbours, "source": source}
@@ -0,0 +1,395 @@
+"""
+Batch indicator lookup backed by the in-memory IndicatorIndex.
+
+The index is tagged with the 'iocs' data version it was built from. A lookup
+first compares that tag with the current counter (one primary-key read): if
+they match the index answers on its own, otherwise the index is cold, the
+lookup falls back to a batched SQL query and a rebuild is started.
+
+Writes made through this process's session are applied to the index in
+place when they commit, so it stays warm without a rebuild. Writes from
+other processes or bulk query.update()/delete() still leave it stale.
+
+Range containment ("which stored ranges contain this address") is answered
+by a GiST index on Postgres and by the index's NetworkIndex elsewhere.
+"""
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, or_
+from models import db, IoC, Report, DataVersion, report_iocs
+from utils.ioc.detector import IoC_Type
+from utils.ioc.bktree import BKTree
+from utils.ioc.index import IndicatorIndex, HASH_TYPES, indicator_host, normalize_indicator, to_network, url_host
+from utils.ioc.ranges import covering_networks
+
+# Bound parameters per IN (...) clause, well under SQLite's variable limit
+SQL_CHUNK_SIZE = 5000
+
+ADDRESS_TYPES = (IoC_Type.IP_ADDRESS, IoC_Type.IPV6_ADDRESS)
+
+
+class IndexHolder:
+    """
+    Holds a process-wide in-memory index tagged with the data version it was
+    built from, and rebuilds it when stale.
+
+    Committed writes are applied to the live index in place, so readers go
+    through current(), which holds the same lock as apply() while they use it.
+
+    Args:
+        version_key: DataVersion key whose counter the index follows
+        build: Builds a fresh index from the database
+        apply_change: Applies one committed change tuple to the index
+    """
+
+    def __init__(self, version_key: str, build: Callable[[], Any], apply_change: Callable[[Any, tuple], None]):
+        self.version_key = version_key
+        self._build = build
+        self._apply_change = apply_change
+        self._lock = threading.Lock()
+        self.index = None
+        self.version: Optional[int] = None
+        self._building = False
+
+    def reset(self):
+        with self._lock:
+            self.index = None
+            self.version = None
+
+    @contextmanager
+    def current(self):
+        """
+        Use the index inside a with block.
+
+        Yields the index if it reflects the latest writes, else schedules a
+        rebuild and yields None. apply() waits until the block exits, so
+        readers never see a half-applied change; keep database queries out
+        of the block.
+        """
+        version = DataVersion.current([self.version_key])[self.version_key]
+        with self._lock:
+            if self.index is not None and self.version == version:
+                yield self.index
+                return
+        self._schedule_rebuild()
+        yield None
+
+    def apply(self, changes: List[tuple], version: int):
+        """
+        Apply committed writes to the index in place.
+
+        Args:
+            changes: Change tuples in write order
+            version: The version the transaction committed; the changes only
+                apply to an index tagged with the one before
+        """
+        with self._lock:
+            if self.index is None or self.version != version - 1:
+                return
+            for change in changes:
+                self._apply_change(self.index, change)
+            self.version = version
+
+    def rebuild(self):
+        """Rebuild the index from the database in the current app context."""
+        # Read the version first: writes racing the build leave the index
+        # tagged older than its contents, which only costs another rebuild
+        version = DataVersion.current([self.version_key])[self.version_key]
+        index = self._build()
+        with self._lock:
+            self.index, self.version = index, version
+
+    def _schedule_rebuild(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+
+        if not current_app.config.get('IOC_INDEX_BACKGROUND_REBUILD', True):
+            try:
+                self.rebuild()
+            finally:
+                self._building = False
+            return
+
+        app = current_app._get_current_object()
+
+        def run():
+            try:
+                with app.app_context():
+                    self.rebuild()
+            except Exception:
+                app.logger.exception('Error rebuilding %s index', self.version_key)
+            finally:
+                self._building = False
+
+        threading.Thread(target=run, name=f'{self.version_key}-index-rebuild', daemon=True).start()
+
+
+def _build_indicator_index() -> IndicatorIndex:
+    rows = db.session.query(IoC.id, IoC.value).yield_per(10000)
+    return IndicatorIndex.build(rows)
+
+
+def _apply_indicator_change(index: IndicatorIndex, change: tuple):
+    """Apply an ('add' | 'remove', ioc id, value) change"""
+    operation, ioc_id, value = change
+    if operation == 'add':
+        index.add(ioc_id, value)
+    else:
+        index.remove(ioc_id, value)
+
+
+indicator_index = IndexHolder('iocs', _build_indicator_index, _apply_indicator_change)
+
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_index_changes(session, flush_context):
+    """Record the IoC writes of this transaction for IndexHolder.apply"""
+    changes = session.info.setdefault('ioc_index_changes', [])
+    if changes is None:
+        return
+    for obj in session.deleted:
+        if isinstance(obj, IoC):
+            changes.append(('remove', obj.id, obj.value))
+    for obj in session.dirty:
+        if isinstance(obj, IoC):
+            history = inspect(obj).attrs.value.history
+            if history.deleted and history.added:
+                changes.append(('remove', obj.id, history.deleted[0]))
+                changes.append(('add', obj.id, history.added[0]))
+    for obj in session.new:
+        if isinstance(obj, IoC):
+            changes.append(('add', obj.id, obj.value))
+
+    # Runs after the models' version bump, which returned exactly the
+    # version this transaction will commit
+    if 'iocs' in session.info.get('bumped_versions', ()) and 'ioc_index_version' not in session.info:
+        session.info['ioc_index_version'] = session.info['data_versions']['iocs']
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _invalidate_index_changes(orm_execute_state):
+    """Bulk writes are not tracked, leave the index to a full rebuild"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and mapper.class_ is IoC:
+            orm_execute_state.session.info['ioc_index_changes'] = None
+
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_index_changes(session):
+    changes = session.info.pop('ioc_index_changes', None)
+    version = session.info.pop('ioc_index_version', None)
+    if changes is not None and version is not None:
+        indicator_index.apply(changes, version)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _discard_index_changes(session):
+    session.info.pop('ioc_index_changes', None)
+    session.info.pop('ioc_index_version', None)
+
+
+def _lookup_in_index(index: IndicatorIndex, normalized: Dict[str, tuple]) -> Dict[str, list]:
+    return {value: index.lookup(value) for value in normalized}
+
+
+def _lookup_in_database(normalized: Dict[str, tuple]) -> Dict[str, list]:
+    """Answer lookups with batched IN queries, mirroring IndicatorIndex.lookup."""
+    candidates = set()
+    digests = set()
+    networks = set()
+    hosts = set()
+    for value, (norm, ioc_type) in normalized.items():
+        if ioc_type in HASH_TYPES:
+            digests.add(bytes.fromhex(norm))
+            continue
+        candidates.add(norm)
+        if ioc_type in ADDRESS_TYPES:
+            # Every range containing the address, as exact network matches
+            networks.update(covering_networks(norm))
+        if ioc_type == IoC_Type.EMAIL:
+            # Stored emails are not normalized, fetch every one on the domain
+            hosts.add(indicator_host(norm))
+            continue
+        host = norm if ioc_type == IoC_Type.DOMAIN else url_host(norm) if ioc_type == IoC_Type.URL else None
+        if host:
+            # The host and its parents, matching stored domains and URL hosts
+            labels = host.split('.')
+            hosts.update('.'.join(labels[i:]) for i in range(len(labels)))
+
+    # A throwaway index over just the candidate rows keeps the matching rules
+    # identical to the warm path
+    columns = [(IoC.text_value_in, list(candidates)), (IoC.digest.in_, list(digests)),
+               (IoC.network.in_, list(networks)), (IoC.host.in_, list(hosts))]
+    rows = set()
+    for start in range(0, max(len(values) for _, values in columns), SQL_CHUNK_SIZE):
+        conditions = [criterion(values[start:start + SQL_CHUNK_SIZE])
+                      for criterion, values in columns if values[start:start + SQL_CHUNK_SIZE]]
+        rows.update(db.session.query(IoC.id, IoC.value).filter(or_(*conditions)).all())
+    return _lookup_in_index(IndicatorIndex.build(rows), normalized)
+
+
+def lookup_indicators(values: List[str]) -> dict:
+    """
+    Look up a batch of observables against the stored IoCs.
+
+    Args:
+        values: Raw, possibly defanged, observables
+
+    Returns:
+        Dictionary with 'hits', 'misses' and the 'source' that answered
+    """
+    normalized = {}
+    for value in values:
+        if isinstance(value, str) and value.strip() and value not in normalized:
+            normalized[value] = normalize_indicator(value)
+
+    with indicator_index.current() as index:
+        if index is not None:
+            source = 'index'
+            matches = _lookup_in_index(index, normalized)
+    if index is None:
+        source = 'database'
+        matches = _lookup_in_database(normalized)
+
+    hit_ids = sorted({ioc_id for hits in matches.values() for ioc_id, _, _ in hits})
+    iocs = {}
+    reports = {ioc_id: [] for ioc_id in hit_ids}
+    for start in range(0, len(hit_ids), SQL_CHUNK_SIZE):
+        chunk = hit_ids[start:start + SQL_CHUNK_SIZE]
+        iocs.update((ioc.id, ioc) for ioc in IoC.query.filter(IoC.id.in_(chunk)))
+        report_rows = db.session.query(report_iocs.c.ioc_id, Report.id, Report.name, Report.source) \
+            .join(Report, Report.id == report_iocs.c.report_id) \
+            .filter(report_iocs.c.ioc_id.in_(chunk))
+        for ioc_id, report_id, name, report_source in report_rows:
+            reports[ioc_id].append({"id": report_id, "name": name, "source": report_source})
+
+    results = []
+    misses = []
+    for value, hits in matches.items():
+        # Skip ids deleted between the index answer and the row fetch
+        hits = [hit for hit in hits if hit[0] in iocs]
+        if not hits:
+            misses.append(value)
+            continue
+        results.append({
+            "value": value,
+            "normalized": normalized[value][0],
+            "matches": [{
+                "match": kind,
+                "matched_value": matched_value,
+                "ioc": iocs[ioc_id].to_dict(),
+                "reports": reports[ioc_id]
+            } for ioc_id, kind, matched_value in hits]
+        })
+
+    return {"hits": results, "misses": misses, "source": source}
+
+
+def find_containing_networks(address: str) -> dict:
+    """
+    Find the stored IP IoCs covering an address: the address itself and
+    every CIDR range containing it.
+
+    Args:
+        address: IPv4 or IPv6 address, possibly defanged
+
+    Returns:
+        Dictionary with the normalized 'address', the 'matches' (most
+        specific first) and the 'source' that answered
+
+    Raises:
+        ValueError: If the value is not an IP address
+    """
+    normalized, ioc_type = normalize_indicator(address)
+    if ioc_type not in ADDRESS_TYPES:
+        raise ValueError(f"{address} is not an IP address")
+
+    if db.engine.dialect.name == 'postgresql':
+        source = 'database'
+        iocs = IoC.query.filter(IoC.network.op('>>=')(normalized)) \
+            .order_by(func.masklen(IoC.network).desc(), IoC.id).all()
+        matches = [{"network": ioc.network, "ioc": ioc.to_dict()} for ioc in iocs]
+        return {"address": normalized, "matches": matches, "source": source}
+
+    query = {address: (normalized, ioc_type)}
+    with indicator_index.current() as index:
+        if index is not None:
+            source = 'index'
+            hits = _lookup_in_index(index, query)[address]
+    if index is None:
+        source = 'database'
+        hits = _lookup_in_database(query)[address]
+
+    hits = [(ioc_id, to_network(matched)) for ioc_id, kind, matched in hits if kind in ('exact', 'range')]
+    iocs = {ioc.id: ioc for ioc in IoC.query.filter(IoC.id.in_([ioc_id for ioc_id, _ in hits]))}
+    matches = [{"network": network, "ioc": iocs[ioc_id].to_dict()}
+               for ioc_id, network in hits if ioc_id in iocs]
+    return {"address": normalized, "matches": matches, "source": source}
+
+
+def find_lookalikes(domains: List[str], max_distance: int, exclude_ids=(),
+                    scan_when_cold: bool = True) -> Optional[Dict[str, list]]:
+    """
+    Find stored domains within an edit distance of each given domain.
+
+    The warm index answers from its BK-tree. A cold index falls back to a
+    throwaway BK-tree over the stored domains, which costs one scan of the
+    domain rows until the rebuild finishes.
+
+    Args:
+        domains: Domains to check, possibly defanged
+        max_distance: Largest edit distance to report
+        exclude_ids: IoC ids to leave out, e.g. the IoCs being checked
+        scan_when_cold: Scan the domain rows when the index is cold; when
+            False, only schedule the rebuild and return None
+
+    Returns:
+        Dictionary of domain -> list of matches, closest first; domains that
+        are not valid domain names are left out. None if the index is cold
+        and scan_when_cold is False.
+    """
+    normalized = {}
+    for domain in domains:
+        norm, ioc_type = normalize_indicator(domain)
+        if ioc_type == IoC_Type.DOMAIN:
+            normalized[domain] = norm
+    if not normalized:
+        return {}
+
+    exclude_ids = set(exclude_ids)
+
+    def search(tree: BKTree) -> Dict[str, list]:
+        return {domain: [(distance, stored, [i for i in ids if i not in exclude_ids])
+                         for distance, stored, ids in tree.search(norm, max_distance)]
+                for domain, norm in normalized.items()}
+
+    with indicator_index.current() as index:
+        if index is not None:
+            found = search(index.domain_tree)
+    if index is None:
+        if not scan_when_cold:
+            return None
+        tree = BKTree()
+        # Domain, URL and email IoCs have a host, keep the domains
+        rows = db.session.query(IoC.id, IoC.value).filter(IoC.host.isnot(None)).yield_per(10000)
+        for ioc_id, value in rows:
+            norm, ioc_type = normalize_indicator(value)
+            if ioc_type == IoC_Type.DOMAIN:
+                tree.add(norm, ioc_id)
+        found = search(tree)
+
+    ids = {ioc_id for matches in found.values() for _, _, match_ids in matches for ioc_id in match_ids}
+    iocs = {}
+    id_list = sorted(ids)
+    for start in range(0, len(id_list), SQL_CHUNK_SIZE):
+        iocs.update((ioc.id, ioc) for ioc in IoC.query.filter(IoC.id.in_(id_list[start:start + SQL_CHUNK_SIZE])))
+
+    return {domain: [{"domain": stored, "distance": distance, "ioc": iocs[ioc_id].to_dict()}
+                     for distance, stored, match_ids in matches for ioc_id in match_ids if ioc_id in iocs]
+            for domain, matches in found.items()}
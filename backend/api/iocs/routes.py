@@ -1,11 +1,28 @@
-from flask import Blueprint, jsonify, request
-from models import db, Report, HuntingQuery, IoC
+import re
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, jsonify, request, current_app, Response
+from sqlalchemy import and_, func, select
+from sqlalchemy.orm import selectinload
+from models import db, Report, HuntingQuery, IoC, Sighting, HourlySightingRollup, DailySightingRollup, report_iocs
 from utils.ioc.defang import parse_ioc_input, refang
 from utils.ioc.detector import detect_ioc_type, get_ioc_type_name, IoC_Type
 from utils.kql.query_generator import generate_query
+from api.conditional import versioned
+from api.events.broker import publish
+from .changes import decode_cursor, changes_since
+from .export import build_snapshot
+from .lookup import lookup_indicators, find_containing_networks, find_lookalikes
+from .graph import find_neighbours
 
 iocs_bp = Blueprint('iocs', __name__)
 
+def _parse_utc(value):
+    """Naive UTC datetime from an ISO 8601 string, converting any offset"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 @iocs_bp.route('/api/iocs/detect', methods=['POST'])
 def detect_iocs():
     """Detect the type of IoCs from raw input."""
@@ -28,6 +45,7 @@ def detect_iocs():
     return jsonify({"iocs": result})
 
 @iocs_bp.route('/api/iocs', methods=['GET'])
+@versioned('iocs')
 def get_all_iocs():
     """Get all IoCs in the database."""
     iocs = IoC.query.all()
@@ -35,7 +53,46 @@ def get_all_iocs():
         "iocs": [ioc.to_dict() for ioc in iocs]
     })
 
+@iocs_bp.route('/api/iocs/changes', methods=['GET'])
+def get_ioc_changes():
+    """Get IoCs inserted, updated or deleted since a cursor."""
+    try:
+        position = decode_cursor(request.args.get('since'))
+    except ValueError:
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    limit = min(request.args.get('limit', current_app.config['CHANGES_PAGE_SIZE'], type=int),
+                current_app.config['CHANGES_PAGE_SIZE'])
+    if limit < 1:
+        return jsonify({"error": "'limit' must be positive"}), 400
+
+    upserted, deleted, next_cursor, has_more = changes_since(position, limit)
+
+    return jsonify({
+        "upserted": [ioc.to_dict() for ioc in upserted],
+        "deleted": [tombstone.to_dict() for tombstone in deleted],
+        "cursor": next_cursor,
+        "has_more": has_more
+    })
+
+@iocs_bp.route('/api/iocs/snapshot', methods=['GET'])
+@versioned('iocs')
+def get_ioc_snapshot():
+    """Export all IoCs, or the changes since a cursor, as a binary snapshot."""
+    since = request.args.get('since')
+    try:
+        data, version = build_snapshot(since, request.args.get('base_version', type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    kind = 'delta' if since else 'full'
+    return Response(data, mimetype='application/octet-stream', headers={
+        'Content-Disposition': f'attachment; filename=iocs-{version}-{kind}.snap',
+        'X-Snapshot-Version': str(version)
+    })
+
 @iocs_bp.route('/api/iocs/<int:ioc_id>', methods=['GET'])
+@versioned('ioc:{ioc_id}')
 def get_ioc_by_id(ioc_id):
     """Get an IoC by its ID."""
     ioc = IoC.query.get(ioc_id)
@@ -44,6 +101,46 @@ def get_ioc_by_id(ioc_id):
     
     return jsonify(ioc.to_dict())
 
+@iocs_bp.route('/api/iocs/<int:ioc_id>/full', methods=['GET'])
+@versioned('ioc:{ioc_id}', 'reports', 'report_iocs', 'sightings')
+def get_ioc_full(ioc_id):
+    """Get an IoC with its hunting queries, reports and sighting count.
+
+    Loaded in three statements whatever the number of related rows: the IoC
+    with a sighting total subquery, then one selectin load per relationship.
+    Pass ?queries=full for the complete hunting queries, the default summary
+    leaves out the query text.
+    """
+    detail = request.args.get('queries', 'summary')
+    if detail not in ('summary', 'full'):
+        return jsonify({"error": "'queries' must be 'summary' or 'full'"}), 400
+
+    queries_load = selectinload(IoC.hunting_query_list)
+    if detail == 'summary':
+        queries_load = queries_load.load_only(HuntingQuery.name, HuntingQuery.query_type,
+                                              HuntingQuery.ioc_id, HuntingQuery.report_id)
+    sightings = select(func.coalesce(func.sum(DailySightingRollup.count), 0)) \
+        .where(DailySightingRollup.ioc_id == IoC.id).scalar_subquery()
+    row = db.session.query(IoC, sightings) \
+        .options(queries_load,
+                 selectinload(IoC.report_list).load_only(Report.name, Report.source)) \
+        .filter(IoC.id == ioc_id).first()
+    if not row:
+        return jsonify({"error": "IoC not found"}), 404
+    ioc, sighting_count = row
+
+    if detail == 'full':
+        queries = [q.to_dict() for q in ioc.hunting_query_list]
+    else:
+        queries = [{"id": q.id, "name": q.name, "query_type": q.query_type, "report_id": q.report_id}
+                   for q in ioc.hunting_query_list]
+    return jsonify({
+        "ioc": ioc.to_dict(),
+        "hunting_queries": queries,
+        "reports": [{"id": r.id, "name": r.name, "source": r.source} for r in ioc.report_list],
+        "sightings": sighting_count
+    })
+
 @iocs_bp.route('/api/iocs', methods=['POST'])
 def add_ioc():
     """Add a new IoC to the database."""
@@ -70,19 +167,16 @@ def add_ioc():
     else:
         return jsonify({"error": "Missing 'input' or 'iocs' field"}), 400
     
-    # Process each IoC
-    added_iocs = []
-    existing_iocs = []
+    # Look up every submitted IoC at once, then create the missing ones
+    existing = IoC.find_existing(iocs_data)
+    new_iocs = []
+    found_iocs = []
+    generated_queries = []
     
     for ioc_data in iocs_data:
-        # Check if IoC already exists
-        existing_ioc = IoC.query.filter_by(
-            value=ioc_data.get('value'), 
-            type=ioc_data.get('type')
-        ).first()
-        
-        if existing_ioc:
-            existing_iocs.append(existing_ioc.to_dict())
+        key = IoC.match_key(ioc_data.get('value'), ioc_data.get('type'))
+        if key in existing:
+            found_iocs.append(existing[key])
             continue
         
         # Create new IoC
@@ -95,12 +189,17 @@ def add_ioc():
         )
         
         db.session.add(new_ioc)
-        db.session.flush()  # To get the ID of the new IoC
-        
-        added_iocs.append(new_ioc.to_dict())
-        
-        # Generate hunting query if requested
-        if data.get('generate_queries', False):
+        # A repeat later in the same batch counts as existing
+        existing[key] = new_ioc
+        new_iocs.append(new_ioc)
+    
+    db.session.flush()  # To get the IDs of the new IoCs, all in one flush
+    added_iocs = [ioc.to_dict() for ioc in new_iocs]
+    existing_iocs = [ioc.to_dict() for ioc in found_iocs]
+    
+    # Generate hunting queries if requested
+    if data.get('generate_queries', False):
+        for new_ioc in new_iocs:
             try:
                 ioc_value = new_ioc.value
                 ioc_type_str = new_ioc.type
@@ -128,15 +227,36 @@ def add_ioc():
                     query_type="kql"
                 )
                 db.session.add(hunting_query)
+                generated_queries.append(hunting_query)
             except Exception as e:
                 # Log the error but continue with the next IoC
                 print(f"Error generating query for {ioc_value}: {str(e)}")
     
+    # Flush first so event payloads can be built without reloading after commit
+    db.session.flush()
+    query_events = [q.to_event() for q in generated_queries]
     db.session.commit()
     
+    if added_iocs:
+        publish('ioc.created', {"iocs": added_iocs})
+    if query_events:
+        publish('query.generated', {"queries": query_events})
+    
+    # Flag new domains that are near neighbours of stored ones (typosquats).
+    # Only the warm index is asked: scanning every domain row on each insert
+    # is what the index is there to avoid, so a cold one reports the check
+    # as pending while it rebuilds
+    added_ids = [ioc['id'] for ioc in added_iocs]
+    lookalikes = find_lookalikes([ioc['value'] for ioc in added_iocs],
+                                 current_app.config['LOOKALIKE_DISTANCE'], exclude_ids=added_ids,
+                                 scan_when_cold=False)
+    
     return jsonify({
         "added": added_iocs,
         "existing": existing_iocs,
+        "lookalikes": [{"ioc": ioc, "matches": lookalikes[ioc['value']]}
+                       for ioc in added_iocs if lookalikes and lookalikes.get(ioc['value'])],
+        "lookalikes_pending": lookalikes is None,
         "message": f"Added {len(added_iocs)} IoCs, found {len(existing_iocs)} existing ones"
     })
 
@@ -154,10 +274,67 @@ def delete_ioc(ioc_id):
     db.session.delete(ioc)
     db.session.commit()
     
+    publish('ioc.deleted', {"ids": [ioc_id]})
+    
     return jsonify({
         "message": f"IoC with ID {ioc_id} deleted successfully"
     })
 
+def _bulk_delete_criterion(data):
+    """SQL condition for DELETE /api/iocs from its 'ids' or 'filter', raises ValueError"""
+    if ('ids' in data) == ('filter' in data):
+        raise ValueError("Provide either 'ids' or 'filter'")
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not all(isinstance(ioc_id, int) for ioc_id in ids):
+            raise ValueError("'ids' must be a list of IoC IDs")
+        return IoC.id.in_(ids)
+
+    filters = data['filter']
+    if not isinstance(filters, dict) or not filters:
+        raise ValueError("'filter' must be a non-empty object")
+    unknown = set(filters) - {'type', 'source', 'report_id', 'created_after', 'created_before'}
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+    conditions = []
+    if 'type' in filters:
+        conditions.append(IoC.type == filters['type'])
+    if 'source' in filters:
+        conditions.append(IoC.source == filters['source'])
+    if 'report_id' in filters:
+        members = select(report_iocs.c.ioc_id).where(report_iocs.c.report_id == filters['report_id'])
+        conditions.append(IoC.id.in_(members))
+    try:
+        if 'created_after' in filters:
+            conditions.append(IoC.created_at >= _parse_utc(filters['created_after']))
+        if 'created_before' in filters:
+            conditions.append(IoC.created_at < _parse_utc(filters['created_before']))
+    except (TypeError, ValueError):
+        raise ValueError("'created_after' and 'created_before' must be ISO 8601 timestamps")
+    return and_(*conditions)
+
+@iocs_bp.route('/api/iocs', methods=['DELETE'])
+def delete_iocs():
+    """Delete IoCs by ID or by filter, with their hunting queries, report links and sightings."""
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+    try:
+        criterion = _bulk_delete_criterion(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    deleted_ids = IoC.delete_many(criterion)
+    db.session.commit()
+
+    if deleted_ids:
+        publish('ioc.deleted', {"ids": deleted_ids})
+
+    return jsonify({
+        "deleted": deleted_ids,
+        "message": f"Deleted {len(deleted_ids)} IoCs"
+    })
+
 @iocs_bp.route('/api/iocs/check_duplicates', methods=['POST'])
 def check_ioc_duplicates():
     """Check if IoCs already exist in the database."""
@@ -181,11 +358,9 @@ def check_ioc_duplicates():
         return jsonify({"error": "Missing 'input' or 'iocs' field"}), 400
 
     duplicates = []
+    existing = IoC.find_existing(iocs_data)
     for ioc_data in iocs_data:
-        existing_ioc = IoC.query.filter_by(
-            value=ioc_data.get('value'),
-            type=ioc_data.get('type')
-        ).first()
+        existing_ioc = existing.get(IoC.match_key(ioc_data.get('value'), ioc_data.get('type')))
         
         if existing_ioc:
             duplicates.append({
@@ -193,11 +368,96 @@ def check_ioc_duplicates():
                 "found": existing_ioc.to_dict()
             })
 
+    # Values already covered by a stored parent domain, URL host or range
+    duplicate_values = {duplicate["ioc"].get("value") for duplicate in duplicates}
+    candidates = {ioc_data.get('value'): ioc_data for ioc_data in iocs_data
+                  if ioc_data.get('value') and ioc_data.get('value') not in duplicate_values}
+    parent_matches = []
+    for hit in lookup_indicators(list(candidates))['hits']:
+        for match in hit['matches']:
+            if match['match'] != 'exact':
+                parent_matches.append({
+                    "ioc": candidates[hit['value']],
+                    "match": match['match'],
+                    "matched_value": match['matched_value'],
+                    "found": match['ioc']
+                })
+
     return jsonify({
-        "duplicates": duplicates
+        "duplicates": duplicates,
+        "parent_matches": parent_matches
     })
 
+@iocs_bp.route('/api/iocs/lookup', methods=['POST'])
+def lookup_iocs():
+    """Look up a batch of observables against the stored IoCs."""
+    data = request.get_json()
+    if not data:
+        return jsonify({"error": "No data provided"}), 400
+
+    if 'input' in data:
+        values = parse_ioc_input(data['input'])
+    elif 'values' in data and isinstance(data['values'], list):
+        values = data['values']
+    else:
+        return jsonify({"error": "Missing 'input' or 'values' field"}), 400
+
+    max_values = current_app.config['LOOKUP_MAX_VALUES']
+    if len(values) > max_values:
+        return jsonify({"error": f"At most {max_values} values can be looked up at once"}), 413
+
+    return jsonify(lookup_indicators(values))
+
+@iocs_bp.route('/api/iocs/containing', methods=['GET'])
+@versioned('iocs')
+def get_containing_networks():
+    """List the stored IP addresses and CIDR ranges covering an address."""
+    address = request.args.get('address', '').strip()
+    if not address:
+        return jsonify({"error": "Missing 'address' parameter"}), 400
+    try:
+        return jsonify(find_containing_networks(address))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@iocs_bp.route('/api/iocs/similar_domains', methods=['GET'])
+@versioned('iocs')
+def get_similar_domains():
+    """List stored domains within an edit distance of a domain."""
+    domain = request.args.get('domain', '').strip()
+    if not domain:
+        return jsonify({"error": "Missing 'domain' parameter"}), 400
+    max_distance = current_app.config['LOOKALIKE_MAX_DISTANCE']
+    k = request.args.get('k', current_app.config['LOOKALIKE_DISTANCE'], type=int)
+    if k is None or not 0 <= k <= max_distance:
+        return jsonify({"error": f"'k' must be between 0 and {max_distance}"}), 400
+
+    matches = find_lookalikes([domain], k)
+    if domain not in matches:
+        return jsonify({"error": f"{domain} is not a domain"}), 400
+    return jsonify({"domain": domain, "k": k, "matches": matches[domain]})
+
+@iocs_bp.route('/api/iocs/<int:ioc_id>/neighbours', methods=['GET'])
+@versioned('iocs', 'report_iocs')
+def get_ioc_neighbours(ioc_id):
+    """List the IoCs within k hops of an IoC, weighted by shared reports."""
+    ioc = IoC.query.get(ioc_id)
+    if not ioc:
+        return jsonify({"error": "IoC not found"}), 404
+    max_hops = current_app.config['GRAPH_MAX_HOPS']
+    hops = request.args.get('hops', 1, type=int)
+    if hops is None or not 1 <= hops <= max_hops:
+        return jsonify({"error": f"'hops' must be between 1 and {max_hops}"}), 400
+    min_weight = request.args.get('min_weight', 1, type=int)
+    limit = request.args.get('limit', current_app.config['GRAPH_DEFAULT_LIMIT'], type=int)
+    if min_weight is None or min_weight < 1 or limit is None or limit < 1:
+        return jsonify({"error": "'min_weight' and 'limit' must be positive integers"}), 400
+
+    result = find_neighbours(ioc_id, hops, min_weight=min_weight, limit=limit)
+    return jsonify({"ioc": ioc.to_dict(), "hops": hops, **result})
+
 @iocs_bp.route('/api/iocs/<int:ioc_id>/hunting_queries', methods=['GET'])
+@versioned('ioc:{ioc_id}')
 def get_ioc_hunting_queries(ioc_id):
     """Get hunting queries associated with a specific IoC ID."""
     ioc = IoC.query.get(ioc_id)
@@ -212,6 +472,89 @@ def get_ioc_hunting_queries(ioc_id):
         "hunting_queries": [q.to_dict() for q in queries]
     })
 
+SIGHTING_RANGE = re.compile(r'^(\d+)([hd])$')
+
+# Longest range served. Rollups are kept for good, this bounds the date arithmetic
+SIGHTING_RANGE_LIMIT = timedelta(days=3650)
+
+# Ranges up to this long are answered from hourly buckets, longer ones from daily
+HOURLY_RANGE_LIMIT = timedelta(hours=48)
+
+@iocs_bp.route('/api/iocs/<int:ioc_id>/sightings', methods=['GET'])
+def get_ioc_sightings(ioc_id):
+    """Get pre-aggregated sighting counts for an IoC over a time range."""
+    if not db.session.query(IoC.id).filter_by(id=ioc_id).first():
+        return jsonify({"error": "IoC not found"}), 404
+
+    range_param = request.args.get('range', '30d')
+    match = SIGHTING_RANGE.match(range_param)
+    if not match:
+        return jsonify({"error": "'range' must look like '48h' or '90d'"}), 400
+    amount, unit = int(match.group(1)), match.group(2)
+    unit_length = timedelta(hours=1) if unit == 'h' else timedelta(days=1)
+    if amount > SIGHTING_RANGE_LIMIT // unit_length:
+        return jsonify({"error": f"'range' cannot exceed {SIGHTING_RANGE_LIMIT.days}d"}), 400
+    span = amount * unit_length
+
+    granularity = request.args.get('bucket') or ('hour' if span <= HOURLY_RANGE_LIMIT else 'day')
+    if granularity not in ('hour', 'day'):
+        return jsonify({"error": "'bucket' must be 'hour' or 'day'"}), 400
+    rollup = HourlySightingRollup if granularity == 'hour' else DailySightingRollup
+
+    buckets = rollup.series(ioc_id, datetime.utcnow() - span)
+    # All-time last sighting comes from the daily rollup's primary key range
+    last_seen = db.session.query(db.func.max(DailySightingRollup.last_seen)) \
+        .filter(DailySightingRollup.ioc_id == ioc_id).scalar()
+
+    return jsonify({
+        "ioc_id": ioc_id,
+        "range": range_param,
+        "bucket": granularity,
+        "total": sum(b.count for b in buckets),
+        "last_seen": last_seen.isoformat() if last_seen else None,
+        "buckets": [{"start": b.bucket.isoformat(), "count": b.count, "last_seen": b.last_seen.isoformat()}
+                    for b in buckets]
+    })
+
+@iocs_bp.route('/api/iocs/<int:ioc_id>/sightings', methods=['POST'])
+def add_ioc_sightings(ioc_id):
+    """Record analyst sightings of an IoC."""
+    if not db.session.query(IoC.id).filter_by(id=ioc_id).first():
+        return jsonify({"error": "IoC not found"}), 404
+
+    data = request.get_json(silent=True) or {}
+    entries = data.get('sightings', [data])
+    if not isinstance(entries, list):
+        return jsonify({"error": "'sightings' must be a list"}), 400
+
+    rows = []
+    for entry in entries:
+        try:
+            seen_at = _parse_utc(entry['seen_at']) if entry.get('seen_at') else datetime.utcnow()
+            count = int(entry.get('count', 1))
+        except (TypeError, ValueError, AttributeError):
+            return jsonify({"error": "Invalid sighting, expected 'seen_at' (ISO 8601) and 'count'"}), 400
+        if count < 1:
+            return jsonify({"error": "'count' must be positive"}), 400
+        source = entry.get('source') or 'analyst'
+        location = entry.get('location')
+        for field, value in (('source', source), ('location', location)):
+            limit = Sighting.__table__.c[field].type.length
+            if value is not None and (not isinstance(value, str) or len(value) > limit):
+                return jsonify({"error": f"'{field}' must be a string of at most {limit} characters"}), 400
+        rows.append({
+            'ioc_id': ioc_id,
+            'seen_at': seen_at,
+            'count': count,
+            'source': source,
+            'location': location
+        })
+
+    Sighting.record(rows)
+    db.session.commit()
+
+    return jsonify({"message": f"Recorded {len(rows)} sightings", "recorded": len(rows)}), 201
+
 @iocs_bp.route('/api/iocs/<int:ioc_id>/generate_query', methods=['POST'])
 def generate_query_for_ioc(ioc_id):
     """Generate a hunting query for a specific IoC by ID."""
@@ -260,6 +603,8 @@ def generate_query_for_ioc(ioc_id):
         db.session.add(hunting_query)
         db.session.commit()
         
+        publish('query.generated', {"queries": [hunting_query.to_event()]})
+        
         return jsonify({
             'exists': False,
             'query': hunting_query.to_dict()  # Changed from 'hunting_query' to 'query' to match test expectations
@@ -280,10 +625,12 @@ def generate_queries_for_multiple_iocs():
     
     # Keep track of generated queries
     generated_queries = []
+    saved_queries = []
     
     try:
+        iocs = IoC.get_many(ioc_ids)
         for ioc_id in ioc_ids:
-            ioc = IoC.query.get(ioc_id)
+            ioc = iocs.get(ioc_id)
             if not ioc:
                 continue
             
@@ -310,6 +657,7 @@ def generate_queries_for_multiple_iocs():
                     query_type="kql"
                 )
                 db.session.add(hunting_query)
+                saved_queries.append(hunting_query)
                 generated_queries.append({
                     "ioc_id": ioc.id,
                     "query_id": hunting_query.id,
@@ -318,7 +666,11 @@ def generate_queries_for_multiple_iocs():
         
         # Save to database if requested
         if save:
+            db.session.flush()
+            query_events = [q.to_event() for q in saved_queries]
             db.session.commit()
+            if query_events:
+                publish('query.generated', {"queries": query_events})
         
         return jsonify({
             "message": f"Generated {len(generated_queries)} hunting queries",
@@ -0,0 +1,12 @@
+"""
+Request and SQL instrumentation exposed at /metrics.
+"""
+from flask import Blueprint
+
+# Create blueprint for the metrics endpoint
+metrics_bp = Blueprint('metrics', __name__)
+
+from .instrumentation import init_metrics, init_pool_metrics, registry
+
+# Import routes at the end to avoid circular imports
+from . import routes
@@ -0,0 +1,138 @@
+"""
+Per-request timing, SQL and payload metrics.
+
+Request hooks time every request and record its response size. SQLAlchemy
+engine events time every statement and add it to the running request's
+totals, and an ORM load event counts the rows materialized into model
+instances, so an N+1 loop shows up as a jump in statements and rows per
+request for one endpoint. Requests slower than SLOW_REQUEST_SECONDS are also
+logged one by one with the same totals. Pooled engines time every connection
+checkout, so an undersized pool shows up as wait time before any SQL runs.
+"""
+from time import perf_counter
+
+from flask import Flask, current_app, g, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+from models import db
+from .registry import Registry, BYTE_BUCKETS, COUNT_BUCKETS, ROW_BUCKETS
+
+registry = Registry()
+
+request_duration = registry.histogram(
+    'http_request_duration_seconds', 'Request latency', ('endpoint', 'method', 'status'))
+response_size = registry.histogram(
+    'http_response_size_bytes', 'Response body size', ('endpoint',), BYTE_BUCKETS)
+request_statements = registry.histogram(
+    'http_request_sql_statements', 'SQL statements executed per request', ('endpoint',), COUNT_BUCKETS)
+request_sql_duration = registry.histogram(
+    'http_request_sql_duration_seconds', 'Time spent in SQL per request', ('endpoint',))
+request_rows = registry.histogram(
+    'http_request_rows_loaded', 'Model instances loaded per request', ('endpoint',), ROW_BUCKETS)
+statement_duration = registry.histogram(
+    'sql_statement_duration_seconds', 'SQL statement latency', ('endpoint',))
+pool_checkout_wait = registry.histogram(
+    'db_pool_checkout_wait_seconds', 'Time waiting for a pooled connection, including opening one')
+pool_checkout_timeouts = registry.counter(
+    'db_pool_checkout_timeouts_total', 'Checkouts that gave up after DB_POOL_TIMEOUT')
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool recording how long each checkout waits for a connection"""
+
+    def _do_get(self):
+        started = perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_checkout_timeouts.inc()
+            raise
+        finally:
+            pool_checkout_wait.observe(perf_counter() - started)
+
+
+def _endpoint() -> str:
+    """Route endpoint label, bounded to the registered views"""
+    if not has_request_context():
+        return 'none'
+    return request.endpoint or 'unmatched'
+
+
+def _start_request():
+    g.metrics_start = perf_counter()
+    g.metrics_statements = 0
+    g.metrics_sql_seconds = 0.0
+    g.metrics_rows = 0
+
+
+def _finish_request(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    endpoint = _endpoint()
+    elapsed = perf_counter() - start
+    request_duration.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+    request_statements.observe(g.metrics_statements, endpoint=endpoint)
+    request_sql_duration.observe(g.metrics_sql_seconds, endpoint=endpoint)
+    request_rows.observe(g.metrics_rows, endpoint=endpoint)
+    # Streamed bodies (the SSE stream) have no length up front
+    if not response.is_streamed:
+        response_size.observe(response.calculate_content_length() or 0, endpoint=endpoint)
+    threshold = current_app.config.get('SLOW_REQUEST_SECONDS')
+    if threshold and elapsed >= threshold:
+        current_app.logger.warning(
+            "Slow request: %s %s -> %s in %.3fs (%d SQL statements, %.3fs in SQL, %d rows loaded)",
+            request.method, request.full_path.rstrip('?'), response.status_code, elapsed,
+            g.metrics_statements, g.metrics_sql_seconds, g.metrics_rows)
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = perf_counter() - conn.info['metrics_query_start'].pop()
+    statement_duration.observe(elapsed, endpoint=_endpoint())
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_statements += 1
+        g.metrics_sql_seconds += elapsed
+
+
+def _discard_failed_statement(exception_context):
+    connection = exception_context.connection
+    if connection is not None and exception_context.cursor is not None:
+        started = connection.info.get('metrics_query_start')
+        if started:
+            started.pop()
+
+
+def _count_loaded_row(target, context):
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_rows += 1
+
+
+event.listen(db.Model, 'load', _count_loaded_row, propagate=True)
+
+
+def init_pool_metrics(app: Flask):
+    """Meter checkouts of the pools configured in SQLALCHEMY_ENGINE_OPTIONS.
+
+    Engines are created by db.init_app, so this must run before it.
+    """
+    options = app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    if app.config.get('METRICS_ENABLED', True) and 'pool_size' in options and 'poolclass' not in options:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {**options, 'poolclass': MeteredQueuePool}
+
+
+def init_metrics(app: Flask):
+    """Install the request hooks and the engine listeners on an app."""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _discard_failed_statement)
@@ -0,0 +1,12 @@
+"""
+Routes for the metrics API.
+"""
+from flask import Response
+from . import metrics_bp
+from .instrumentation import registry
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Expose the process metrics in the Prometheus text format"""
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
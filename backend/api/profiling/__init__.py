@@ -0,0 +1,12 @@
+"""
+Opt-in per-request profiling and stored profile retrieval.
+"""
+from flask import Blueprint
+
+# Create blueprint for profile retrieval
+profiling_bp = Blueprint('profiling', __name__)
+
+from .profiler import init_profiling
+
+# Import routes at the end to avoid circular imports
+from . import routes
@@ -0,0 +1,164 @@
+"""
+Opt-in per-request profiling.
+
+A request carrying the admin profiling token in the X-Profile header runs
+under cProfile while its SQL statements are timed. The token is not
+accepted in the query string, where access logs, the slow-request warning
+and the stored profile would all record it. The call graph and the SQL
+timeline are written to PROFILE_DIR under a random id, and the response
+links to them with X-Profile-Id and X-Profile-Url.
+
+One request per process is profiled at a time: since Python 3.12 cProfile
+runs on sys.monitoring, which allows a single profiler per interpreter, and
+a profile would otherwise also record the work of other threads. A profiled
+request arriving while another runs gets a 409.
+
+Nothing is installed when PROFILING_TOKEN is unset, so requests pay no
+overhead unless profiling is configured; with it configured, requests
+without the token pay one header comparison.
+"""
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import re
+import secrets
+import threading
+from datetime import datetime
+from time import perf_counter
+from typing import Optional
+
+from flask import Flask, current_app, g, has_request_context, jsonify, request, url_for
+from sqlalchemy import event
+from models import db
+
+PROFILE_ID = re.compile(r'^[0-9a-f]{16}$')
+
+# Longest SQL text kept per statement in the timeline
+MAX_STATEMENT_LENGTH = 2000
+
+# Held by the request being profiled
+_profile_lock = threading.Lock()
+
+
+def is_authorized() -> bool:
+    """Whether the current request carries the profiling token."""
+    token = current_app.config.get('PROFILING_TOKEN')
+    supplied = request.headers.get('X-Profile')
+    return bool(token and supplied) and hmac.compare_digest(supplied, token)
+
+
+def profile_path(profile_id: str, extension: str) -> Optional[str]:
+    """Path of a stored profile file, or None for a malformed id."""
+    if not PROFILE_ID.match(profile_id):
+        return None
+    return os.path.join(current_app.config['PROFILE_DIR'], f'{profile_id}.{extension}')
+
+
+def _start_profile():
+    if not is_authorized():
+        return
+    if not _profile_lock.acquire(blocking=False):
+        return jsonify({"error": "Another request is being profiled, retry later"}), 409
+    g.profile_locked = True
+    g.profile_sql = []
+    g.profile_start = perf_counter()
+    g.profiler = cProfile.Profile()
+    g.profiler.enable()
+
+
+def _call_graph(profiler: cProfile.Profile, limit: int) -> list:
+    """The most expensive functions by cumulative time, with their callers."""
+    def name(key):
+        filename, line, function = key
+        return f'{function} ({filename}:{line})'
+
+    stats = pstats.Stats(profiler).stats
+    ranked = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+    return [{
+        "function": name(key),
+        "calls": calls,
+        "primitive_calls": primitive_calls,
+        "total_time": total_time,
+        "cumulative_time": cumulative_time,
+        "callers": sorted(name(caller) for caller in callers)
+    } for key, (primitive_calls, calls, total_time, cumulative_time, callers) in ranked]
+
+
+def _finish_profile(response):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    duration = perf_counter() - g.profile_start
+
+    profile_id = secrets.token_hex(8)
+    os.makedirs(current_app.config['PROFILE_DIR'], exist_ok=True)
+    profiler.dump_stats(profile_path(profile_id, 'pstats'))
+    profile = {
+        "id": profile_id,
+        "method": request.method,
+        "path": request.full_path.rstrip('?'),
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "created_at": datetime.utcnow().isoformat(),
+        "duration_ms": round(duration * 1000, 3),
+        "sql": g.profile_sql,
+        "call_graph": _call_graph(profiler, current_app.config['PROFILE_TOP_FUNCTIONS'])
+    }
+    with open(profile_path(profile_id, 'json'), 'w') as f:
+        json.dump(profile, f)
+
+    response.headers['X-Profile-Id'] = profile_id
+    response.headers['X-Profile-Url'] = url_for('api.profiling.get_profile', profile_id=profile_id)
+    return response
+
+
+def _release_profile(exception):
+    # Teardown runs even when the view or _finish_profile raised
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+    if g.pop('profile_locked', False):
+        _profile_lock.release()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'profiler' in g:
+        conn.info.setdefault('profile_query_start', []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('profile_query_start')
+    if not started or not (has_request_context() and 'profiler' in g):
+        return
+    start = started.pop()
+    g.profile_sql.append({
+        "statement": statement[:MAX_STATEMENT_LENGTH],
+        "executemany": executemany,
+        "start_ms": round((start - g.profile_start) * 1000, 3),
+        "duration_ms": round((perf_counter() - start) * 1000, 3)
+    })
+
+
+def _discard_failed_statement(exception_context):
+    connection = exception_context.connection
+    if connection is not None and exception_context.cursor is not None:
+        started = connection.info.get('profile_query_start')
+        if started:
+            started.pop()
+
+
+def init_profiling(app: Flask):
+    """Install the profiling hooks when a profiling token is configured."""
+    if not app.config.get('PROFILING_TOKEN'):
+        return
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
+    app.teardown_request(_release_profile)
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(engine, 'handle_error', _discard_failed_statement)
@@ -0,0 +1,37 @@
+"""
+Routes for retrieving stored request profiles.
+"""
+import json
+import os
+from flask import jsonify, send_file
+from . import profiling_bp
+from .profiler import is_authorized, profile_path
+
+
+def _stored_path(profile_id, extension):
+    path = profile_path(profile_id, extension)
+    return path if path and os.path.exists(path) else None
+
+
+@profiling_bp.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Get the call graph and SQL timeline of a profiled request."""
+    if not is_authorized():
+        return jsonify({"error": "Profiling token required"}), 403
+    path = _stored_path(profile_id, 'json')
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    with open(path) as f:
+        return jsonify(json.load(f))
+
+
+@profiling_bp.route('/api/profiles/<profile_id>/pstats', methods=['GET'])
+def get_profile_pstats(profile_id):
+    """Download the raw cProfile stats, e.g. for snakeviz or pstats."""
+    if not is_authorized():
+        return jsonify({"error": "Profiling token required"}), 403
+    path = _stored_path(profile_id, 'pstats')
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'{profile_id}.pstats')
@@ -0,0 +1,26 @@
+"""
+CLI commands for report maintenance.
+"""
+import click
+from flask.cli import with_appcontext
+from models import db, Report, store_report_signature
+
+
+@click.command('backfill-report-signatures')
+@click.option('--batch-size', default=100, show_default=True, help='Reports updated per transaction.')
+@with_appcontext
+def backfill_report_signatures_command(batch_size):
+    """Compute MinHash signatures and LSH buckets for existing reports."""
+    updated = 0
+    last_id = 0
+    while True:
+        reports = Report.query.filter(Report.id > last_id).order_by(Report.id).limit(batch_size).all()
+        if not reports:
+            break
+        last_id = reports[-1].id
+        connection = db.session.connection()
+        for report in reports:
+            store_report_signature(connection, report.id, [ioc.value for ioc in report.iocs])
+        db.session.commit()
+        updated += len(reports)
+    click.echo(f"Computed signatures for {updated} reports")
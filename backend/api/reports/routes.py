@@ -1,17 +1,23 @@
-from flask import Blueprint, jsonify, request
-from models import db, Report, HuntingQuery
+from flask import Blueprint, jsonify, request, current_app
+from sqlalchemy.orm import aliased
+from models import db, Report, HuntingQuery, ReportLSHBucket
+from utils.ioc.minhash import estimate_jaccard, unpack_signature
 from utils.ioc.detector import detect_ioc_type, IoC_Type
 from utils.kql.query_generator import generate_query
+from api.conditional import versioned
+from api.events.broker import publish
 
 reports_bp = Blueprint('reports', __name__)
 
 @reports_bp.route('/api/reports', methods=['GET'])
+@versioned('reports')
 def get_all_reports():
     """Get all reports from database"""
     reports = Report.query.all()
     return jsonify({"reports": [report.to_dict() for report in reports]})
 
 @reports_bp.route('/api/reports/<int:report_id>', methods=['GET'])
+@versioned('reports')
 def get_report(report_id):
     """Get a specific report by ID from database"""
     report = Report.query.get(report_id)
@@ -19,6 +25,35 @@ def get_report(report_id):
         return jsonify({"report": report.to_dict()})
     return jsonify({"error": "Report not found"}), 404
 
+@reports_bp.route('/api/reports/<int:report_id>/similar', methods=['GET'])
+@versioned('reports')
+def get_similar_reports(report_id):
+    """Find reports whose IoC sets overlap this report's, via MinHash LSH buckets"""
+    report = Report.query.get(report_id)
+    if not report:
+        return jsonify({"error": "Report not found"}), 404
+
+    threshold = request.args.get('threshold', current_app.config['REPORT_SIMILARITY_THRESHOLD'], type=float)
+    if threshold is None or not 0 < threshold <= 1:
+        return jsonify({"error": "'threshold' must be in (0, 1]"}), 400
+
+    similar = []
+    if report.minhash:
+        # Candidates share at least one band bucket, no pairwise scan
+        own, other = aliased(ReportLSHBucket), aliased(ReportLSHBucket)
+        candidate_ids = db.session.query(other.report_id) \
+            .join(own, (own.band == other.band) & (own.bucket == other.bucket)) \
+            .filter(own.report_id == report_id, other.report_id != report_id) \
+            .distinct()
+        signature = unpack_signature(report.minhash)
+        for candidate in Report.query.filter(Report.id.in_(candidate_ids), Report.minhash.isnot(None)):
+            similarity = estimate_jaccard(signature, unpack_signature(candidate.minhash))
+            if similarity >= threshold:
+                similar.append({"report": candidate.to_dict(), "similarity": round(similarity, 3)})
+        similar.sort(key=lambda entry: (-entry["similarity"], entry["report"]["id"]))
+
+    return jsonify({"report_id": report_id, "threshold": threshold, "similar": similar})
+
 @reports_bp.route('/api/reports', methods=['POST'])
 def create_report():
     """Create a new report in database"""
@@ -32,13 +67,16 @@ def create_report():
         sigma_rule=data.get("sigma_rule", "")
     )
 
+    db.session.add(new_report)
     if 'iocs' in data and isinstance(data['iocs'], list):
         new_report.set_iocs(data['iocs'])
 
-    db.session.add(new_report)
+    # Serialize before commit expires the report, saving a reload
+    db.session.flush()
+    result = new_report.to_dict()
     db.session.commit()
 
-    return jsonify({"report": new_report.to_dict(), "message": "Report created successfully"}), 201
+    return jsonify({"report": result, "message": "Report created successfully"}), 201
 
 @reports_bp.route('/api/reports/<int:report_id>', methods=['PUT'])
 def update_report(report_id):
@@ -61,8 +99,10 @@ def update_report(report_id):
     if 'iocs' in data and isinstance(data['iocs'], list):
         report.set_iocs(data['iocs'])
 
+    db.session.flush()
+    result = report.to_dict()
     db.session.commit()
-    return jsonify({"report": report.to_dict(), "message": "Report updated successfully"})
+    return jsonify({"report": result, "message": "Report updated successfully"})
 
 @reports_bp.route('/api/reports/<int:report_id>', methods=['DELETE'])
 def delete_report(report_id):
@@ -88,6 +128,7 @@ def generate_queries_for_report(report_id):
     
     iocs_processed = []
     saved_individual_queries = []
+    saved_queries = []
     hunting_queries = []
     
     for ioc in report.iocs:
@@ -121,6 +162,7 @@ def generate_queries_for_report(report_id):
                     query_type="kql"
                 )
                 db.session.add(hunting_query)
+                saved_queries.append(hunting_query)
                 
                 # Add to saved queries list for response
                 saved_individual_queries.append({
@@ -143,7 +185,11 @@ def generate_queries_for_report(report_id):
             print(f"Error generating query for {ioc.value}: {str(e)}")
     
     if save:
+        db.session.flush()
+        query_events = [q.to_event() for q in saved_queries]
         db.session.commit()
+        if query_events:
+            publish('query.generated', {'queries': query_events})
     
     return jsonify({
         'message': f"Generated hunting queries for {len(iocs_processed)} IoCs",
@@ -0,0 +1,10 @@
+"""
+Retro-hunt API module.
+"""
+from flask import Blueprint
+
+# Create blueprint for retro-hunting
+retrohunt_bp = Blueprint('retrohunt', __name__)
+
+# Import routes at the end to avoid circular imports
+from . import routes
@@ -0,0 +1,20 @@
+"""
+CLI commands for retro-hunting.
+"""
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .service import retrohunt
+
+
+@click.command('retrohunt')
+@click.argument('paths', nargs=-1, required=True, type=click.Path(exists=True))
+@click.option('--table', default=None, help='Table the exports belong to, guessed from file names by default.')
+@click.option('--workers', default=None, type=int, help='Process pool size, RETROHUNT_WORKERS by default.')
+@with_appcontext
+def retrohunt_command(paths, table, workers):
+    """Match log exports in PATHS against all stored IoCs and record sightings."""
+    result = retrohunt(list(paths), table=table, workers=workers or current_app.config['RETROHUNT_WORKERS'])
+    for entry in result['files']:
+        click.echo(f"{entry['path']}: {entry['matches']} matches")
+    click.echo(f"Recorded {result['sightings_recorded']} sightings for {result['iocs_matched']} IoCs")
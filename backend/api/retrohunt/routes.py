@@ -0,0 +1,36 @@
+"""
+Routes for the retro-hunt API.
+"""
+import os
+from flask import request, jsonify, current_app
+from . import retrohunt_bp
+from .service import retrohunt
+
+
+@retrohunt_bp.route('/api/retrohunt', methods=['POST'])
+def start_retrohunt():
+    """Retro-hunt log exports on the server against all stored IoCs"""
+    data = request.get_json()
+    if not data or not isinstance(data.get('paths'), list) or not data['paths']:
+        return jsonify({'error': "Missing 'paths' field"}), 400
+
+    # Only allow reading exports inside the configured root
+    root = os.path.realpath(current_app.config['RETROHUNT_ROOT'])
+    paths = []
+    for path in data['paths']:
+        resolved = os.path.realpath(os.path.join(root, str(path)))
+        if os.path.commonpath([root, resolved]) != root:
+            return jsonify({'error': f'Path {path} is outside the retro-hunt root'}), 400
+        if not os.path.exists(resolved):
+            return jsonify({'error': f'Path {path} not found'}), 404
+        paths.append(resolved)
+
+    # Scan in this process: forking a pool from a threaded server worker is
+    # unsafe, and the pool size is not the client's to choose. Large exports
+    # go through `flask retrohunt`, which spreads files across processes
+    try:
+        result = retrohunt(paths, table=data.get('table'), workers=1)
+    except (ValueError, RuntimeError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(result)
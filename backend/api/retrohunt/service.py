@@ -0,0 +1,52 @@
+"""
+Run retro-hunts against the stored IoCs and record the resulting sightings.
+"""
+from typing import List, Optional
+
+from models import db, IoC, Sighting
+from utils.hunt.retrohunt import build_watchlist, expand_paths, run_retrohunt
+
+
+def retrohunt(paths: List[str], table: Optional[str] = None, workers: Optional[int] = None) -> dict:
+    """
+    Match export files against every stored IoC and save the sightings.
+
+    Args:
+        paths: Export files or directories containing them
+        table: Force every file to this table instead of guessing from its name
+        workers: Process pool size, None for one worker per CPU
+
+    Returns:
+        Summary with per-file match counts and the number of sightings recorded
+    """
+    files = expand_paths(paths)
+    watchlist = build_watchlist(db.session.query(IoC.id, IoC.value).yield_per(10000))
+    results = run_retrohunt(files, watchlist, table=table, workers=workers)
+
+    rows = []
+    summary = []
+    matched_iocs = set()
+    for path, sightings in results.items():
+        matches = 0
+        for (ioc_id, table_name, field, _), (count, seen_at) in sightings.items():
+            rows.append({
+                'ioc_id': ioc_id,
+                'seen_at': seen_at,
+                'count': count,
+                'source': 'retrohunt',
+                'table_name': table_name,
+                'field': field,
+                'location': path
+            })
+            matches += count
+            matched_iocs.add(ioc_id)
+        summary.append({'path': path, 'matches': matches})
+
+    Sighting.record(rows)
+    db.session.commit()
+
+    return {
+        'files': summary,
+        'iocs_matched': len(matched_iocs),
+        'sightings_recorded': len(rows)
+    }
@@ -2,23 +2,27 @@ from flask import Flask
 from flask_cors import CORS
 from config import Config
 from models import db
-from seed_data import create_example_data
+from migrations import migrate_command
+from seed_data import seed_command
+from synthetic_data import generate_data_command
 from api import register_api
+from api.metrics import init_pool_metrics
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
     CORS(app)
+    init_pool_metrics(app)
+    # Only binds the engine: every gunicorn worker runs create_app on boot,
+    # so the schema is left to `flask migrate` and example data to `flask seed`
     db.init_app(app)
 
-    if not app.config.get('TESTING', False):
-        with app.app_context():
-            db.create_all()
-            create_example_data()
-
     # Register all API routes using our central registration function
     register_api(app)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(generate_data_command)
 
     return app
 
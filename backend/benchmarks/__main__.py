@@ -0,0 +1,94 @@
+"""
+Run the benchmark suite and compare it with the stored baseline.
+
+Run from the backend directory:
+
+    python -m benchmarks                        # micro benchmarks and API routes at 1k
+    python -m benchmarks --scale 1k,100k,1m     # larger databases, minutes at 1m
+    python -m benchmarks --only kql --output results.json
+    python -m benchmarks --update-baseline      # after an intended change
+
+Exits with status 1 and lists every benchmark more than --tolerance slower
+than benchmarks/baseline.json. Baselines only compare on similar machines,
+record a new one when the hardware changes.
+"""
+import argparse
+import os
+import sys
+
+from . import api, micro
+from .harness import compare, load_results, machine, measure, save_results
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--scale', default='1k', help="Comma separated API scales: 1k, 100k, 1m")
+    parser.add_argument('--only', default='', help="Run benchmarks whose name starts with this prefix")
+    parser.add_argument('--repeat', type=int, default=5, help="Samples per benchmark")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', default=BASELINE, help="Baseline JSON file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.3, help="Allowed slowdown, 0.3 = 30%%")
+    parser.add_argument('--update-baseline', action='store_true', help="Save the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    scales = [scale.strip().lower() for scale in args.scale.split(',') if scale.strip()]
+    unknown = [scale for scale in scales if scale not in api.SCALES]
+    if unknown:
+        parser.error(f"unknown scale(s) {', '.join(unknown)}, expected {', '.join(api.SCALES)}")
+
+    def wanted(prefix):
+        return prefix.startswith(args.only) or args.only.startswith(prefix)
+
+    cases = dict(micro.cases())
+    for scale in scales:
+        if wanted('api.'):
+            print(f"Loading {api.SCALES[scale]} IoCs for the {scale} API benchmarks...", file=sys.stderr)
+            cases.update(api.cases(scale))
+
+    results = {}
+    for name, (function, ops) in cases.items():
+        if not name.startswith(args.only):
+            continue
+        results[name] = measure(function, ops=ops, repeat=args.repeat)
+        print(f"{name:<40} {results[name]['best_us']:>12.2f} us  (median {results[name]['median_us']:.2f})")
+
+    if args.update_baseline:
+        if args.output:
+            save_results(args.output, results)
+        baseline = load_results(args.baseline) or {"results": {}}
+        save_results(args.baseline, {**baseline["results"], **results})
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    baseline = load_results(args.baseline)
+    regressions = {}
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, run with --update-baseline to record one")
+    else:
+        if baseline.get("machine") != machine():
+            print("Warning: the baseline was recorded on a different machine or Python, "
+                  "comparisons are indicative only", file=sys.stderr)
+        # Re-measure the suspects with more samples before failing, a single
+        # noisy sample on a busy machine should not fail the run
+        for name in compare(results, baseline, args.tolerance):
+            function, ops = cases[name]
+            retry = measure(function, ops=ops, repeat=args.repeat * 2)
+            if retry["best_us"] < results[name]["best_us"]:
+                results[name] = retry
+        regressions = compare(results, baseline, args.tolerance)
+
+    if args.output:
+        save_results(args.output, results)
+    if regressions:
+        print(f"\nREGRESSIONS (> {args.tolerance:.0%} slower than baseline):")
+        for message in regressions.values():
+            print(f"  {message}")
+        return 1
+    if baseline is not None:
+        print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
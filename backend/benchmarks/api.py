@@ -0,0 +1,64 @@
+"""
+Benchmarks of the main API routes against a synthetic database.
+
+Each scale gets a fresh SQLite file loaded by the synthetic dataset
+generator with that many IoCs, then the routes are called through the Flask
+test client so routing, serialization and SQL are all included. Routes
+listing every row are skipped above LIST_ALL_LIMIT.
+"""
+import os
+import tempfile
+from typing import Callable, Dict, Tuple
+
+from app import create_app
+from config import TestConfig
+from models import db
+from synthetic_data import generate_synthetic_data, synthetic_paste
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+
+# GET /api/iocs serializes every row, too slow to sample at a million
+LIST_ALL_LIMIT = 100000
+
+
+def cases(scale: str, workdir: str = None) -> Dict[str, Tuple[Callable[[], object], int]]:
+    """Benchmark name -> (callable, operations per call) for one scale."""
+    size = SCALES[scale]
+    workdir = workdir or tempfile.mkdtemp(prefix='osint-hunt-bench-')
+    config = type('BenchmarkConfig', (TestConfig,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, f'bench-{scale}.db')}",
+    })
+    app = create_app(config)
+    context = app.app_context()
+    context.push()
+    db.create_all()
+    generate_synthetic_data(size, seed=42)
+    client = app.test_client()
+
+    # 200 values, half stored, half defanged
+    pasted = synthetic_paste(200, seed=42)
+    values = [value.strip() for line in pasted.split('\n') for value in line.split(',')]
+    pivot = size // 2
+
+    def call(method, path, **kwargs):
+        def run():
+            response = client.open(path, method=method, **kwargs)
+            assert response.status_code == 200, (path, response.status_code)
+        return run
+
+    routes = {
+        "lookup": call('POST', '/api/iocs/lookup', json={"values": values}),
+        "check_duplicates": call('POST', '/api/iocs/check_duplicates', json={"input": pasted}),
+        "detect": call('POST', '/api/iocs/detect', json={"input": pasted}),
+        "ioc_full": call('GET', f'/api/iocs/{pivot}/full'),
+        "ioc_hunting_queries": call('GET', f'/api/iocs/{pivot}/hunting_queries'),
+        "neighbours_2_hops": call('GET', f'/api/iocs/{pivot}/neighbours?hops=2'),
+        "similar_domains": call('GET', '/api/iocs/similar_domains?domain=evil-cdn.com'),
+        "list_reports": call('GET', '/api/reports'),
+    }
+    if size <= LIST_ALL_LIMIT:
+        routes["list_iocs"] = call('GET', '/api/iocs')
+    # Warm the in-memory indexes so the samples measure steady state
+    for run in routes.values():
+        run()
+    return {f"api.{name}@{scale}": (run, 1) for name, run in routes.items()}
@@ -0,0 +1,55 @@
+"""
+Deterministic synthetic inputs for the benchmarks.
+
+Every generator takes its own seed so a benchmark sees the same data on
+every run and on every machine.
+"""
+import random
+from typing import List, Tuple
+
+from utils.ioc.defang import defang
+
+_LABELS = ['evil', 'cdn', 'login', 'mail', 'update', 'secure', 'c2', 'api']
+_SUFFIXES = ['com', 'net', 'org', 'co.uk', 'fi', 'io', 'xyz', 'com.au', 'ru']
+_FILES = ['LockBit_Ransom.exe', 'invoice.pdf', 'payload.dll', 'readme.txt', 'setup.msi']
+
+# Type names as stored in IoC.type (detected type, lowercased), in the order
+# corpus() cycles through them; file names and .local hosts detect as unknown
+TYPE_CYCLE = ['domain', 'ip_address', 'hash_md5', 'hash_sha256', 'url', 'email', 'unknown', 'unknown']
+
+
+def corpus(size: int = 5000, seed: int = 1337) -> List[str]:
+    """Indicators of every type, plus near-misses such as file names."""
+    return [value for value, _ in typed_corpus(size, seed)]
+
+
+def typed_corpus(size: int, seed: int = 1337) -> List[Tuple[str, str]]:
+    """(value, type) pairs cycling through TYPE_CYCLE."""
+    rng = random.Random(seed)
+    values = []
+    for i in range(size):
+        kind = i % 8
+        if kind == 0:
+            value = '.'.join(rng.sample(_LABELS, rng.randint(1, 3))) + '.' + rng.choice(_SUFFIXES)
+        elif kind == 1:
+            value = '.'.join(str(rng.randint(0, 255)) for _ in range(4))
+        elif kind == 2:
+            value = '%032x' % rng.getrandbits(128)
+        elif kind == 3:
+            value = '%064x' % rng.getrandbits(256)
+        elif kind == 4:
+            value = f"https://{rng.choice(_LABELS)}.{rng.choice(_SUFFIXES)}/{rng.choice(_FILES)}"
+        elif kind == 5:
+            value = f"{rng.choice(_LABELS)}@{rng.choice(_LABELS)}.{rng.choice(_SUFFIXES)}"
+        elif kind == 6:
+            value = rng.choice(_FILES)
+        else:
+            value = f"{rng.choice(_LABELS)}.{rng.choice(_LABELS)}.local"
+        values.append((value, TYPE_CYCLE[kind]))
+    return values
+
+
+def defanged_corpus(size: int = 5000, seed: int = 1337) -> List[str]:
+    """The corpus with roughly half of the values defanged."""
+    rng = random.Random(seed + 1)
+    return [defang(value) if rng.random() < 0.5 else value for value in corpus(size, seed)]
@@ -0,0 +1,24 @@
+"""
+Benchmark IoC type classification.
+
+Times detect_ioc_type over a fixed, mixed corpus of indicators and prints
+the cost per call. Part of the suite in benchmarks/__main__.py, kept as a
+quick standalone check. Run from the backend directory:
+
+    python -m benchmarks.detector_benchmark
+"""
+import timeit
+
+from utils.ioc.detector import detect_ioc_type
+from benchmarks.data import corpus
+
+
+def run(repeat: int = 20) -> float:
+    """Return the best time per classification in microseconds."""
+    values = corpus()
+    best = min(timeit.repeat(lambda: [detect_ioc_type(value) for value in values], number=1, repeat=repeat))
+    return best / len(values) * 1e6
+
+
+if __name__ == '__main__':
+    print(f"detect_ioc_type: {run():.2f} us/call")
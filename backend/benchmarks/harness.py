@@ -0,0 +1,87 @@
+"""
+Timing, result files and baseline comparison for the benchmark suite.
+
+A benchmark is a zero-argument callable doing `ops` operations per call.
+It is timed with timeit: the number of calls per sample is picked by
+autorange, then the best and median of `repeat` samples are reported per
+operation. Comparisons use the best sample, the least noisy estimate of
+the true cost.
+"""
+import json
+import os
+import platform
+import statistics
+import timeit
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+import sqlalchemy
+
+
+def measure(function: Callable[[], object], ops: int = 1, repeat: int = 5) -> Dict[str, float]:
+    """
+    Time a callable.
+
+    Args:
+        function: Callable doing `ops` operations per call
+        ops: Operations per call, results are reported per operation
+        repeat: Number of samples
+
+    Returns:
+        Dictionary with 'best_us' and 'median_us' per operation and the
+        'calls' made per sample
+    """
+    timer = timeit.Timer(function)
+    calls, _ = timer.autorange()
+    samples = [elapsed / calls / ops * 1e6 for elapsed in timer.repeat(repeat=repeat, number=calls)]
+    return {"best_us": round(min(samples), 3), "median_us": round(statistics.median(samples), 3), "calls": calls}
+
+
+def machine() -> Dict[str, object]:
+    """Describe the environment, results only compare on similar machines."""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpus": os.cpu_count(),
+        "sqlalchemy": sqlalchemy.__version__,
+    }
+
+
+def save_results(path: str, results: Dict[str, Dict[str, float]]):
+    with open(path, 'w') as f:
+        json.dump({"created_at": datetime.utcnow().isoformat(), "machine": machine(), "results": results},
+                  f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def load_results(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: dict, tolerance: float) -> Dict[str, str]:
+    """
+    Compare results against a baseline file.
+
+    Args:
+        results: Current results by benchmark name
+        baseline: Parsed baseline file
+        tolerance: Allowed slowdown, e.g. 0.3 for 30 %
+
+    Returns:
+        Benchmark name -> message for every benchmark slower than the
+        baseline allows
+    """
+    regressions = {}
+    for name, result in sorted(results.items()):
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        if result["best_us"] > reference["best_us"] * (1 + tolerance):
+            regressions[name] = (f"{name}: {result['best_us']:.2f} us vs baseline {reference['best_us']:.2f} us "
+                                 f"(+{result['best_us'] / reference['best_us'] - 1:.0%})")
+    return regressions
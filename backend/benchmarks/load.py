@@ -0,0 +1,117 @@
+"""
+HTTP load test against a running server.
+
+Keeps --concurrency clients busy for --duration seconds with a read-heavy
+mix of API calls on a synthetic database, then reports throughput and
+latency percentiles. Run from the backend directory, e.g. to compare the
+debug server with gunicorn on the same data:
+
+    SQLALCHEMY_DATABASE_URI=sqlite:////tmp/load.db flask --app app generate-data \\
+        --iocs 100000 --paste-file /tmp/load-paste.txt
+    SQLALCHEMY_DATABASE_URI=sqlite:////tmp/load.db gunicorn -c gunicorn.conf.py wsgi:app &
+    python -m benchmarks.load --paste-file /tmp/load-paste.txt --iocs 100000
+"""
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+# (weight, method, path template); {ioc} and {report} are random ids,
+# {values} and {paste} come from the paste file
+MIX = [
+    (30, 'GET', '/api/iocs/{ioc}'),
+    (20, 'GET', '/api/iocs/{ioc}/full'),
+    (20, 'POST', '/api/iocs/lookup'),
+    (15, 'GET', '/api/reports/{report}'),
+    (10, 'POST', '/api/iocs/detect'),
+    (5, 'GET', '/api/iocs/{ioc}/neighbours'),
+]
+
+LOOKUP_VALUES = 50
+
+
+def _client(url: str, deadline: float, values: List[str], iocs: int, reports: int, seed: int, results: Dict):
+    """One client issuing requests back to back over a keep-alive connection"""
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=60)
+    rng = random.Random(seed)
+    weights = [weight for weight, _, _ in MIX]
+    latencies, errors = [], 0
+    while time.perf_counter() < deadline:
+        _, method, template = rng.choices(MIX, weights)[0]
+        path = template.format(ioc=rng.randint(1, iocs), report=rng.randint(1, reports))
+        body, headers = None, {}
+        if method == 'POST':
+            sample = rng.sample(values, min(LOOKUP_VALUES, len(values)))
+            payload = {'values': sample} if path.endswith('lookup') else {'input': '\n'.join(sample)}
+            body, headers = json.dumps(payload), {'Content-Type': 'application/json'}
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            ok = response.status < 500
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            ok = False
+        latencies.append(time.perf_counter() - started)
+        errors += not ok
+    connection.close()
+    results[seed] = (latencies, errors)
+
+
+def run(url: str, concurrency: int, duration: float, values: List[str], iocs: int, reports: int) -> Dict:
+    results = {}
+    deadline = time.perf_counter() + duration
+    clients = [threading.Thread(target=_client, args=(url, deadline, values, iocs, reports, seed, results))
+               for seed in range(concurrency)]
+    started = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for client_latencies, _ in results.values() for latency in client_latencies)
+    if not latencies:
+        return {"requests": 0}
+
+    def percentile(p):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results.values()),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.load', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="Server to load")
+    parser.add_argument('--concurrency', type=int, default=16, help="Clients sending requests in parallel")
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run")
+    parser.add_argument('--paste-file', required=True, help="Values for lookups, from generate-data --paste-file")
+    parser.add_argument('--iocs', type=int, required=True, help="IoC ids are drawn from 1..IOCS")
+    parser.add_argument('--reports', type=int, help="Report ids are drawn from 1..REPORTS, IOCS / 25 by default")
+    args = parser.parse_args(argv)
+
+    with open(args.paste_file) as f:
+        values = [value.strip() for line in f for value in line.split(',') if value.strip()]
+    result = run(args.url, args.concurrency, args.duration, values, args.iocs, args.reports or max(1, args.iocs // 25))
+    print(json.dumps(result, indent=2))
+    return 1 if not result["requests"] or result["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
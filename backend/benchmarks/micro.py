@@ -0,0 +1,35 @@
+"""
+Benchmarks of the pure functions: type detection, refanging and KQL generation.
+"""
+from itertools import groupby
+from typing import Callable, Dict, Tuple
+
+from utils.ioc.defang import parse_ioc_input, refang
+from utils.ioc.detector import detect_ioc_type
+from utils.kql.query_generator import KQLQueryGenerator
+from .data import corpus, defanged_corpus
+
+
+def cases() -> Dict[str, Tuple[Callable[[], object], int]]:
+    """Benchmark name -> (callable, operations per call)."""
+    values = corpus()
+    defanged = defanged_corpus()
+    text = '\n'.join(', '.join(defanged[i:i + 5]) for i in range(0, len(defanged), 5))
+
+    query_values = values[:500]
+    typed = sorted(((detect_ioc_type(value), value) for value in corpus(2000, seed=7)),
+                   key=lambda pair: (pair[0].name, pair[1]))
+    groups = [(ioc_type, [value for _, value in group][:100])
+              for ioc_type, group in groupby(typed, key=lambda pair: pair[0])]
+
+    return {
+        "detector.detect_ioc_type": (lambda: [detect_ioc_type(value) for value in values], len(values)),
+        "defang.refang": (lambda: [refang(value) for value in defanged], len(defanged)),
+        # Per value of the pasted text
+        "defang.parse_ioc_input": (lambda: parse_ioc_input(text), len(defanged)),
+        "kql.generate_query": (lambda: [KQLQueryGenerator.generate_query(value) for value in query_values],
+                               len(query_values)),
+        # Per union query over up to 100 values of one type
+        "kql.generate_union_query": (lambda: [KQLQueryGenerator.generate_union_query(group, ioc_type)
+                                              for ioc_type, group in groups], len(groups)),
+    }
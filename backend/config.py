@@ -1,10 +1,37 @@
 import os
+import tempfile
 from dotenv import load_dotenv
+from sqlalchemy.pool import NullPool
 
 load_dotenv()
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
+def engine_options(uri, pool_size=5, max_overflow=10, pool_timeout=10, pool_recycle=1800, pre_ping=True,
+                   statement_timeout_ms=0, pgbouncer=False):
+    """SQLALCHEMY_ENGINE_OPTIONS for a database URI.
+
+    Pool sizing and the statement timeout only apply to PostgreSQL; SQLite
+    keeps the pool Flask-SQLAlchemy picks for it. In PgBouncer mode
+    PgBouncer does the pooling, so each checkout opens a fresh client
+    connection to it instead of pinning server connections in idle pools,
+    and no startup options are sent since PgBouncer rejects them.
+    """
+    if not uri.startswith('postgresql'):
+        return {}
+    if pgbouncer:
+        return {'poolclass': NullPool}
+    options = {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pre_ping,
+    }
+    if statement_timeout_ms:
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout_ms}'}
+    return options
+
 class Config:
     """Base configuration class"""
     
@@ -15,18 +42,108 @@ class Config:
     DB_PORT = os.environ.get('DB_PORT', '5432')
     DB_NAME = os.environ.get('DB_NAME', 'osinthunt')
     
-    SQLALCHEMY_DATABASE_URI = f'postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+    SQLALCHEMY_DATABASE_URI = os.environ.get(
+        'SQLALCHEMY_DATABASE_URI', f'postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Connection pool, per worker process: a worker holds up to
+    # DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so size it against the
+    # server's max_connections divided by the number of workers
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '10'))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))  # Reconnect connections older than this
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # Server-side limit per statement in milliseconds for the production
+    # server (ProductionConfig), 0 disables. The CLI commands run under this
+    # base config without it: index builds, constraint validation and bulk
+    # loads legitimately run for minutes. In PgBouncer mode set it on the
+    # role instead (ALTER ROLE ... SET statement_timeout)
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '30000'))
+    # Connect through PgBouncer in transaction pooling mode
+    DB_PGBOUNCER = os.environ.get('DB_PGBOUNCER', 'false').lower() == 'true'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        SQLALCHEMY_DATABASE_URI, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+        DB_POOL_PRE_PING, pgbouncer=DB_PGBOUNCER)
+    
     # API Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload
     
+    # Change feed (GET /api/iocs/changes)
+    CHANGES_PAGE_SIZE = 1000
+    
+    # Server-Sent Events (GET /api/events/stream)
+    SSE_CLIENT_BUFFER = 100  # Events queued per client before it is dropped
+    SSE_HEARTBEAT_SECONDS = 15
+    # Open streams per server process, 0 for no limit. Each one holds a
+    # server thread until the client disconnects; the development server
+    # starts a thread per request, gunicorn has a fixed pool (ProductionConfig)
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '50'))
+    
+    # Request and SQL instrumentation (GET /metrics)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    
+    # Opt-in request profiling: requests sending this token in the X-Profile
+    # header are profiled, one at a time per process. Unset disables
+    # profiling entirely
+    PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN')
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'osint-hunt-profiles'))
+    PROFILE_TOP_FUNCTIONS = 50
+    
+    # Batch lookup (POST /api/iocs/lookup)
+    LOOKUP_MAX_VALUES = 10000
+    IOC_INDEX_BACKGROUND_REBUILD = True  # Rebuild a stale index off the request thread
+    
+    # Lookalike domains (edit distance) reported when domain IoCs are added
+    LOOKALIKE_DISTANCE = 2
+    LOOKALIKE_MAX_DISTANCE = 3  # Largest k accepted by GET /api/iocs/similar_domains
+    
+    # IoC co-occurrence graph (GET /api/iocs/<id>/neighbours)
+    GRAPH_MAX_HOPS = 3
+    GRAPH_MAX_NODES = 100000  # Stop expanding a pivot once this many IoCs are reached
+    GRAPH_DEFAULT_LIMIT = 100
+    
+    # Near-duplicate reports (GET /api/reports/<id>/similar), estimated Jaccard
+    REPORT_SIMILARITY_THRESHOLD = 0.5
+    
+    # Retro-hunt (POST /api/retrohunt only reads exports below this directory)
+    RETROHUNT_ROOT = os.environ.get('RETROHUNT_ROOT', '/data/exports')
+    # Process pool of `flask retrohunt`, None uses every CPU; the API scans in-process
+    RETROHUNT_WORKERS = int(os.environ.get('RETROHUNT_WORKERS', '0')) or None
+    
+    # Production server (gunicorn -c gunicorn.conf.py wsgi:app). Threads keep
+    # a worker serving while others wait on the database; processes give the
+    # CPU-bound work (detection, KQL generation, index lookups) parallelism
+    # past the GIL
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '0')) or None  # None: 2 x CPUs + 1
+    SERVER_WORKER_CLASS = os.environ.get('SERVER_WORKER_CLASS', 'gthread')
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', '8'))
+    SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', '60'))  # Seconds before a stuck worker is killed
+    SERVER_GRACEFUL_TIMEOUT = 30  # Seconds in-flight requests get on shutdown
+    SERVER_MAX_REQUESTS = 10000  # Recycle a worker after this many requests, 0 never
+    SERVER_WARM_INDEXES = True  # Build the in-memory indexes once before forking workers
+    
+    # Requests slower than this are logged with their SQL totals, 0 disables
+    SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', '1.0'))
+    
     # Debugging
     DEBUG = True
 
+class ProductionConfig(Config):
+    """Configuration for the production server (wsgi.py)"""
+    DEBUG = False
+    # An open SSE stream holds one of the worker's SERVER_THREADS for its
+    # whole life, so the cap must stay well below it
+    SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '2'))
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+        Config.SQLALCHEMY_DATABASE_URI, Config.DB_POOL_SIZE, Config.DB_MAX_OVERFLOW, Config.DB_POOL_TIMEOUT,
+        Config.DB_POOL_RECYCLE, Config.DB_POOL_PRE_PING, Config.DB_STATEMENT_TIMEOUT_MS, Config.DB_PGBOUNCER)
+
 class TestConfig(Config):
     """Test configuration - uses an in-memory SQLite database"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
     DEBUG = False
+    IOC_INDEX_BACKGROUND_REBUILD = False
     WTF_CSRF_ENABLED = False  # Disable CSRF protection in tests
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""
+gunicorn settings for the production server, read from config.Config.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Workers are forked from a master that has already loaded the app
+(preload_app), then each worker resets the state it must not share with its
+siblings: pooled database connections and metrics.
+"""
+import gc
+import multiprocessing
+import signal
+
+from config import ProductionConfig as _config
+
+bind = '0.0.0.0:5000'
+preload_app = True
+workers = _config.SERVER_WORKERS or multiprocessing.cpu_count() * 2 + 1
+worker_class = _config.SERVER_WORKER_CLASS
+threads = _config.SERVER_THREADS
+timeout = _config.SERVER_TIMEOUT
+graceful_timeout = _config.SERVER_GRACEFUL_TIMEOUT
+max_requests = _config.SERVER_MAX_REQUESTS
+max_requests_jitter = max_requests // 10  # Workers must not all restart at once
+keepalive = 5
+accesslog = '-'
+errorlog = '-'
+# Request time in seconds (%(L)s) after the usual combined format
+access_log_format = '%(h)s "%(r)s" %(s)s %(b)s "%(a)s" %(L)s'
+
+
+def pre_fork(server, worker):
+    # Objects loaded by the master move to a permanent generation the
+    # collector never scans, so collections in the workers do not write to
+    # (and un-share) the pages they live in
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from wsgi import app
+    from models import db
+    from api.metrics import registry
+
+    # Connections inherited from the master share sockets with it and every
+    # sibling: forget them without closing, the pool opens fresh ones
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    # Start counting from zero, not from what the master did while loading
+    registry.clear()
+
+
+def post_worker_init(worker):
+    from api.events.broker import broker
+
+    # SSE streams never finish on their own and would hold a stopping
+    # worker until graceful_timeout; end them when shutdown begins
+    handle_exit = worker.handle_exit
+
+    def shutdown(sig, frame):
+        handle_exit(sig, frame)
+        broker.close()
+
+    signal.signal(signal.SIGTERM, shutdown)
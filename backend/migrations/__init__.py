@@ -0,0 +1,125 @@
+"""
+Versioned schema migrations.
+
+Each module in migrations/versions is one migration, applied in file name
+order and recorded in the schema_migrations table. A migration defines
+upgrade(connection), which runs in its own transaction, or on an autocommit
+connection when the module sets TRANSACTIONAL = False (needed for CREATE
+INDEX CONCURRENTLY on Postgres). An autocommit migration interrupted
+halfway is not recorded and resumes on the next run. Migrations spell
+out the tables, columns and indexes they create rather than importing the
+models, so they build the same schema however the models change later, and
+they check what exists before changing it: a database created with
+db.create_all before migrations existed is adopted by simply running them.
+
+    flask migrate            # apply pending migrations
+    flask migrate --status   # list migrations and whether they are applied
+"""
+import importlib
+import pkgutil
+from datetime import datetime
+from types import ModuleType
+from typing import List, Set
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import Column, DateTime, MetaData, String, Table, inspect, text
+from sqlalchemy.engine import Connection, Engine
+from models import db
+from . import versions
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', String(100), primary_key=True),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+# Postgres advisory lock key serializing concurrent `flask migrate` runs
+LOCK_KEY = 7_345_001
+
+
+def available() -> List[ModuleType]:
+    """Every migration module, oldest first"""
+    names = sorted(name for _, name, _ in pkgutil.iter_modules(versions.__path__))
+    return [importlib.import_module(f'{versions.__name__}.{name}') for name in names]
+
+
+def version_of(migration: ModuleType) -> str:
+    """Version recorded for a migration: its module name, e.g. '0001_baseline'"""
+    return migration.__name__.rsplit('.', 1)[-1]
+
+
+def applied(connection: Connection) -> Set[str]:
+    """Versions already applied to the database"""
+    if not inspect(connection).has_table(schema_migrations.name):
+        return set()
+    return {row.version for row in connection.execute(schema_migrations.select())}
+
+
+def _apply(connection: Connection, migration: ModuleType) -> bool:
+    """Run a migration unless already applied, returning whether it ran"""
+    version = version_of(migration)
+    if version in applied(connection):
+        return False
+    migration.upgrade(connection)
+    connection.execute(schema_migrations.insert().values(version=version, applied_at=datetime.utcnow()))
+    return True
+
+
+def upgrade(engine: Engine) -> List[str]:
+    """
+    Apply every pending migration in order.
+
+    Returns:
+        Versions applied by this call, oldest first
+    """
+    with engine.begin() as connection:
+        schema_migrations.create(connection, checkfirst=True)
+    postgres = engine.dialect.name == 'postgresql'
+
+    applied_now = []
+    for migration in available():
+        if getattr(migration, 'TRANSACTIONAL', True):
+            with engine.begin() as connection:
+                if postgres:
+                    # Another worker or container may be migrating the same database
+                    connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': LOCK_KEY})
+                    # Index builds and constraint checks on large tables outlast
+                    # any request-sized timeout, e.g. one set on the role
+                    connection.execute(text('SET LOCAL statement_timeout = 0'))
+                ran = _apply(connection, migration)
+        else:
+            with engine.connect() as connection:
+                connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+                if postgres:
+                    connection.execute(text('SELECT pg_advisory_lock(:key)'), {'key': LOCK_KEY})
+                    connection.execute(text('SET statement_timeout = 0'))
+                try:
+                    ran = _apply(connection, migration)
+                finally:
+                    if postgres:
+                        connection.execute(text('RESET statement_timeout'))
+                        connection.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+        if ran:
+            applied_now.append(version_of(migration))
+    return applied_now
+
+
+@click.command('migrate')
+@click.option('--status', is_flag=True, help='List migrations instead of applying them.')
+@with_appcontext
+def migrate_command(status):
+    """Apply pending database schema migrations."""
+    if status:
+        with db.engine.connect() as connection:
+            done = applied(connection)
+        for migration in available():
+            version = version_of(migration)
+            summary = (migration.__doc__ or '').strip().split('\n')[0]
+            click.echo(f"{'applied' if version in done else 'pending':8} {version}  {summary}")
+        return
+
+    applied_now = upgrade(db.engine)
+    for version in applied_now:
+        click.echo(f"Applied {version}")
+    click.echo(f"Applied {len(applied_now)} migrations" if applied_now else "Database is up to date")
@@ -0,0 +1,53 @@
+"""
+Baseline schema: IoCs, reports and hunting queries as first released.
+"""
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text
+
+metadata = MetaData()
+
+
+def _base_columns():
+    return [
+        Column('id', Integer, primary_key=True),
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime),
+    ]
+
+
+Table(
+    'iocs', metadata, *_base_columns(),
+    Column('value', String(255), nullable=False, index=True),
+    Column('type', String(50), nullable=False, index=True),
+    Column('description', Text),
+    Column('source', String(255)),
+    Column('confidence', Integer),
+)
+
+Table(
+    'reports', metadata, *_base_columns(),
+    Column('name', String(255), nullable=False),
+    Column('source', String(255)),
+    Column('sigma_rule', Text),
+)
+
+Table(
+    'report_iocs', metadata,
+    Column('report_id', Integer, ForeignKey('reports.id'), primary_key=True),
+    Column('ioc_id', Integer, ForeignKey('iocs.id'), primary_key=True),
+)
+
+Table(
+    'hunting_queries', metadata, *_base_columns(),
+    Column('name', String(255), nullable=False),
+    Column('description', Text),
+    Column('query_type', String(50), nullable=False),
+    Column('query_text', Text, nullable=False),
+    Column('ioc_id', Integer, ForeignKey('iocs.id'), nullable=False),
+    Column('report_id', Integer, ForeignKey('reports.id')),
+    Column('ioc_value', String(255)),
+    Column('ioc_type', String(50)),
+)
+
+
+def upgrade(connection):
+    metadata.create_all(connection, checkfirst=True)
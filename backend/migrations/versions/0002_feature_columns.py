@@ -0,0 +1,100 @@
+"""
+IoC digests, networks and hosts, report signatures, sightings, tombstones and version counters.
+"""
+from sqlalchemy import (BigInteger, Column, DateTime, ForeignKey, Index, Integer, MetaData, SmallInteger,
+                        String, Table, inspect, text)
+
+metadata = MetaData()
+
+# Only the keys referenced by the new tables
+Table('iocs', metadata, Column('id', Integer, primary_key=True))
+Table('reports', metadata, Column('id', Integer, primary_key=True))
+
+NEW_TABLES = [
+    Table(
+        'report_lsh_buckets', metadata,
+        Column('band', SmallInteger, primary_key=True),
+        Column('bucket', BigInteger, primary_key=True),
+        Column('report_id', Integer, ForeignKey('reports.id'), primary_key=True),
+        Index('ix_report_lsh_buckets_report_id', 'report_id'),
+    ),
+    Table(
+        'sightings', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('ioc_id', Integer, ForeignKey('iocs.id'), nullable=False),
+        Column('seen_at', DateTime, nullable=False),
+        Column('count', Integer, nullable=False),
+        Column('source', String(50), nullable=False),
+        Column('table_name', String(100)),
+        Column('field', String(100)),
+        Column('location', String(500)),
+        Column('created_at', DateTime),
+        Index('ix_sightings_ioc_id_seen_at', 'ioc_id', 'seen_at'),
+    ),
+    *[Table(
+        name, metadata,
+        Column('ioc_id', Integer, ForeignKey('iocs.id'), primary_key=True),
+        Column('bucket', DateTime, primary_key=True),
+        Column('count', BigInteger, nullable=False),
+        Column('last_seen', DateTime, nullable=False),
+    ) for name in ('sighting_rollups_hourly', 'sighting_rollups_daily')],
+    Table(
+        'ioc_tombstones', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('ioc_id', Integer, nullable=False),
+        Column('value', String(255), nullable=False),
+        Column('type', String(50), nullable=False),
+        Column('deleted_at', DateTime, nullable=False),
+        Index('ix_ioc_tombstones_deleted_at_id', 'deleted_at', 'id'),
+    ),
+    Table(
+        'data_versions', metadata,
+        Column('key', String(100), primary_key=True),
+        Column('version', BigInteger, nullable=False),
+    ),
+]
+
+# (table, column, type per dialect)
+COLUMNS = [
+    ('iocs', 'digest', {'postgresql': 'BYTEA', 'default': 'BLOB'}),
+    ('iocs', 'network', {'postgresql': 'CIDR', 'default': 'VARCHAR(43)'}),
+    ('iocs', 'host', {'default': 'VARCHAR(255)'}),
+    ('reports', 'minhash', {'postgresql': 'BYTEA', 'default': 'BLOB'}),
+]
+
+INDEXES = {
+    'postgresql': [
+        'CREATE INDEX IF NOT EXISTS ix_iocs_network ON iocs USING gist (network inet_ops)',
+    ],
+    'default': [
+        'CREATE INDEX IF NOT EXISTS ix_iocs_network ON iocs (network)',
+    ],
+}
+COMMON_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_iocs_digest ON iocs (digest)',
+    'CREATE INDEX IF NOT EXISTS ix_iocs_host ON iocs (host)',
+    # Drives the incremental change feed (GET /api/iocs/changes)
+    'CREATE INDEX IF NOT EXISTS ix_iocs_updated_at_id ON iocs (updated_at, id)',
+]
+
+
+def upgrade(connection):
+    dialect = connection.dialect.name
+    inspector = inspect(connection)
+    for table, column, types in COLUMNS:
+        if column not in {existing['name'] for existing in inspector.get_columns(table)}:
+            column_type = types.get(dialect, types['default'])
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+
+    metadata.create_all(connection, tables=NEW_TABLES, checkfirst=True)
+    for statement in INDEXES.get(dialect, INDEXES['default']) + COMMON_INDEXES:
+        connection.execute(text(statement))
+
+    if dialect == 'postgresql':
+        # Hashes are looked up through ix_iocs_digest, so the text index
+        # leaves them out
+        definition = connection.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE indexname = 'ix_iocs_value'")).scalar()
+        if definition is None or 'WHERE' not in definition:
+            connection.execute(text('DROP INDEX IF EXISTS ix_iocs_value'))
+            connection.execute(text('CREATE INDEX ix_iocs_value ON iocs (value) WHERE digest IS NULL'))
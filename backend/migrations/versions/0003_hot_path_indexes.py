@@ -0,0 +1,40 @@
+"""
+Indexes for hunting queries by IoC, report and value, reports by IoC and IoCs by (value, type).
+"""
+from sqlalchemy import text
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction
+TRANSACTIONAL = False
+
+# (name, table and columns, Postgres predicate)
+INDEXES = [
+    # find_by_ioc_id, GET /api/iocs/<id>/hunting_queries, IoC deletes
+    ('ix_hunting_queries_ioc_id', 'hunting_queries (ioc_id)', ''),
+    # Report deletes and GET /api/reports/<id>/generate_queries
+    ('ix_hunting_queries_report_id', 'hunting_queries (report_id)', ''),
+    # find_by_ioc_value
+    ('ix_hunting_queries_ioc_value', 'hunting_queries (ioc_value)', ''),
+    # The primary key leads with report_id; this serves IoC -> reports
+    ('ix_report_iocs_ioc_id', 'report_iocs (ioc_id)', ''),
+    # Replaces ix_iocs_value, still used for value-only lookups. Hashes are
+    # looked up through ix_iocs_digest, so on Postgres it leaves them out
+    ('ix_iocs_value_type', 'iocs (value, type)', ' WHERE digest IS NULL'),
+]
+
+
+def upgrade(connection):
+    postgres = connection.dialect.name == 'postgresql'
+    # Concurrent builds do not block writes to the table on a live database
+    concurrently = ' CONCURRENTLY' if postgres else ''
+    for name, target, predicate in INDEXES:
+        if postgres:
+            # A failed concurrent build leaves an invalid index behind that
+            # IF NOT EXISTS would keep
+            invalid = connection.execute(text(
+                "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+                "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"), {'name': name}).first()
+            if invalid:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+        connection.execute(text(
+            f'CREATE INDEX{concurrently} IF NOT EXISTS {name} ON {target}{predicate if postgres else ""}'))
+    connection.execute(text(f'DROP INDEX{concurrently} IF EXISTS ix_iocs_value'))
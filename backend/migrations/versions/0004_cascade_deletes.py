@@ -0,0 +1,92 @@
+"""
+ON DELETE actions on the foreign keys to iocs and reports, for set-based deletes.
+"""
+import re
+
+from sqlalchemy import inspect, text
+
+# ALTER TABLE ... VALIDATE CONSTRAINT should not hold the lock taken to add
+# the constraint, so each statement commits on its own
+TRANSACTIONAL = False
+
+# (table, column, referenced table, ON DELETE action)
+FOREIGN_KEYS = [
+    ('hunting_queries', 'ioc_id', 'iocs', 'CASCADE'),
+    ('hunting_queries', 'report_id', 'reports', 'SET NULL'),
+    ('report_iocs', 'report_id', 'reports', 'CASCADE'),
+    ('report_iocs', 'ioc_id', 'iocs', 'CASCADE'),
+    ('report_lsh_buckets', 'report_id', 'reports', 'CASCADE'),
+    ('sightings', 'ioc_id', 'iocs', 'CASCADE'),
+    ('sighting_rollups_hourly', 'ioc_id', 'iocs', 'CASCADE'),
+    ('sighting_rollups_daily', 'ioc_id', 'iocs', 'CASCADE'),
+]
+
+
+def _pending(connection):
+    """Foreign keys still missing their action, with their current constraint name"""
+    inspector = inspect(connection)
+    pending = []
+    for table, column, referred, action in FOREIGN_KEYS:
+        existing = next((fk for fk in inspector.get_foreign_keys(table) if fk['constrained_columns'] == [column]),
+                        None)
+        if existing is None or (existing['options'].get('ondelete') or '').upper() != action:
+            pending.append((table, column, referred, action, existing and existing['name']))
+    return pending
+
+
+def _upgrade_postgresql(connection, pending):
+    for table, column, referred, action, name in pending:
+        name = name or f'{table}_{column}_fkey'
+        # NOT VALID skips the scan of existing rows while the table is locked,
+        # VALIDATE then checks them without blocking writes
+        connection.execute(text(
+            f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}, '
+            f'ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {referred} (id) ON DELETE {action} NOT VALID'))
+        connection.execute(text(f'ALTER TABLE {table} VALIDATE CONSTRAINT {name}'))
+
+
+def _upgrade_sqlite(connection, pending):
+    """SQLite cannot alter a constraint: rebuild each table from its stored definition"""
+    actions = {}
+    for table, column, referred, action, _ in pending:
+        actions.setdefault(table, []).append((column, referred, action))
+
+    connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+    connection.exec_driver_sql('BEGIN')
+    try:
+        for table, changes in actions.items():
+            definition = connection.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table}).scalar()
+            indexes = connection.execute(text(
+                "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"),
+                {'name': table}).scalars().all()
+            for column, referred, action in changes:
+                pattern = rf'(FOREIGN KEY\s*\(\s*"?{column}"?\s*\)\s*REFERENCES\s*"?{referred}"?\s*\(\s*"?id"?\s*\))' \
+                          rf'(\s+ON DELETE (SET NULL|CASCADE|RESTRICT|NO ACTION|SET DEFAULT))?'
+                definition, found = re.subn(pattern, rf'\1 ON DELETE {action}', definition, flags=re.IGNORECASE)
+                if not found:
+                    raise RuntimeError(f"No foreign key on {table}.{column} in: {definition}")
+            definition = re.sub(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE {table}__new', definition)
+
+            connection.exec_driver_sql(definition)
+            connection.exec_driver_sql(f'INSERT INTO {table}__new SELECT * FROM {table}')
+            connection.exec_driver_sql(f'DROP TABLE {table}')
+            connection.exec_driver_sql(f'ALTER TABLE {table}__new RENAME TO {table}')
+            for index in indexes:
+                connection.exec_driver_sql(index)
+        connection.exec_driver_sql('COMMIT')
+    except Exception:
+        connection.exec_driver_sql('ROLLBACK')
+        raise
+    finally:
+        connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+
+
+def upgrade(connection):
+    pending = _pending(connection)
+    if not pending:
+        return
+    if connection.dialect.name == 'postgresql':
+        _upgrade_postgresql(connection, pending)
+    else:
+        _upgrade_sqlite(connection, pending)
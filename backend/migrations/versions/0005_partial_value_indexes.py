@@ -0,0 +1,44 @@
+"""
+Partial IoC value and digest indexes on every database.
+
+Hash IoCs have a digest and are matched through ix_iocs_digest, every other
+IoC is matched by value with digest IS NULL (IoC.text_value_in). Each index
+only covers its own rows, so a value match cannot be planned on the digest
+index, whose entries would otherwise be mostly NULL.
+"""
+from sqlalchemy import text
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction
+TRANSACTIONAL = False
+
+# (name, table and columns, predicate)
+INDEXES = [
+    ('ix_iocs_value_type', 'iocs (value, type)', 'digest IS NULL'),
+    ('ix_iocs_digest', 'iocs (digest)', 'digest IS NOT NULL'),
+]
+
+
+def _definition(connection, name):
+    if connection.dialect.name == 'postgresql':
+        return connection.execute(text("SELECT indexdef FROM pg_indexes WHERE indexname = :name"),
+                                  {'name': name}).scalar()
+    return connection.execute(text("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = :name"),
+                              {'name': name}).scalar()
+
+
+def upgrade(connection):
+    postgres = connection.dialect.name == 'postgresql'
+    for name, target, predicate in INDEXES:
+        definition = _definition(connection, name)
+        if definition is not None and 'WHERE' in definition.upper():
+            continue
+        if postgres:
+            # Build the replacement without blocking writes, then swap names
+            replacement = f'{name}_partial'
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {replacement}'))
+            connection.execute(text(f'CREATE INDEX CONCURRENTLY {replacement} ON {target} WHERE {predicate}'))
+            connection.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {name}'))
+            connection.execute(text(f'ALTER INDEX {replacement} RENAME TO {name}'))
+        else:
+            connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+            connection.execute(text(f'CREATE INDEX {name} ON {target} WHERE {predicate}'))
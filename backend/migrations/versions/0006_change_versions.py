@@ -0,0 +1,46 @@
+"""
+Commit-ordered change feed positions.
+
+IoCs and tombstones store the iocs data version of the transaction that
+wrote them. Writers serialize on that counter, so the versions follow commit
+order and the change feed orders by (change_version, id) instead of by
+timestamps. Rows written before this migration start at version 0.
+"""
+from sqlalchemy import inspect, text
+
+# CREATE INDEX CONCURRENTLY cannot run inside a transaction
+TRANSACTIONAL = False
+
+# table -> timestamp index the change feed used before
+TABLES = {
+    'iocs': 'ix_iocs_updated_at_id',
+    'ioc_tombstones': 'ix_ioc_tombstones_deleted_at_id',
+}
+
+
+def _index_valid(connection, name):
+    """Whether an index is usable, False for a failed concurrent build, None if missing"""
+    if connection.dialect.name == 'postgresql':
+        return connection.execute(text(
+            'SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name'),
+            {'name': name}).scalar()
+    exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :name"),
+                                {'name': name}).scalar()
+    return True if exists else None
+
+
+def upgrade(connection):
+    concurrently = ' CONCURRENTLY' if connection.dialect.name == 'postgresql' else ''
+    inspector = inspect(connection)
+    for table, replaced in TABLES.items():
+        if 'change_version' not in {column['name'] for column in inspector.get_columns(table)}:
+            # A constant default is a catalog-only change on Postgres 11+
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN change_version BIGINT NOT NULL DEFAULT 0'))
+
+        name = f'ix_{table}_change_version_id'
+        valid = _index_valid(connection, name)
+        if valid is False:
+            connection.execute(text(f'DROP INDEX{concurrently} {name}'))
+        if not valid:
+            connection.execute(text(f'CREATE INDEX{concurrently} {name} ON {table} (change_version, id)'))
+        connection.execute(text(f'DROP INDEX{concurrently} IF EXISTS {replaced}'))
@@ -0,0 +1,3 @@
+"""
+Migration modules, applied in file name order (NNNN_description.py).
+"""
@@ -1,11 +1,38 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import and_, event, case, column, delete, func, inspect, literal, select, table
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.dialects import postgresql
 from datetime import datetime
+from itertools import chain
 import json
-from typing import List, Dict, Any, Optional
+import sqlite3
+import time
+from typing import List, Dict, Any, Optional, Iterable
+from utils.ioc.digest import hash_digest, digest_hex
+from utils.ioc.index import indicator_host, normalize_indicator, to_network
+from utils.ioc.minhash import minhash_signature, lsh_buckets, pack_signature
 
 # Initialize SQLAlchemy instance
 db = SQLAlchemy()
 
+# Values per IN (...) list in batched lookups
+SQL_CHUNK_SIZE = 5000
+
+# The iocs data version, as the default of IoC and tombstone change_version.
+# Transactions bump it before writing their first IoC row, so every row they
+# write stores the version they commit (see _bump_ioc_version_before_flush)
+IOCS_VERSION = func.coalesce(select(column('version')).select_from(table('data_versions'))
+                             .where(column('key') == 'iocs').scalar_subquery(), 0)
+
+@event.listens_for(Engine, 'connect')
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite only enforces foreign keys, and so ON DELETE actions, when asked per connection"""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
 # Base model class with common fields
 class BaseModel(db.Model):
     __abstract__ = True
@@ -13,27 +40,63 @@ class BaseModel(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def version_keys(self):
+        """Version counters bumped whenever this row is written"""
+        return [self.__tablename__]
 
 # IoC model for storing individual Indicators of Compromise
 class IoC(BaseModel):
     __tablename__ = 'iocs'
+    __table_args__ = (
+        # Drives the incremental change feed (GET /api/iocs/changes)
+        db.Index('ix_iocs_change_version_id', 'change_version', 'id'),
+        # Matches on value and type. Hashes are looked up through
+        # ix_iocs_digest, so the text index leaves them out; queries must
+        # imply the predicate to use it (see IoC.text_value_in)
+        db.Index('ix_iocs_value_type', 'value', 'type',
+                 postgresql_where=db.text('digest IS NULL'), sqlite_where=db.text('digest IS NULL')),
+        db.Index('ix_iocs_digest', 'digest',
+                 postgresql_where=db.text('digest IS NOT NULL'), sqlite_where=db.text('digest IS NOT NULL')),
+        # Range containment (network >>= address) on Postgres is served by GiST,
+        # elsewhere the B-tree only answers exact network matches
+        db.Index('ix_iocs_network', 'network', postgresql_using='gist',
+                 postgresql_ops={'network': 'inet_ops'}),
+    )
     
-    value = db.Column(db.String(255), nullable=False, index=True)
+    value = db.Column(db.String(255), nullable=False)
     type = db.Column(db.String(50), nullable=False, index=True)  # ip, domain, hash, etc.
+    # Raw MD5/SHA1/SHA256 digest for hash IoCs, NULL for every other type
+    digest = db.Column(db.LargeBinary(32), nullable=True)
+    # Canonical network of IPv4/IPv6/CIDR IoCs ('10.0.0.0/8', '1.2.3.4/32'), NULL otherwise
+    network = db.Column(db.String(43).with_variant(postgresql.CIDR(), 'postgresql'), nullable=True)
+    # Lowercase domain of domain IoCs and host of URL IoCs, NULL otherwise
+    host = db.Column(db.String(255), nullable=True, index=True)
     description = db.Column(db.Text, nullable=True)
     source = db.Column(db.String(255), nullable=True)
     confidence = db.Column(db.Integer, nullable=True)  # Optional confidence score
+    # iocs data version of the last write. Versions follow commit order, unlike updated_at
+    change_version = db.Column(db.BigInteger, nullable=False, server_default='0',
+                               default=IOCS_VERSION, onupdate=IOCS_VERSION)
     
-    # Relationship with HuntingQueries
-    hunting_queries = db.relationship('HuntingQuery', backref='ioc', lazy='dynamic')
+    # Relationship with HuntingQueries, removed with the IoC by ON DELETE CASCADE
+    hunting_queries = db.relationship('HuntingQuery', backref='ioc', lazy='dynamic', passive_deletes=True)
+    
+    # Read-only list views of the dynamic relationships, which cannot be
+    # eager loaded (see GET /api/iocs/<id>/full)
+    hunting_query_list = db.relationship('HuntingQuery', viewonly=True, order_by='HuntingQuery.id')
+    report_list = db.relationship('Report', secondary='report_iocs', viewonly=True, order_by='Report.id')
     
     def __repr__(self):
         return f'<IoC {self.type}:{self.value}>'
     
+    def version_keys(self):
+        return [self.__tablename__, f'ioc:{self.id}']
+    
     def to_dict(self):
         return {
             'id': self.id,
-            'value': self.value,
+            'value': digest_hex(self.digest) if self.digest is not None else self.value,
             'type': self.type,
             'description': self.description,
             'source': self.source,
@@ -42,16 +105,124 @@ class IoC(BaseModel):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    @classmethod
+    def value_criterion(cls, value):
+        """SQL condition matching this value, through the digest index for hashes"""
+        digest = hash_digest(value)
+        if digest is not None:
+            return cls.digest == digest
+        return cls.text_value_in([value])
+    
+    @classmethod
+    def text_value_in(cls, values):
+        """SQL condition matching non-hash IoCs by value
+        
+        Carries the predicate of the partial ix_iocs_value_type index: Postgres
+        only uses that index when the query implies digest IS NULL.
+        """
+        values = list(values)
+        condition = cls.value == values[0] if len(values) == 1 else cls.value.in_(values)
+        return and_(cls.digest.is_(None), condition)
+    
+    @staticmethod
+    def match_key(value, ioc_type):
+        """Key under which value_criterion() and the type would find this IoC"""
+        digest = hash_digest(value)
+        return (digest if digest is not None else value, ioc_type)
+    
+    @classmethod
+    def find_existing(cls, iocs_data) -> Dict[tuple, 'IoC']:
+        """Stored IoCs matching a batch of type/value dictionaries
+        
+        The batch form of filtering on value_criterion() and type: one query
+        per SQL_CHUNK_SIZE values instead of one per IoC.
+        
+        Args:
+            iocs_data: Dictionaries with 'value' and 'type'
+        
+        Returns:
+            Matching IoCs by match_key(value, type)
+        """
+        keys = {cls.match_key(ioc_data.get('value'), ioc_data.get('type')) for ioc_data in iocs_data}
+        digests = sorted({key for key, _ in keys if isinstance(key, bytes)})
+        values = sorted({key for key, _ in keys if isinstance(key, str)})
+        found = {}
+        for hashed, batch in ((True, digests), (False, values)):
+            for start in range(0, len(batch), SQL_CHUNK_SIZE):
+                chunk = batch[start:start + SQL_CHUNK_SIZE]
+                criterion = cls.digest.in_(chunk) if hashed else cls.text_value_in(chunk)
+                for ioc in cls.query.filter(criterion).order_by(cls.id):
+                    key = (ioc.digest if hashed else ioc.value, ioc.type)
+                    if key in keys:
+                        found.setdefault(key, ioc)
+        return found
+    
+    @classmethod
+    def get_many(cls, ids) -> Dict[int, 'IoC']:
+        """IoCs by id for a batch of ids, missing ids are left out"""
+        ids = sorted({ioc_id for ioc_id in ids if isinstance(ioc_id, int)})
+        found = {}
+        for start in range(0, len(ids), SQL_CHUNK_SIZE):
+            found.update((ioc.id, ioc) for ioc in cls.query.filter(cls.id.in_(ids[start:start + SQL_CHUNK_SIZE])))
+        return found
+    
+    @classmethod
+    def delete_many(cls, criterion) -> List[int]:
+        """Delete the IoCs matching a condition with set-based statements
+        
+        Hunting queries, report memberships and sightings go with them
+        through their ON DELETE CASCADE foreign keys, and each IoC leaves a
+        tombstone copied by INSERT ... SELECT. The in-memory index and graph
+        are rebuilt afterwards, like for any bulk write.
+        
+        Args:
+            criterion: SQL condition on IoC columns, e.g. IoC.id.in_(ids)
+        
+        Returns:
+            Ids of the deleted IoCs
+        """
+        ids = db.session.execute(select(cls.id).where(criterion).order_by(cls.id)).scalars().all()
+        if ids:
+            # Before the tombstones, which store the new iocs version
+            _bump_once(db.session, ['iocs', 'report_iocs'])
+        tombstones = IoCTombstone.__table__
+        now = datetime.utcnow()
+        for start in range(0, len(ids), SQL_CHUNK_SIZE):
+            chunk = ids[start:start + SQL_CHUNK_SIZE]
+            db.session.execute(tombstones.insert().from_select(
+                ['ioc_id', 'value', 'type', 'deleted_at'],
+                select(cls.id, cls.value, cls.type, literal(now, db.DateTime)).where(cls.id.in_(chunk))))
+            db.session.execute(delete(cls).where(cls.id.in_(chunk)).execution_options(synchronize_session=False))
+            _bump_once(db.session, [f'ioc:{ioc_id}' for ioc_id in chunk])
+        if ids:
+            # The ORM delete bumped iocs and report_iocs, the cascades are unseen
+            _bump_once(db.session, ['hunting_queries', 'sightings'])
+        return ids
+    
     @classmethod
     def find_by_value(cls, value):
         """Find IoC by its value"""
-        return cls.query.filter_by(value=value).first()
+        return cls.query.filter(cls.value_criterion(value)).first()
     
     @classmethod
     def find_by_type(cls, ioc_type):
         """Find IoCs by their type"""
         return cls.query.filter_by(type=ioc_type).all()
 
+@event.listens_for(IoC, 'before_insert')
+@event.listens_for(IoC, 'before_update')
+def _set_ioc_derived_columns(mapper, connection, target):
+    """Keep the digest, network and host columns derived from the value in sync"""
+    for name, value in ioc_derived_columns(target.value).items():
+        setattr(target, name, value)
+
+def ioc_derived_columns(value: str) -> Dict[str, Any]:
+    """Value, digest, network and host columns of an IoC, for bulk inserts that bypass the ORM"""
+    digest = hash_digest(value)
+    if digest is not None:
+        value = digest_hex(digest)
+    return {'value': value, 'digest': digest, 'network': to_network(value), 'host': indicator_host(value)}
+
 # Report model for storing threat intelligence reports (not currently used)
 class Report(BaseModel):
     __tablename__ = 'reports'
@@ -59,6 +230,8 @@ class Report(BaseModel):
     name = db.Column(db.String(255), nullable=False)
     source = db.Column(db.String(255), nullable=True)  # Source/creator of the report
     sigma_rule = db.Column(db.Text, nullable=True)  # Sigma rule as text
+    # MinHash signature of the report's IoC set, maintained on flush
+    minhash = db.Column(db.LargeBinary, nullable=True)
     
     # Add a relationship to IoCs
     iocs = db.relationship('IoC', secondary='report_iocs', backref=db.backref('reports', lazy='dynamic'))
@@ -77,13 +250,20 @@ class Report(BaseModel):
         }
     
     def set_iocs(self, iocs_data):
-        """Add IoCs to this report
+        """Add IoCs to this report, creating the ones not stored yet
+        
+        Existing IoCs are looked up in one batch. Nothing is committed: the
+        caller owns the transaction, and committing here would expire every
+        IoC just linked, reloading them one by one on the next flush.
         
         Args:
             iocs_data: List of IoC data dictionaries with type, value, and optional description
         """
+        existing = IoC.find_existing(iocs_data)
+        linked = set(self.iocs)
         for ioc_data in iocs_data:
-            ioc = IoC.query.filter_by(value=ioc_data['value'], type=ioc_data['type']).first()
+            key = IoC.match_key(ioc_data['value'], ioc_data['type'])
+            ioc = existing.get(key)
             
             if not ioc:
                 # Create new IoC if it doesn't exist
@@ -93,18 +273,55 @@ class Report(BaseModel):
                     description=ioc_data.get('description')
                 )
                 db.session.add(ioc)
+                existing[key] = ioc
             
             # Add to this report if not already associated
-            if ioc not in self.iocs:
+            if ioc not in linked:
                 self.iocs.append(ioc)
+                linked.add(ioc)
         
-        db.session.commit()
         return self.iocs
 
+# LSH buckets of report MinHash signatures, one row per (band, bucket) of a report
+class ReportLSHBucket(db.Model):
+    __tablename__ = 'report_lsh_buckets'
+    __table_args__ = (
+        db.Index('ix_report_lsh_buckets_report_id', 'report_id'),
+    )
+    
+    band = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.BigInteger, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id', ondelete='CASCADE'), primary_key=True)
+
+def store_report_signature(connection, report_id: int, values: Iterable[str]) -> Optional[bytes]:
+    """Recompute a report's MinHash signature and replace its LSH buckets
+    
+    Args:
+        connection: Connection of the current transaction
+        report_id: Report to update
+        values: IoC values of the report
+    
+    Returns:
+        The packed signature, None for a report without IoCs
+    """
+    buckets = ReportLSHBucket.__table__
+    connection.execute(buckets.delete().where(buckets.c.report_id == report_id))
+    signature = minhash_signature({normalize_indicator(value)[0] for value in values})
+    packed = pack_signature(signature) if signature else None
+    connection.execute(Report.__table__.update().where(Report.__table__.c.id == report_id).values(minhash=packed))
+    if signature:
+        connection.execute(buckets.insert(), [
+            {'report_id': report_id, 'band': band, 'bucket': bucket}
+            for band, bucket in enumerate(lsh_buckets(signature))
+        ])
+    return packed
+
 # Association table for Report-IoC many-to-many relationship
 report_iocs = db.Table('report_iocs',
-    db.Column('report_id', db.Integer, db.ForeignKey('reports.id'), primary_key=True),
-    db.Column('ioc_id', db.Integer, db.ForeignKey('iocs.id'), primary_key=True)
+    db.Column('report_id', db.Integer, db.ForeignKey('reports.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('ioc_id', db.Integer, db.ForeignKey('iocs.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key leads with report_id; this serves the IoC -> reports direction
+    db.Index('ix_report_iocs_ioc_id', 'ioc_id')
 )
 
 # Hunting Query model for storing generated KQL queries
@@ -117,18 +334,24 @@ class HuntingQuery(BaseModel):
     query_text = db.Column(db.Text, nullable=False)  # The actual query content
     
     # Foreign key to IoC model
-    ioc_id = db.Column(db.Integer, db.ForeignKey('iocs.id'), nullable=False)
+    ioc_id = db.Column(db.Integer, db.ForeignKey('iocs.id', ondelete='CASCADE'), nullable=False, index=True)
     
-    # Foreign key to Report model (optional)
-    report_id = db.Column(db.Integer, db.ForeignKey('reports.id'), nullable=True)
+    # Foreign key to Report model (optional), cleared when the report is deleted
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id', ondelete='SET NULL'), nullable=True, index=True)
     
     # Store IoC value and type directly for easier access and testing
-    ioc_value = db.Column(db.String(255), nullable=True)
+    ioc_value = db.Column(db.String(255), nullable=True, index=True)
     ioc_type = db.Column(db.String(50), nullable=True)
     
     def __repr__(self):
         return f'<HuntingQuery {self.name}>'
     
+    def version_keys(self):
+        keys = [self.__tablename__]
+        if self.ioc_id is not None:
+            keys.append(f'ioc:{self.ioc_id}')
+        return keys
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -144,6 +367,14 @@ class HuntingQuery(BaseModel):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
     
+    def to_event(self):
+        """Summary of the query for event payloads"""
+        return {
+            'id': self.id,
+            'ioc_id': self.ioc_id,
+            'name': self.name
+        }
+    
     @classmethod
     def find_by_ioc_id(cls, ioc_id):
         """Find hunting queries by IoC ID"""
@@ -152,4 +383,300 @@ class HuntingQuery(BaseModel):
     @classmethod
     def find_by_ioc_value(cls, value):
         """Find hunting queries by IoC value"""
-        return cls.query.filter_by(ioc_value=value).all()
\ No newline at end of file
+        return cls.query.filter_by(ioc_value=value).all()
+
+# Sighting model recording where and when an IoC was observed
+class Sighting(db.Model):
+    __tablename__ = 'sightings'
+    __table_args__ = (
+        db.Index('ix_sightings_ioc_id_seen_at', 'ioc_id', 'seen_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ioc_id = db.Column(db.Integer, db.ForeignKey('iocs.id', ondelete='CASCADE'), nullable=False)
+    seen_at = db.Column(db.DateTime, nullable=False)  # Latest observation covered by this row
+    count = db.Column(db.Integer, nullable=False, default=1)  # Observations aggregated into this row
+    source = db.Column(db.String(50), nullable=False)  # e.g. 'retrohunt', 'analyst'
+    table_name = db.Column(db.String(100), nullable=True)  # Log table, e.g. 'DnsEvents'
+    field = db.Column(db.String(100), nullable=True)  # Column that matched
+    location = db.Column(db.String(500), nullable=True)  # Export file or other reference
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Sighting ioc={self.ioc_id} x{self.count}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'ioc_id': self.ioc_id,
+            'seen_at': self.seen_at.isoformat() if self.seen_at else None,
+            'count': self.count,
+            'source': self.source,
+            'table_name': self.table_name,
+            'field': self.field,
+            'location': self.location,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+    
+    @classmethod
+    def record(cls, rows):
+        """Insert a batch of sightings and fold it into the rollup tables
+        
+        The raw rows go in with one executemany, then the batch is
+        pre-aggregated per IoC and bucket so each rollup table receives a
+        single upsert instead of one statement per sighting.
+        
+        Args:
+            rows: List of dictionaries with Sighting column values
+        """
+        if not rows:
+            return
+        now = datetime.utcnow()
+        rows = [{'created_at': now, 'count': 1, **row} for row in rows]
+        db.session.execute(cls.__table__.insert(), rows)
+        connection = db.session.connection()
+        for rollup in (HourlySightingRollup, DailySightingRollup):
+            rollup.apply(connection, rows)
+        _bump_once(db.session, ['sightings'])
+
+# Pre-aggregated sighting counts, maintained incrementally by Sighting.record.
+# Each rollup defines bucket_start(timestamp), the start of its bucket
+class SightingRollupMixin:
+    ioc_id = db.Column(db.Integer, db.ForeignKey('iocs.id', ondelete='CASCADE'), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)  # Start of the hour/day
+    count = db.Column(db.BigInteger, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    
+    @classmethod
+    def apply(cls, connection, rows):
+        """Add a batch of sighting rows to the buckets they fall into"""
+        buckets = {}
+        for row in rows:
+            key = (row['ioc_id'], cls.bucket_start(row['seen_at']))
+            count, last_seen = buckets.get(key, (0, row['seen_at']))
+            buckets[key] = (count + row['count'], max(last_seen, row['seen_at']))
+        
+        table = cls.__table__
+        insert = dialect_insert(connection)
+        # Sorted keys keep concurrent writers locking rows in the same order
+        stmt = insert(table).values([
+            {'ioc_id': ioc_id, 'bucket': bucket, 'count': count, 'last_seen': last_seen}
+            for (ioc_id, bucket), (count, last_seen) in sorted(buckets.items())
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.ioc_id, table.c.bucket],
+            set_={
+                'count': table.c.count + stmt.excluded.count,
+                'last_seen': case(
+                    (stmt.excluded.last_seen > table.c.last_seen, stmt.excluded.last_seen),
+                    else_=table.c.last_seen
+                )
+            }
+        )
+        connection.execute(stmt)
+    
+    @classmethod
+    def series(cls, ioc_id, start):
+        """Buckets for an IoC from start onwards, oldest first"""
+        return cls.query.filter(cls.ioc_id == ioc_id, cls.bucket >= cls.bucket_start(start)) \
+            .order_by(cls.bucket).all()
+
+class HourlySightingRollup(SightingRollupMixin, db.Model):
+    __tablename__ = 'sighting_rollups_hourly'
+    
+    @classmethod
+    def bucket_start(cls, timestamp):
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+
+class DailySightingRollup(SightingRollupMixin, db.Model):
+    __tablename__ = 'sighting_rollups_daily'
+    
+    @classmethod
+    def bucket_start(cls, timestamp):
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+# Tombstones let incremental sync clients learn about deleted IoCs
+class IoCTombstone(db.Model):
+    __tablename__ = 'ioc_tombstones'
+    __table_args__ = (
+        db.Index('ix_ioc_tombstones_change_version_id', 'change_version', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    ioc_id = db.Column(db.Integer, nullable=False)
+    value = db.Column(db.String(255), nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    change_version = db.Column(db.BigInteger, nullable=False, server_default='0', default=IOCS_VERSION)
+    
+    def __repr__(self):
+        return f'<IoCTombstone {self.ioc_id}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.ioc_id,
+            'value': self.value,
+            'type': self.type,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+# Version counters used for cheap change detection (ETags, index freshness)
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    
+    # Either a table name ('iocs') or a per-row key ('ioc:42')
+    key = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.key}={self.version}>'
+    
+    @classmethod
+    def current(cls, keys):
+        """Return the current version for each key, 0 for keys never written
+        
+        Versions already read or bumped in this transaction are reused, so an
+        ETag and the in-memory indexes consulted by the same request share
+        one read.
+        """
+        keys = list(keys)
+        known = db.session.info.setdefault('data_versions', {})
+        missing = [key for key in keys if key not in known]
+        if missing:
+            rows = db.session.query(cls.key, cls.version).filter(cls.key.in_(missing)).all()
+            known.update(dict.fromkeys(missing, 0))
+            known.update(rows)
+        return {key: known[key] for key in keys}
+
+
+def dialect_insert(connection):
+    """Return the dialect specific insert() that supports ON CONFLICT"""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {connection.dialect.name}")
+    return insert
+
+
+def bump_versions(connection, keys: Iterable[str]) -> Dict[str, int]:
+    """Increment the version counters for the given keys in one statement
+    
+    New counters start from the current time in milliseconds rather than 1 so
+    that a recreated database never hands out an ETag a client already holds.
+    
+    Returns:
+        The new version of each key
+    """
+    keys = sorted(set(keys))  # Stable order avoids lock-order deadlocks
+    if not keys:
+        return {}
+    table = DataVersion.__table__
+    initial = int(time.time() * 1000)
+    insert = dialect_insert(connection)
+    stmt = insert(table).values([{'key': key, 'version': initial} for key in keys])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.key],
+        set_={'version': table.c.version + 1}
+    ).returning(table.c.key, table.c.version)
+    return dict(connection.execute(stmt).all())
+
+
+def _bump_once(session, keys):
+    """Bump each key at most once per transaction"""
+    bumped = session.info.setdefault('bumped_versions', set())
+    pending = set(keys) - bumped
+    if pending:
+        versions = bump_versions(session.connection(), pending)
+        session.info.setdefault('data_versions', {}).update(versions)
+        bumped.update(pending)
+
+
+def _written_version_keys(session) -> set:
+    """Version keys of the model rows the pending flush writes"""
+    keys = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, BaseModel):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        keys.update(obj.version_keys())
+        if _changes_report_iocs(session, obj):
+            keys.add('report_iocs')
+    return keys
+
+
+@event.listens_for(db.session, 'before_flush')
+def _bump_ioc_version_before_flush(session, flush_context, instances):
+    """Bump iocs before IoC rows are written, their change_version reads it
+    
+    The upsert locks the counter until commit, so writers of IoCs commit in
+    version order. Keys that need the ids of new rows are left to the
+    after_flush bump.
+    """
+    keys = _written_version_keys(session)
+    if 'iocs' in keys:
+        _bump_once(session, {key for key in keys if not key.endswith(':None')})
+
+
+@event.listens_for(db.session, 'after_flush')
+def _bump_versions_after_flush(session, flush_context):
+    """Bump version counters for every model row written in this flush"""
+    _bump_once(session, _written_version_keys(session))
+
+
+def _changes_report_iocs(session, obj) -> bool:
+    """Whether writing obj adds or removes report_iocs rows"""
+    if isinstance(obj, (IoC, Report)) and obj in session.deleted:
+        return True
+    return isinstance(obj, Report) and inspect(obj).attrs.iocs.history.has_changes()
+
+
+@event.listens_for(db.session, 'after_flush')
+def _record_ioc_tombstones(session, flush_context):
+    """Keep a tombstone for every IoC deleted through the session"""
+    deleted = [obj for obj in session.deleted if isinstance(obj, IoC)]
+    if deleted:
+        now = datetime.utcnow()
+        session.connection().execute(
+            IoCTombstone.__table__.insert(),
+            [{'ioc_id': ioc.id, 'value': ioc.value, 'type': ioc.type, 'deleted_at': now} for ioc in deleted]
+        )
+
+
+@event.listens_for(db.session, 'after_flush')
+def _update_report_signatures(session, flush_context):
+    """Refresh the MinHash signature of every report whose IoC set changed"""
+    connection = None
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Report) and inspect(obj).attrs.iocs.history.has_changes():
+            connection = connection or session.connection()
+            packed = store_report_signature(connection, obj.id, [ioc.value for ioc in obj.iocs])
+            set_committed_value(obj, 'minhash', packed)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _bump_versions_on_bulk_write(orm_execute_state):
+    """Bulk query.update()/query.delete() bypass the flush, bump their table here"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and issubclass(mapper.class_, BaseModel):
+        keys = [mapper.local_table.name]
+        if orm_execute_state.is_delete and mapper.class_ in (IoC, Report):
+            keys.append('report_iocs')
+        _bump_once(orm_execute_state.session, keys)
+
+
+@event.listens_for(db.session, 'after_commit')
+@event.listens_for(db.session, 'after_rollback')
+def _reset_bumped_versions(session):
+    session.info.pop('bumped_versions', None)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _forget_data_versions(session, transaction):
+    """Versions read in a transaction are only reused within it"""
+    if transaction.parent is None:
+        session.info.pop('data_versions', None)
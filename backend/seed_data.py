@@ -1,3 +1,5 @@
+import click
+from flask.cli import with_appcontext
 from models import db, Report, IoC, HuntingQuery
 from utils.kql.query_generator import generate_query
 from utils.ioc.detector import IoC_Type
@@ -154,4 +156,10 @@ level: high
         db.session.commit()
         print("Database seeding complete.")
     else:
-        print("Database already contains data, skipping seed.")
\ No newline at end of file
+        print("Database already contains data, skipping seed.")
+
+@click.command('seed')
+@with_appcontext
+def seed_command():
+    """Add example IoCs, hunting queries and a report to an empty database."""
+    create_example_data()
@@ -0,0 +1,247 @@
+"""
+Reproducible high-volume synthetic datasets for scale and load testing.
+
+Where seed_data.create_example_data adds a dozen hand-written IoCs, this
+generates millions: a realistic mix of IoC types, a power-law number of
+reports per IoC (most IoCs appear once, a few appear everywhere), hunting
+queries per IoC, and defanged pastes of the stored values. Every value
+derives from the seed, so the same command always builds the same data.
+
+Rows are streamed in batches and bulk loaded with COPY on Postgres and
+executemany elsewhere, bypassing the ORM listeners. Derived IoC columns are
+computed up front and the data versions are bumped once at the end; report
+MinHash signatures are left to `flask backfill-report-signatures`.
+"""
+import csv
+import io
+import ipaddress
+import random
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from typing import Dict, Iterator, List
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, text
+from models import db, IoC, Report, HuntingQuery, report_iocs, ioc_derived_columns, bump_versions
+from utils.ioc.defang import defang
+
+BATCH_SIZE = 50000
+
+# (stored type, weight): the detected type name, lowercased, as the API stores it
+TYPE_WEIGHTS = [
+    ('domain', 30), ('ip_address', 18), ('ipv6_address', 2), ('ip_range', 1),
+    ('hash_md5', 10), ('hash_sha1', 5), ('hash_sha256', 15), ('url', 14), ('email', 5),
+]
+
+# Reports per IoC follow a Pareto tail: P(k or more) ~ k^-REPORT_ALPHA
+REPORT_ALPHA = 1.6
+MAX_REPORTS_PER_IOC = 200
+ORPHAN_RATIO = 0.1  # IoCs in no report at all
+
+_WORDS = ['update', 'secure', 'login', 'cdn', 'mail', 'portal', 'sync', 'cloud', 'auth', 'files',
+          'billing', 'support', 'static', 'api', 'office', 'verify', 'account', 'service', 'dl', 'web']
+_SUFFIXES = ['com', 'net', 'org', 'io', 'xyz', 'ru', 'info', 'top', 'co.uk', 'com.au', 'fi', 'de']
+_PATHS = ['payload.exe', 'invoice.pdf', 'update.dll', 'login.php', 'gate.php', 'index.html', 'a.ps1']
+_TABLES = ['DeviceNetworkEvents', 'DnsEvents', 'DeviceFileEvents', 'EmailEvents', 'CommonSecurityLog']
+_SOURCES = ['MITRE ATT&CK', 'Security Research Team', 'OSINT Feed', 'Partner Sharing', 'Sandbox']
+
+
+def _synthetic_value(ioc_type: str, index: int, seed: int, rng: random.Random) -> str:
+    """A value of the given type, unique per index."""
+    if ioc_type in ('hash_md5', 'hash_sha1', 'hash_sha256'):
+        size = {'hash_md5': 16, 'hash_sha1': 20, 'hash_sha256': 32}[ioc_type]
+        return blake2b(f'{seed}:{index}'.encode(), digest_size=size).hexdigest()
+    if ioc_type == 'ip_address':
+        # An odd multiplier permutes the 32-bit space, so indexes never collide
+        return str(ipaddress.IPv4Address((index * 2654435761 + seed) % 2 ** 32))
+    if ioc_type == 'ipv6_address':
+        return str(ipaddress.IPv6Address(0x20010db8 << 96 | (index * 11400714819323198485 + seed) % 2 ** 96))
+    if ioc_type == 'ip_range':
+        prefix = rng.choice([16, 20, 24, 24, 28])
+        address = (index * 2654435761 + seed) % 2 ** 32
+        return str(ipaddress.IPv4Network((address >> (32 - prefix) << (32 - prefix), prefix)))
+    domain = f"{rng.choice(_WORDS)}-{rng.choice(_WORDS)}{index:x}.{rng.choice(_SUFFIXES)}"
+    if ioc_type == 'domain':
+        return f"{rng.choice(_WORDS)}.{domain}" if rng.random() < 0.3 else domain
+    if ioc_type == 'url':
+        return f"{rng.choice(['http', 'https'])}://{domain}/{rng.choice(_PATHS)}"
+    return f"{rng.choice(_WORDS)}{index}@{domain}"
+
+
+def _reports_per_ioc(rng: random.Random) -> int:
+    if rng.random() < ORPHAN_RATIO:
+        return 0
+    return min(MAX_REPORTS_PER_IOC, int(rng.paretovariate(REPORT_ALPHA)))
+
+
+def _queries_per_ioc(rng: random.Random) -> int:
+    return rng.choices([0, 1, 2, 3], weights=[40, 40, 15, 5])[0]
+
+
+def _copy(connection, table, columns: List[str], rows: List[Dict]):
+    """Load rows with COPY ... FROM STDIN on Postgres."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row[c] is None else
+                         '\\x' + row[c].hex() if isinstance(row[c], bytes) else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _load(connection, table, rows: List[Dict]):
+    if not rows:
+        return
+    if connection.dialect.name == 'postgresql':
+        _copy(connection, table, list(rows[0]), rows)
+    else:
+        connection.execute(table.insert(), rows)
+
+
+def _next_id(model) -> int:
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def synthetic_iocs(count: int, seed: int = 42, first_id: int = 1) -> Iterator[Dict]:
+    """Yield IoC rows with explicit ids, derived columns included."""
+    rng = random.Random(seed)
+    types = [ioc_type for ioc_type, _ in TYPE_WEIGHTS]
+    weights = [weight for _, weight in TYPE_WEIGHTS]
+    start = datetime(2024, 1, 1)
+    for index in range(count):
+        ioc_type = rng.choices(types, weights)[0]
+        created = start + timedelta(seconds=rng.randrange(365 * 86400))
+        row = ioc_derived_columns(_synthetic_value(ioc_type, first_id + index, seed, rng))
+        row.update({
+            'id': first_id + index, 'type': ioc_type,
+            'description': f"Synthetic {ioc_type.replace('_', ' ')}",
+            'source': rng.choice(_SOURCES), 'confidence': rng.randrange(30, 100, 5),
+            'created_at': created, 'updated_at': created,
+        })
+        yield row
+
+
+def generate_synthetic_data(iocs: int, reports: int = None, seed: int = 42,
+                            batch_size: int = BATCH_SIZE, progress=None) -> Dict[str, int]:
+    """
+    Append a synthetic dataset to the database.
+
+    Args:
+        iocs: Number of IoCs to create
+        reports: Number of reports, one per 25 IoCs by default
+        seed: Seed for every random choice
+        batch_size: Rows generated and loaded per batch
+        progress: Optional callable receiving the IoCs loaded so far
+
+    Returns:
+        Number of rows created per table
+    """
+    reports = reports if reports is not None else max(1, iocs // 25)
+    rng = random.Random(seed + 1)
+    connection = db.session.connection()
+    first_ioc, first_report, first_query = _next_id(IoC), _next_id(Report), _next_id(HuntingQuery)
+    now = datetime.utcnow()
+    counts = {'iocs': 0, 'reports': reports, 'report_iocs': 0, 'hunting_queries': 0}
+    # Bumped up front: the IoC rows store the new iocs version as change_version
+    versions = bump_versions(connection, ['iocs', 'reports', 'report_iocs', 'hunting_queries'])
+
+    _load(connection, Report.__table__, [{
+        'id': first_report + i, 'name': f"Synthetic campaign {first_report + i}",
+        'source': rng.choice(_SOURCES), 'sigma_rule': None, 'minhash': None,
+        'created_at': now, 'updated_at': now,
+    } for i in range(reports)])
+
+    batch, memberships, queries = [], [], []
+
+    def flush():
+        _load(connection, IoC.__table__, batch)
+        _load(connection, report_iocs, memberships)
+        _load(connection, HuntingQuery.__table__, queries)
+        counts['iocs'] += len(batch)
+        counts['report_iocs'] += len(memberships)
+        counts['hunting_queries'] += len(queries)
+        batch.clear()
+        memberships.clear()
+        queries.clear()
+        if progress:
+            progress(counts['iocs'])
+
+    for row in synthetic_iocs(iocs, seed, first_ioc):
+        row['change_version'] = versions['iocs']
+        batch.append(row)
+        report_ids = [first_report + i for i in rng.sample(range(reports), min(reports, _reports_per_ioc(rng)))]
+        memberships.extend({'report_id': report_id, 'ioc_id': row['id']} for report_id in report_ids)
+        for _ in range(_queries_per_ioc(rng)):
+            table = rng.choice(_TABLES)
+            queries.append({
+                'id': first_query + counts['hunting_queries'] + len(queries),
+                'name': f"Hunt {row['type']} in {table}", 'description': None, 'query_type': 'kql',
+                'query_text': f'{table}\n| where TimeGenerated > ago(7d)\n| where * has "{row["value"]}"',
+                'ioc_id': row['id'], 'report_id': report_ids[0] if report_ids else None,
+                'ioc_value': row['value'], 'ioc_type': row['type'],
+                'created_at': row['created_at'], 'updated_at': row['created_at'],
+            })
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    if connection.dialect.name == 'postgresql':
+        # Explicit ids leave the serial sequences behind
+        for table in ('iocs', 'reports', 'hunting_queries'):
+            connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                    f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"))
+    db.session.commit()
+    return counts
+
+
+def synthetic_paste(count: int, seed: int = 42, defang_ratio: float = 0.5, known_ratio: float = 0.5) -> str:
+    """
+    Text as an analyst would paste it: stored and unseen values, some
+    defanged, comma and newline separated.
+
+    Args:
+        count: Number of values
+        seed: Seed for the values and the mix
+        defang_ratio: Share of values defanged
+        known_ratio: Share of values drawn from the IoCs in the database
+    """
+    rng = random.Random(seed + 2)
+    last_id = _next_id(IoC) - 1
+    ids = rng.sample(range(1, last_id + 1), min(count, last_id))
+    known = [value for (value,) in db.session.query(IoC.value).filter(IoC.id.in_(ids)).order_by(IoC.id)]
+    unseen = [row['value'] for row in synthetic_iocs(count, seed + 3, first_id=10 ** 9)]
+    values = [known.pop() if known and rng.random() < known_ratio else unseen.pop() for _ in range(count)]
+    values = [defang(value) if rng.random() < defang_ratio else value for value in values]
+    lines = []
+    while values:
+        width = rng.choice([1, 1, 3])
+        lines.append(', '.join(values[:width]))
+        values = values[width:]
+    return '\n'.join(lines)
+
+
+@click.command('generate-data')
+@click.option('--iocs', default=100000, show_default=True, help='Number of IoCs to create.')
+@click.option('--reports', type=int, default=None, help='Number of reports, one per 25 IoCs by default.')
+@click.option('--seed', default=42, show_default=True, help='Random seed, the same seed builds the same data.')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True, help='Rows loaded per batch.')
+@click.option('--paste-file', type=click.Path(dir_okay=False, writable=True),
+              help='Also write a defanged paste of 1000 values, e.g. for load tests.')
+@with_appcontext
+def generate_data_command(iocs, reports, seed, batch_size, paste_file):
+    """Bulk load a reproducible synthetic dataset."""
+    started = datetime.utcnow()
+    counts = generate_synthetic_data(iocs, reports, seed, batch_size,
+                                     progress=lambda done: click.echo(f"  {done}/{iocs} IoCs"))
+    elapsed = (datetime.utcnow() - started).total_seconds()
+    click.echo(', '.join(f"{count} {table}" for table, count in counts.items()) + f" in {elapsed:.1f}s")
+    if paste_file:
+        with open(paste_file, 'w') as f:
+            f.write(synthetic_paste(1000, seed))
+        click.echo(f"Wrote {paste_file}")
+    click.echo("Run `flask backfill-report-signatures` to enable similar-report search on this data")
@@ -1,7 +1,10 @@
 import pytest
 import os
 import sys
+from collections import Counter
+from contextlib import contextmanager
 from pathlib import Path
+from sqlalchemy import event
 
 # Add the backend directory to the Python path for imports
 backend_dir = Path(__file__).parent.parent
@@ -30,6 +33,82 @@ def app():
         db.drop_all()
 
 
+class QueryCounter:
+    """SQL statements sent to the database while counting"""
+
+    def __init__(self):
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, repr(parameters)))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self):
+        """SELECTs sent more than once with the same SQL, whatever the
+        parameters: the signature of a query issued per item in a loop.
+
+        Writes are left out: without batched INSERT ... RETURNING (SQLite)
+        the ORM flush inserts new rows one statement each.
+        """
+        counts = Counter(' '.join(statement.split()) for statement, _ in self.statements
+                         if statement.lstrip().upper().startswith('SELECT'))
+        return {statement: count for statement, count in counts.items() if count > 1}
+
+    def report(self):
+        return '\n'.join(f"  {i + 1}. {statement} {parameters}"
+                         for i, (statement, parameters) in enumerate(self.statements))
+
+    def assert_budget(self, budget, allow_repeats=0):
+        """
+        Fail when more than budget statements were sent, or when the same
+        statement was sent more than allow_repeats + 1 times.
+        """
+        assert self.count <= budget, \
+            f"{self.count} SQL statements, budget is {budget}:\n{self.report()}"
+        repeats = {statement: count for statement, count in self.repeated().items() if count > allow_repeats + 1}
+        assert not repeats, "Repeated SQL statements, likely N+1:\n" + '\n'.join(
+            f"  {count}x {statement}" for statement, count in repeats.items())
+
+
+@contextmanager
+def count_queries():
+    """Count the SQL statements sent to the database inside the block
+
+        with count_queries() as queries:
+            client.get('/api/reports')
+        queries.assert_budget(2)
+    """
+    counter = QueryCounter()
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', counter._record)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._record)
+
+
+@pytest.fixture
+def query_budget(app):
+    """Assert the statements sent inside a block stay within a budget
+
+        with query_budget(3):
+            client.get('/api/iocs/1/full')
+
+    The session is emptied first so nothing loaded by the test setup is
+    served from the identity map, as in a fresh request.
+    """
+    @contextmanager
+    def within(budget, allow_repeats=0):
+        db.session.expunge_all()
+        with count_queries() as queries:
+            yield queries
+        queries.assert_budget(budget, allow_repeats)
+    return within
+
+
 @pytest.fixture
 def client(app):
     """A test client for the app"""
@@ -0,0 +1,21 @@
+"""
+Tests for the benchmark harness and its synthetic data.
+"""
+from benchmarks.data import typed_corpus
+from benchmarks.harness import compare, measure
+from utils.ioc.detector import detect_ioc_type
+
+
+def test_corpus_types_match_detection():
+    """The stored types are what the API would detect for each value"""
+    for value, ioc_type in typed_corpus(200):
+        assert detect_ioc_type(value).name.lower() == ioc_type
+
+
+def test_compare_flags_slowdowns_beyond_tolerance():
+    baseline = {"results": {"a": {"best_us": 10.0}, "b": {"best_us": 10.0}}}
+    results = {"a": {"best_us": 12.0}, "b": {"best_us": 14.0}, "new": {"best_us": 1.0}}
+    assert list(compare(results, baseline, tolerance=0.3)) == ["b"]
+
+    timing = measure(lambda: sum(range(100)), ops=100, repeat=2)
+    assert 0 < timing["best_us"] <= timing["median_us"]
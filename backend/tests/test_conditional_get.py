@@ -0,0 +1,81 @@
+"""
+Tests for ETag / If-None-Match handling backed by the version counters.
+"""
+import json
+from models import db, IoC, HuntingQuery, DataVersion
+
+
+def _add_ioc(client, value):
+    response = client.post('/api/iocs', json={'iocs': [{"value": value, "type": "domain"}]})
+    return json.loads(response.data)['added'][0]['id']
+
+
+def test_get_iocs_returns_etag_and_304(client):
+    """A repeated GET with the returned ETag is answered with 304"""
+    _add_ioc(client, "etag.example.com")
+
+    response = client.get('/api/iocs')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    assert etag
+
+    response = client.get('/api/iocs', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+
+def test_etag_changes_after_write(client):
+    """Adding and deleting IoCs invalidates the collection ETag"""
+    _add_ioc(client, "first.example.com")
+    etag = client.get('/api/iocs').headers['ETag']
+
+    ioc_id = _add_ioc(client, "second.example.com")
+    response = client.get('/api/iocs', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    client.delete(f'/api/iocs/{ioc_id}')
+    response = client.get('/api/iocs', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['iocs']) == 1
+
+
+def test_per_ioc_etag_tracks_its_hunting_queries(client):
+    """Generating a query bumps only the version of the affected IoC"""
+    ioc_id = _add_ioc(client, "queries.example.com")
+    other_id = _add_ioc(client, "other.example.com")
+
+    etag = client.get(f'/api/iocs/{ioc_id}/hunting_queries').headers['ETag']
+    other_etag = client.get(f'/api/iocs/{other_id}/hunting_queries').headers['ETag']
+
+    client.post(f'/api/iocs/{ioc_id}/generate_query', json={})
+
+    response = client.get(f'/api/iocs/{ioc_id}/hunting_queries', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(json.loads(response.data)['hunting_queries']) == 1
+
+    response = client.get(f'/api/iocs/{other_id}/hunting_queries', headers={'If-None-Match': other_etag})
+    assert response.status_code == 304
+
+
+def test_bulk_delete_bumps_table_version(app):
+    """query.delete() bypasses the flush but still bumps the table counter"""
+    ioc = IoC(value="bulk.example.com", type="domain")
+    db.session.add(ioc)
+    db.session.flush()
+    db.session.add(HuntingQuery(name="q", query_type="kql", query_text="x", ioc_id=ioc.id))
+    db.session.commit()
+    before = DataVersion.current(['hunting_queries'])['hunting_queries']
+
+    HuntingQuery.query.filter_by(ioc_id=ioc.id).delete()
+    db.session.commit()
+
+    assert DataVersion.current(['hunting_queries'])['hunting_queries'] == before + 1
+
+
+def test_not_found_has_no_etag(client):
+    """Errors are never cached"""
+    response = client.get('/api/iocs/9999')
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
@@ -0,0 +1,63 @@
+"""
+Tests for the database engine options built from the configuration.
+"""
+import importlib
+
+import config
+from sqlalchemy.pool import NullPool
+from app import create_app
+from config import Config, ProductionConfig, TestConfig, engine_options
+
+
+def test_postgres_engine_options():
+    options = engine_options('postgresql://u:p@db/osinthunt', pool_size=4, max_overflow=2, statement_timeout_ms=5000)
+    assert options['pool_size'] == 4
+    assert options['max_overflow'] == 2
+    assert options['pool_pre_ping']
+    assert options['connect_args'] == {'options': '-c statement_timeout=5000'}
+
+    assert 'connect_args' not in engine_options('postgresql://u:p@db/osinthunt')
+
+
+def test_statement_timeout_only_applies_to_the_production_server(monkeypatch):
+    """Migrations and bulk CLI commands run under Config and must not be cancelled"""
+    monkeypatch.setenv('SQLALCHEMY_DATABASE_URI', 'postgresql://u:p@db/osinthunt')
+    monkeypatch.setenv('DB_STATEMENT_TIMEOUT_MS', '5000')
+    try:
+        reloaded = importlib.reload(config)
+        assert 'connect_args' not in reloaded.Config.SQLALCHEMY_ENGINE_OPTIONS
+        assert reloaded.Config.SQLALCHEMY_ENGINE_OPTIONS['pool_size'] == 5
+        assert reloaded.ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS['connect_args'] == {
+            'options': '-c statement_timeout=5000'}
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
+
+
+def test_event_stream_cap_is_low_only_for_the_production_server():
+    """gunicorn workers have SERVER_THREADS threads, the development server a thread per request"""
+    assert ProductionConfig.SSE_MAX_STREAMS < ProductionConfig.SERVER_THREADS
+    assert Config.SSE_MAX_STREAMS > ProductionConfig.SSE_MAX_STREAMS
+
+
+def test_pgbouncer_mode_leaves_pooling_to_pgbouncer():
+    assert engine_options('postgresql://u:p@pgbouncer/osinthunt', statement_timeout_ms=5000, pgbouncer=True) == {
+        'poolclass': NullPool}
+
+
+def test_sqlite_keeps_default_pool():
+    assert engine_options('sqlite:///:memory:', statement_timeout_ms=5000) == {}
+
+
+def test_pooled_engines_are_metered(tmp_path):
+    from api.metrics.instrumentation import MeteredQueuePool
+    from models import db
+
+    class PooledConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'pooled.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 2, 'max_overflow': 0}
+
+    app = create_app(PooledConfig)
+    with app.app_context():
+        assert isinstance(db.engine.pool, MeteredQueuePool)
+        assert db.engine.pool.size() == 2
@@ -0,0 +1,94 @@
+"""
+Tests for the Server-Sent Events stream and the in-process broker.
+"""
+import json
+from api.events.broker import EventBroker, broker
+
+
+def _parse_event(chunk):
+    fields = dict(line.split(': ', 1) for line in chunk.decode().strip().split('\n'))
+    return fields['event'], json.loads(fields['data'])
+
+
+def test_broker_fans_out_to_all_subscribers():
+    """Every subscriber receives each published event"""
+    test_broker = EventBroker()
+    first = test_broker.subscribe()
+    second = test_broker.subscribe()
+
+    test_broker.publish('ioc.created', {"iocs": []})
+
+    assert 'event: ioc.created' in first.get(timeout=0)
+    assert 'event: ioc.created' in second.get(timeout=0)
+
+
+def test_broker_drops_slow_consumers():
+    """A full buffer drops the subscriber instead of blocking the publisher"""
+    test_broker = EventBroker()
+    slow = test_broker.subscribe(buffer_size=2)
+    fast = test_broker.subscribe(buffer_size=10)
+
+    for i in range(3):
+        test_broker.publish('ioc.deleted', {"ids": [i]})
+
+    assert slow.dropped
+    assert not fast.dropped
+    assert test_broker.subscriber_count == 1
+
+
+def test_broker_close_ends_streams():
+    """Closing the broker wakes and drops every subscriber"""
+    test_broker = EventBroker()
+    subscription = test_broker.subscribe()
+
+    test_broker.close()
+
+    assert subscription.dropped
+    assert subscription.get(timeout=0) is None
+    assert test_broker.subscriber_count == 0
+
+
+def test_stream_receives_write_events(client):
+    """Adding an IoC and generating a query are pushed to the stream"""
+    response = client.get('/api/events/stream', buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    stream = iter(response.response)
+    assert next(stream).startswith(b'retry:')
+
+    added = client.post('/api/iocs', json={'iocs': [{"value": "sse.example.com", "type": "domain"}]})
+    ioc_id = json.loads(added.data)['added'][0]['id']
+    event, data = _parse_event(next(stream))
+    assert event == 'ioc.created'
+    assert data['iocs'][0]['value'] == "sse.example.com"
+
+    client.post(f'/api/iocs/{ioc_id}/generate_query', json={})
+    event, data = _parse_event(next(stream))
+    assert event == 'query.generated'
+    assert data['queries'][0]['ioc_id'] == ioc_id
+
+    client.delete(f'/api/iocs/{ioc_id}')
+    event, data = _parse_event(next(stream))
+    assert event == 'ioc.deleted'
+    assert data['ids'] == [ioc_id]
+
+    response.close()
+    assert broker.subscriber_count == 0
+
+
+def test_stream_limit_per_process(client, app):
+    """Streams past SSE_MAX_STREAMS are turned away instead of holding more server threads"""
+    app.config['SSE_MAX_STREAMS'] = 1
+    first = client.get('/api/events/stream', buffered=False)
+    next(iter(first.response))
+
+    second = client.get('/api/events/stream')
+    assert second.status_code == 503
+    assert second.headers['Retry-After'] == '30'
+
+    first.close()
+    # Closed before the first chunk was sent
+    third = client.get('/api/events/stream', buffered=False)
+    assert third.status_code == 200
+    third.close()
+    assert broker.subscriber_count == 0
@@ -143,6 +143,7 @@ def test_generate_queries_for_report(client, test_data):
                 {"type": "DOMAIN", "value": "example.com", "description": "Test domain"},
                 {"type": "IP_ADDRESS", "value": "192.168.1.1", "description": "Test IP"}
             ])
+            db.session.commit()
             
     # Now test generating queries for the report
     payload = {
@@ -0,0 +1,112 @@
+"""
+Tests for the incremental IoC change feed (GET /api/iocs/changes).
+"""
+import json
+from datetime import datetime
+
+from sqlalchemy import text
+from models import db, IoC, IoCTombstone, DataVersion
+
+
+def _add_iocs(client, *values):
+    response = client.post('/api/iocs', json={'iocs': [{"value": v, "type": "domain"} for v in values]})
+    return [ioc['id'] for ioc in json.loads(response.data)['added']]
+
+
+def _changes(client, cursor=None, **params):
+    if cursor:
+        params['since'] = cursor
+    response = client.get('/api/iocs/changes', query_string=params)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+
+def test_changes_without_cursor_returns_everything(client):
+    """The first call acts as a full snapshot"""
+    _add_iocs(client, "a.example.com", "b.example.com")
+
+    data = _changes(client)
+    assert sorted(ioc['value'] for ioc in data['upserted']) == ["a.example.com", "b.example.com"]
+    assert data['deleted'] == []
+    assert data['cursor']
+    assert data['has_more'] is False
+
+
+def test_changes_since_cursor_only_returns_new_rows(client):
+    """Rows already seen are not returned again"""
+    _add_iocs(client, "old.example.com")
+    cursor = _changes(client)['cursor']
+
+    _add_iocs(client, "new.example.com")
+    data = _changes(client, cursor)
+    assert [ioc['value'] for ioc in data['upserted']] == ["new.example.com"]
+
+    data = _changes(client, data['cursor'])
+    assert data['upserted'] == []
+    assert data['deleted'] == []
+
+
+def test_changes_reports_deletes_as_tombstones(client):
+    """Deleted IoCs are returned in the 'deleted' list"""
+    ioc_id, = _add_iocs(client, "gone.example.com")
+    cursor = _changes(client)['cursor']
+
+    client.delete(f'/api/iocs/{ioc_id}')
+    data = _changes(client, cursor)
+    assert data['upserted'] == []
+    assert len(data['deleted']) == 1
+    assert data['deleted'][0]['id'] == ioc_id
+    assert data['deleted'][0]['value'] == "gone.example.com"
+
+
+def test_changes_pagination(client):
+    """Pages are bounded by 'limit' and continue from the returned cursor"""
+    _add_iocs(client, *[f"page{i}.example.com" for i in range(5)])
+
+    seen = []
+    cursor = None
+    while True:
+        data = _changes(client, cursor, limit=2)
+        assert len(data['upserted']) <= 2
+        seen.extend(ioc['value'] for ioc in data['upserted'])
+        cursor = data['cursor']
+        if not data['has_more']:
+            break
+
+    assert sorted(seen) == sorted(f"page{i}.example.com" for i in range(5))
+
+
+def test_changes_rejects_bad_cursor(client):
+    """A malformed cursor is a client error"""
+    response = client.get('/api/iocs/changes?since=not-a-cursor')
+    assert response.status_code == 400
+
+
+def test_changes_follow_commit_order_not_timestamps(client, app):
+    """A row committed after a cursor was handed out is delivered, however old its timestamp"""
+    cursor = _changes(client)['cursor']
+    # As written by a transaction that started long before it committed
+    db.session.add(IoC(value="slow.example.com", type="domain", updated_at=datetime(2000, 1, 1)))
+    db.session.commit()
+
+    ioc = IoC.query.filter_by(value="slow.example.com").one()
+    assert ioc.change_version == DataVersion.current(['iocs'])['iocs']
+    assert [ioc['value'] for ioc in _changes(client, cursor)['upserted']] == ["slow.example.com"]
+
+
+def test_changes_hold_back_uncommitted_versions(client, app):
+    """Rows tagged past the committed iocs version are not returned yet"""
+    ioc_id, = _add_iocs(client, "pending.example.com")
+    # Without bumping the counter, like a writer that has not committed yet
+    db.session.execute(text('UPDATE iocs SET change_version = change_version + 1 WHERE id = :id'), {'id': ioc_id})
+    db.session.commit()
+    assert _changes(client)['upserted'] == []
+
+
+def test_tombstones_store_the_deleting_version(client, app):
+    ioc_id, = _add_iocs(client, "gone.example.com")
+    client.delete(f'/api/iocs/{ioc_id}')
+    client.delete('/api/iocs', json={'ids': _add_iocs(client, "bulk.example.com")})
+
+    versions = [tombstone.change_version for tombstone in IoCTombstone.query.order_by(IoCTombstone.id)]
+    assert versions[0] < versions[1] == DataVersion.current(['iocs'])['iocs']
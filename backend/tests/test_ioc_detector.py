@@ -5,6 +5,7 @@ This tests the functionality of the IoC type detection.
 """
 import pytest
 from utils.ioc.detector import detect_ioc_type, IoC_Type
+from utils.ioc.suffix import public_suffix, registrable_domain
 
 
 class TestIoCDetector:
@@ -81,4 +82,33 @@ class TestIoCDetector:
         
         for value in unknown_values:
             detected_type = detect_ioc_type(value)
-            assert detected_type == IoC_Type.UNKNOWN, f"Incorrectly detected {value} as {detected_type}"
\ No newline at end of file
+            assert detected_type == IoC_Type.UNKNOWN, f"Incorrectly detected {value} as {detected_type}"
+
+    def test_file_names_are_not_domains(self):
+        """Test that file names are rejected because their extension is not a TLD."""
+        for value in ["LockBit_Ransom.exe", "invoice.pdf", "payload.dll", "host.local"]:
+            assert detect_ioc_type(value) == IoC_Type.UNKNOWN, f"Incorrectly detected {value} as a domain"
+
+        # Real TLDs that look like file extensions are still domains
+        assert detect_ioc_type("evil.zip") == IoC_Type.DOMAIN
+        assert detect_ioc_type("example.xn--fiqs8s") == IoC_Type.DOMAIN
+
+
+class TestPublicSuffix:
+    """Test cases for public suffix lookups."""
+
+    def test_public_suffix(self):
+        """Test that the longest matching rule wins, including wildcards and exceptions."""
+        assert public_suffix("evil.com") == "com"
+        assert public_suffix("a.b.evil.co.uk") == "co.uk"
+        assert public_suffix("site.github.io") == "github.io"
+        assert public_suffix("a.b.kawasaki.jp") == "b.kawasaki.jp"  # *.kawasaki.jp
+        assert public_suffix("city.kawasaki.jp") == "kawasaki.jp"   # !city.kawasaki.jp
+        assert public_suffix("ransom.exe") is None
+
+    def test_registrable_domain(self):
+        """Test extraction of the registrable domain."""
+        assert registrable_domain("a.b.Evil.co.uk") == "evil.co.uk"
+        assert registrable_domain("evil.com.") == "evil.com"
+        assert registrable_domain("co.uk") is None
+        assert registrable_domain("invoice.pdf") is None
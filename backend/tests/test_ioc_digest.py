@@ -0,0 +1,53 @@
+"""
+Tests for binary digest storage of hash IoCs.
+"""
+import json
+from sqlalchemy import text
+from models import db, IoC
+
+MD5 = "44d88612fea8a8f36de82e1278abb02f"
+
+
+def test_hash_iocs_store_digest(app):
+    """Hashes get a binary digest and a canonical lowercase value"""
+    ioc = IoC(value=MD5.upper(), type="md5_hash")
+    domain = IoC(value="evil.com", type="domain")
+    db.session.add_all([ioc, domain])
+    db.session.commit()
+
+    assert ioc.digest == bytes.fromhex(MD5)
+    assert ioc.value == MD5
+    assert domain.digest is None
+    assert ioc.to_dict()['value'] == MD5
+    assert IoC.find_by_value(MD5.upper()).id == ioc.id
+
+
+def test_hash_dedup_is_case_insensitive(client):
+    """The same hash in another case is reported as a duplicate"""
+    client.post('/api/iocs', json={'iocs': [{"value": MD5, "type": "md5_hash"}]})
+    response = client.post('/api/iocs', json={'iocs': [{"value": MD5.upper(), "type": "md5_hash"}]})
+    data = json.loads(response.data)
+    assert data['added'] == []
+    assert [ioc['value'] for ioc in data['existing']] == [MD5]
+
+
+def test_backfill_digests_command(app):
+    """Rows stored without a digest are backfilled in batches"""
+    sha1 = "3395856CE81F2B7382DEE72602F798B642F14140"
+    db.session.execute(text(
+        "INSERT INTO iocs (value, type, created_at, updated_at) VALUES "
+        "(:md5, 'md5_hash', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP), "
+        "(:sha1, 'sha1_hash', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP), "
+        "('evil.com', 'domain', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+    ), {'md5': MD5, 'sha1': sha1})
+    db.session.commit()
+    assert IoC.find_by_value(MD5) is None
+
+    result = app.test_cli_runner().invoke(args=['backfill-digests', '--batch-size', '2'])
+    assert result.exit_code == 0, result.output
+    assert "Backfilled 2 hash IoCs" in result.output
+
+    db.session.expire_all()
+    assert IoC.find_by_value(MD5) is not None
+    assert IoC.find_by_value(sha1).value == sha1.lower()
+    assert IoC.query.filter_by(value="evil.com").one().digest is None
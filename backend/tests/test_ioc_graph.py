@@ -0,0 +1,146 @@
+"""
+Tests for the IoC co-occurrence graph and the neighbours endpoint.
+"""
+import json
+import random
+import pytest
+from models import db, IoC, Report
+from api.iocs.graph import cooccurrence_graph
+from utils.ioc import graph as graph_module
+from utils.ioc.graph import CooccurrenceGraph, k_hop_neighbours
+
+
+@pytest.fixture(autouse=True)
+def cold_graph():
+    """Each test starts with a cold graph"""
+    cooccurrence_graph.reset()
+    yield
+    cooccurrence_graph.reset()
+
+
+def _edges(graph, nodes):
+    return {node: graph.neighbours(node) for node in nodes}
+
+
+class TestCooccurrenceGraph:
+    """Test cases for the in-memory adjacency."""
+
+    def test_build_counts_shared_reports(self):
+        graph = CooccurrenceGraph.build([(1, 10), (1, 11), (1, 12), (2, 10), (2, 11)])
+        assert graph.neighbours(10) == {11: 2, 12: 1}
+        assert graph.neighbours(12) == {10: 1, 11: 1}
+        assert graph.neighbours(99) == {}
+        assert graph.edge_count == 6
+
+    def test_incremental_updates_match_rebuild(self, monkeypatch):
+        """Random set_report sequences leave the same adjacency as a full build"""
+        monkeypatch.setattr(graph_module, 'COMPACT_MIN_ENTRIES', 20)
+        rng = random.Random(7)
+        graph = CooccurrenceGraph()
+        reports = {}
+        for _ in range(200):
+            report_id = rng.randrange(10)
+            members = set(rng.sample(range(30), rng.randrange(6)))
+            reports[report_id] = members
+            graph.set_report(report_id, members)
+
+        expected = CooccurrenceGraph.build((r, i) for r, members in reports.items() for i in members)
+        assert _edges(graph, range(30)) == _edges(expected, range(30))
+
+        graph.remove_member(next(iter(reports)), 999)
+        graph.compact()
+        assert _edges(graph, range(30)) == _edges(expected, range(30))
+
+    def test_compact_never_shows_a_reader_doubled_edges(self):
+        """Every state a reader can observe during compact() has the same adjacency"""
+        observed = []
+
+        class Observed(CooccurrenceGraph):
+            def __setattr__(self, name, value):
+                super().__setattr__(name, value)
+                if name != '_reports' and hasattr(self, '_reports'):
+                    observed.append(self.neighbours(10))
+
+        graph = Observed.build([(1, 10), (1, 11)])
+        graph.set_report(2, [10, 11, 12])
+        observed.clear()
+        graph.compact()
+        assert observed and all(neighbours == {11: 2, 12: 1} for neighbours in observed)
+
+    def test_k_hop_neighbours(self):
+        # 1 -2- 2 -1- 3 -5- 4, and 1 -1- 5
+        graph = CooccurrenceGraph.build([(1, 1), (1, 2), (2, 1), (2, 2), (3, 2), (3, 3),
+                                         (4, 3), (4, 4), (5, 3), (5, 4), (6, 3), (6, 4),
+                                         (7, 3), (7, 4), (8, 3), (8, 4), (9, 1), (9, 5)])
+        assert k_hop_neighbours(1, 1, graph.source) == [(2, 1, 2), (5, 1, 1)]
+        # The weight of a farther IoC is the weakest link on its strongest path
+        assert k_hop_neighbours(1, 3, graph.source) == [(2, 1, 2), (5, 1, 1), (3, 2, 1), (4, 3, 1)]
+        assert k_hop_neighbours(1, 3, graph.source, min_weight=2) == [(2, 1, 2)]
+        assert k_hop_neighbours(1, 3, graph.source, limit=1) == [(2, 1, 2)]
+
+
+@pytest.fixture
+def graph_data(app):
+    shared = [{"type": "domain", "value": "evil.com"}, {"type": "ip", "value": "10.0.0.1"}]
+    first = Report(name="First", source="Unit Test")
+    second = Report(name="Second", source="Unit Test")
+    db.session.add_all([first, second])
+    first.set_iocs(shared + [{"type": "domain", "value": "first.com"}])
+    second.set_iocs(shared)
+    db.session.commit()
+    return {ioc.value: ioc.id for ioc in IoC.query.all()}
+
+
+def _neighbours(client, ioc_id, **params):
+    response = client.get(f'/api/iocs/{ioc_id}/neighbours', query_string=params)
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    return data['source'], [(n['ioc']['value'], n['hops'], n['weight']) for n in data['neighbours']]
+
+
+def test_neighbours_cold_then_warm(client, graph_data):
+    """A cold graph falls back to SQL and the next pivot is served from memory"""
+    for expected_source in ('database', 'index'):
+        source, neighbours = _neighbours(client, graph_data["first.com"], hops=2)
+        assert source == expected_source
+        # Ties are ordered by id
+        assert neighbours == [("evil.com", 1, 1), ("10.0.0.1", 1, 1)]
+
+    _, neighbours = _neighbours(client, graph_data["evil.com"])
+    assert neighbours == [("10.0.0.1", 1, 2), ("first.com", 1, 1)]
+
+
+def test_neighbours_follow_report_changes(client, graph_data):
+    """set_iocs and deletes are applied to the warm graph in place"""
+    _neighbours(client, graph_data["evil.com"])
+
+    third = Report(name="Third", source="Unit Test")
+    db.session.add(third)
+    third.set_iocs([{"type": "domain", "value": "evil.com"}, {"type": "domain", "value": "third.com"}])
+    db.session.commit()
+    source, neighbours = _neighbours(client, graph_data["evil.com"])
+    assert source == 'index'
+    assert neighbours == [("10.0.0.1", 1, 2), ("first.com", 1, 1), ("third.com", 1, 1)]
+
+    client.delete(f'/api/iocs/{graph_data["10.0.0.1"]}')
+    db.session.delete(Report.query.filter_by(name="First").one())
+    db.session.commit()
+    source, neighbours = _neighbours(client, graph_data["evil.com"])
+    assert source == 'index'
+    assert neighbours == [("third.com", 1, 1)]
+
+
+def test_neighbours_bulk_write_makes_graph_stale(client, graph_data):
+    """Bulk deletes are not tracked, the next pivot falls back to SQL"""
+    _neighbours(client, graph_data["evil.com"])
+
+    Report.query.filter_by(name="Second").delete()
+    db.session.commit()
+    source, _ = _neighbours(client, graph_data["evil.com"])
+    assert source == 'database'
+
+
+def test_neighbours_validation(client, graph_data):
+    assert client.get('/api/iocs/9999/neighbours').status_code == 404
+    assert client.get(f'/api/iocs/{graph_data["evil.com"]}/neighbours?hops=9').status_code == 400
+    assert client.get(f'/api/iocs/{graph_data["evil.com"]}/neighbours?limit=0').status_code == 400
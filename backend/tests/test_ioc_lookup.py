@@ -0,0 +1,188 @@
+"""
+Tests for the indicator index and the batch lookup endpoint.
+"""
+import json
+import threading
+import pytest
+from models import db, IoC, Report
+from api.iocs.lookup import indicator_index
+from utils.ioc.index import IndicatorIndex, DomainTrie
+
+
+@pytest.fixture(autouse=True)
+def cold_index():
+    """Each test starts with a cold index"""
+    indicator_index.reset()
+    yield
+    indicator_index.reset()
+
+
+@pytest.fixture
+def lookup_data(app):
+    report = Report(name="Lookup Report", source="Unit Test")
+    report.set_iocs([
+        {"type": "domain", "value": "evil.com"},
+        {"type": "ip", "value": "10.0.0.1"},
+        {"type": "hash", "value": "44D88612FEA8A8F36DE82E1278ABB02F"},
+    ])
+    db.session.add(report)
+    db.session.commit()
+    return report.id
+
+
+class TestIndicatorIndex:
+    """Test cases for the in-memory index."""
+
+    def test_domain_trie_matches_parents(self):
+        trie = DomainTrie()
+        trie.add("evil.com", 1)
+        trie.add("b.evil.com", 2)
+        assert trie.match("a.b.evil.com") == [("b.evil.com", [2]), ("evil.com", [1])]
+        assert trie.match("notevil.com") == []
+
+        trie.remove("b.evil.com", 2)
+        assert trie.match("a.b.evil.com") == [("evil.com", [1])]
+        assert len(trie) == 1
+
+    def test_lookup_by_type(self):
+        index = IndicatorIndex.build([
+            (1, "evil.com"),
+            (2, "10.0.0.1"),
+            (3, "44d88612fea8a8f36de82e1278abb02f"),
+            (4, "bad@evil.com"),
+        ])
+        index.add(5, "10.0.0.0")
+
+        assert index.lookup("sub.evil[.]com") == [(1, 'parent_domain', "evil.com")]
+        assert index.lookup("hxxp://evil[.]com/payload") == [(1, 'host', "evil.com")]
+        assert index.lookup("10.0.0.1") == [(2, 'exact', "10.0.0.1")]
+        assert index.lookup("10.0.0.0") == [(5, 'exact', "10.0.0.0")]
+        assert index.lookup("44D88612FEA8A8F36DE82E1278ABB02F") == [(3, 'exact', "44d88612fea8a8f36de82e1278abb02f")]
+        assert index.lookup("bad[at]evil[.]com") == [(4, 'exact', "bad@evil.com")]
+        assert index.lookup("10.0.0.2") == []
+
+    def test_remove_reverses_add(self):
+        index = IndicatorIndex.build([(1, "evil.com"), (2, "10.0.0.1"), (3, "http://bad.org/x")])
+        assert index.lookup("a.bad.org") == [(3, 'url_host', "bad.org")]
+
+        for ioc_id, value in [(1, "evil.com"), (2, "10.0.0.1"), (3, "http://bad.org/x")]:
+            index.remove(ioc_id, value)
+        assert len(index) == 0
+        assert index.lookup("a.bad.org") == []
+        assert index.lookup("10.0.0.1") == []
+
+
+def test_lookup_endpoint_cold_then_warm(client, lookup_data):
+    """A cold index falls back to SQL and the next call is served from memory"""
+    payload = {"values": ["a.evil[.]com", "10.0.0.1", "44d88612fea8a8f36de82e1278abb02f", "clean.org"]}
+
+    response = client.post('/api/iocs/lookup', json=payload)
+    assert response.status_code == 200
+    cold = json.loads(response.data)
+    assert cold['source'] == 'database'
+
+    warm = json.loads(client.post('/api/iocs/lookup', json=payload).data)
+    assert warm['source'] == 'index'
+
+    for data in (cold, warm):
+        assert data['misses'] == ["clean.org"]
+        hits = {hit['value']: hit for hit in data['hits']}
+        assert hits["a.evil[.]com"]['normalized'] == "a.evil.com"
+        match = hits["a.evil[.]com"]['matches'][0]
+        assert match['match'] == 'parent_domain'
+        assert match['ioc']['value'] == "evil.com"
+        assert match['reports'] == [{"id": lookup_data, "name": "Lookup Report", "source": "Unit Test"}]
+        assert hits["10.0.0.1"]['matches'][0]['match'] == 'exact'
+        # Hashes are stored as digests and returned as lowercase hex
+        assert hits["44d88612fea8a8f36de82e1278abb02f"]['matches'][0]['ioc']['value'] == "44d88612fea8a8f36de82e1278abb02f"
+
+
+def test_lookup_sees_new_writes(client, lookup_data):
+    """Writes are applied to the warm index in place"""
+    client.post('/api/iocs/lookup', json={"values": ["new.example.org"]})
+
+    response = client.post('/api/iocs', json={'iocs': [{"value": "new.example.org", "type": "domain"}]})
+    data = json.loads(client.post('/api/iocs/lookup', json={"values": ["a.new.example.org"]}).data)
+    assert data['source'] == 'index'
+    assert data['hits'][0]['matches'][0]['match'] == 'parent_domain'
+
+    ioc_id = json.loads(response.data)['added'][0]['id']
+    client.delete(f'/api/iocs/{ioc_id}')
+    data = json.loads(client.post('/api/iocs/lookup', json={"values": ["new.example.org"]}).data)
+    assert data['source'] == 'index'
+    assert data['hits'] == []
+
+
+def test_index_changes_wait_for_readers(app, lookup_data):
+    """apply() does not touch the index while a reader is using it"""
+    indicator_index.rebuild()
+    version = indicator_index.version
+    writer = threading.Thread(target=indicator_index.apply, args=([('add', 999, 'late.example.org')], version + 1))
+
+    with indicator_index.current() as index:
+        writer.start()
+        writer.join(timeout=0.2)
+        assert writer.is_alive()
+        assert index.lookup('late.example.org') == []
+    writer.join()
+    assert indicator_index.version == version + 1
+    assert [ioc_id for ioc_id, _, _ in indicator_index.index.lookup('late.example.org')] == [999]
+
+
+def test_lookup_bulk_write_makes_index_stale(app, client, lookup_data):
+    """Bulk deletes are not tracked, the next lookup falls back to SQL"""
+    client.post('/api/iocs/lookup', json={"values": ["evil.com"]})
+
+    IoC.query.filter(IoC.value == "evil.com").delete()
+    db.session.commit()
+    data = json.loads(client.post('/api/iocs/lookup', json={"values": ["evil.com"]}).data)
+    assert data['source'] == 'database'
+    assert data['hits'] == []
+
+
+def test_lookup_matches_url_hosts(client):
+    """A host finds the URLs stored on it or on its parent domains"""
+    client.post('/api/iocs', json={'iocs': [{"value": "http://evil.com/payload.exe", "type": "url"}]})
+
+    for expected_source in ('database', 'index'):
+        data = json.loads(client.post('/api/iocs/lookup', json={"values": ["cdn.evil.com"]}).data)
+        assert data['source'] == expected_source
+        match = data['hits'][0]['matches'][0]
+        assert (match['match'], match['matched_value']) == ('url_host', 'evil.com')
+
+
+def test_lookup_matches_unnormalized_values(client):
+    """Values stored as typed are found by the cold path like by the index"""
+    client.post('/api/iocs', json={'iocs': [{"value": "Bad@Evil.org", "type": "email"},
+                                            {"value": "EVIL.COM", "type": "domain"},
+                                            {"value": "010.000.000.001", "type": "ip"}]})
+    indicator_index.reset()
+    payload = {"values": ["bad@evil.org", "a.evil.com", "10.0.0.1"]}
+
+    for expected_source in ('database', 'index'):
+        data = json.loads(client.post('/api/iocs/lookup', json=payload).data)
+        assert data['source'] == expected_source
+        assert data['misses'] == []
+        hits = {hit['value']: hit['matches'][0]['ioc']['value'] for hit in data['hits']}
+        assert hits == {"bad@evil.org": "Bad@Evil.org", "a.evil.com": "EVIL.COM", "10.0.0.1": "010.000.000.001"}
+
+
+def test_lookup_validation(client):
+    """Missing fields and oversized batches are rejected"""
+    assert client.post('/api/iocs/lookup', json={"other": 1}).status_code == 400
+
+    client.application.config['LOOKUP_MAX_VALUES'] = 2
+    response = client.post('/api/iocs/lookup', json={"values": ["a.com", "b.com", "c.com"]})
+    assert response.status_code == 413
+
+
+def test_check_duplicates_reports_parent_matches(client, lookup_data):
+    """Subdomains of stored domains are flagged next to exact duplicates"""
+    response = client.post('/api/iocs/check_duplicates', json={'input': "evil.com\na.b.evil.com\nclean.org"})
+    data = json.loads(response.data)
+    assert [d['ioc']['value'] for d in data['duplicates']] == ["evil.com"]
+    assert len(data['parent_matches']) == 1
+    match = data['parent_matches'][0]
+    assert match['ioc']['value'] == "a.b.evil.com"
+    assert (match['match'], match['matched_value']) == ('parent_domain', 'evil.com')
+    assert match['found']['value'] == "evil.com"
@@ -0,0 +1,125 @@
+"""
+Tests for binary indicator snapshots and the export endpoint.
+"""
+import json
+from utils.ioc.snapshot import SnapshotReader, write_snapshot, merge_delta, MD5, IPV4
+
+
+VALUES = [
+    "evil.com",
+    "b.bad.org",
+    "10.0.0.1",
+    "9.9.9.9",
+    "44D88612FEA8A8F36DE82E1278ABB02F",
+    "da39a3ee5e6b4b0d3255bfef95601890afd80709",
+    "http://evil.com/payload",
+    "phish@bad.org",
+]
+
+
+def _write(path, *args, **kwargs):
+    with open(path, 'wb') as f:
+        write_snapshot(f, *args, **kwargs)
+    return SnapshotReader(str(path))
+
+
+def test_snapshot_roundtrip(tmp_path):
+    """Every stored value is found and ordering is binary searchable"""
+    with _write(tmp_path / "full.snap", VALUES, data_version=7, metadata={"cursor": "abc"}) as snapshot:
+        assert snapshot.version == 7
+        assert not snapshot.is_delta
+        assert snapshot.metadata == {"cursor": "abc"}
+        assert len(snapshot) == len(VALUES)
+
+        for value in VALUES:
+            assert value in snapshot
+        assert "hxxp://evil[.]com/payload" in snapshot
+        assert "44d88612fea8a8f36de82e1278abb02f" in snapshot
+        assert "10.0.0.2" not in snapshot
+        assert "other.com" not in snapshot
+
+        assert list(snapshot.values(IPV4)) == ["9.9.9.9", "10.0.0.1"]
+        assert list(snapshot.values(MD5)) == ["44d88612fea8a8f36de82e1278abb02f"]
+
+
+def test_snapshot_parent_domain_matching(tmp_path):
+    with _write(tmp_path / "full.snap", VALUES) as snapshot:
+        assert snapshot.match_domain("x.y.evil.com") == ["evil.com"]
+        assert snapshot.match_domain("https://c.b.bad.org/login") == ["b.bad.org"]
+        assert snapshot.match_domain("bad.org") == []
+        assert "deep.evil.com" in snapshot
+
+
+def test_merge_delta(tmp_path):
+    """A delta applied to its base yields the next full snapshot"""
+    base = _write(tmp_path / "base.snap", VALUES, data_version=1)
+    delta = _write(tmp_path / "delta.snap", ["new.example.com", "1.2.3.4"], data_version=2,
+                   removed=["evil.com", "10.0.0.1"], base_version=1)
+    assert delta.is_delta and delta.base_version == 1
+
+    with open(tmp_path / "next.snap", 'wb') as f:
+        merge_delta(base, delta, f)
+    base.close()
+    delta.close()
+
+    with SnapshotReader(str(tmp_path / "next.snap")) as snapshot:
+        assert snapshot.version == 2
+        assert "new.example.com" in snapshot
+        assert "1.2.3.4" in snapshot
+        assert "evil.com" not in snapshot
+        assert "10.0.0.1" not in snapshot
+        assert "9.9.9.9" in snapshot
+
+
+def test_snapshot_endpoint_full_and_delta(client, tmp_path):
+    """The endpoint serves a full snapshot, then deltas from its cursor"""
+    client.post('/api/iocs', json={'iocs': [
+        {"value": "evil.com", "type": "domain"},
+        {"value": "10.0.0.1", "type": "ip"},
+    ]})
+
+    response = client.get('/api/iocs/snapshot')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/octet-stream'
+    (tmp_path / "full.snap").write_bytes(response.data)
+    full = SnapshotReader(str(tmp_path / "full.snap"))
+    assert "evil.com" in full and "10.0.0.1" in full
+
+    ioc_id = json.loads(client.get('/api/iocs').data)['iocs'][0]['id']
+    client.delete(f'/api/iocs/{ioc_id}')
+    client.post('/api/iocs', json={'iocs': [{"value": "new.example.com", "type": "domain"}]})
+
+    response = client.get('/api/iocs/snapshot', query_string={
+        'since': full.metadata['cursor'], 'base_version': full.version
+    })
+    assert response.status_code == 200
+    (tmp_path / "delta.snap").write_bytes(response.data)
+    delta = SnapshotReader(str(tmp_path / "delta.snap"))
+    assert list(delta.values()) == ["new.example.com"]
+
+    with open(tmp_path / "next.snap", 'wb') as f:
+        merge_delta(full, delta, f)
+    with SnapshotReader(str(tmp_path / "next.snap")) as snapshot:
+        assert "new.example.com" in snapshot
+        assert "evil.com" not in snapshot
+        assert "10.0.0.1" in snapshot
+    full.close()
+    delta.close()
+
+
+def test_snapshot_delta_base_version_comes_from_the_cursor(client, tmp_path):
+    """A delta is stamped with the cursor's version, a mismatched base_version is rejected"""
+    client.post('/api/iocs', json={'iocs': [{"value": "evil.com", "type": "domain"}]})
+    (tmp_path / "full.snap").write_bytes(client.get('/api/iocs/snapshot').data)
+    with SnapshotReader(str(tmp_path / "full.snap")) as full:
+        cursor, version = full.metadata['cursor'], full.version
+    client.post('/api/iocs', json={'iocs': [{"value": "new.example.com", "type": "domain"}]})
+
+    response = client.get('/api/iocs/snapshot', query_string={'since': cursor, 'base_version': version + 1})
+    assert response.status_code == 400
+
+    response = client.get('/api/iocs/snapshot', query_string={'since': cursor})
+    (tmp_path / "delta.snap").write_bytes(response.data)
+    with SnapshotReader(str(tmp_path / "delta.snap")) as delta:
+        assert delta.base_version == version
+        assert delta.version > version
@@ -1,6 +1,7 @@
 import json
 import pytest
-from models import IoC, HuntingQuery
+from models import db, IoC, HuntingQuery, Report
+from conftest import count_queries
 
 def test_add_iocs_endpoint(client):
     """Test the POST /api/iocs endpoint for adding IoCs."""
@@ -232,4 +233,136 @@ def test_bulk_generate_queries(client):
     with client.application.app_context():
         for ioc_id in ioc_ids:
             queries = HuntingQuery.query.filter_by(ioc_id=ioc_id).all()
-            assert len(queries) == 1
\ No newline at end of file
+            assert len(queries) == 1
+
+
+def test_get_ioc_full_loads_in_fixed_statements(client, app):
+    """GET /api/iocs/<id>/full runs the same number of statements for any fan-out."""
+    def create(value, related):
+        ioc_id = json.loads(client.post('/api/iocs', json={'iocs': [{"value": value, "type": "domain"}]}).data)['added'][0]['id']
+        for i in range(related):
+            report = Report(name=f"{value} report {i}", source="Unit Test")
+            db.session.add(report)
+            report.iocs.append(db.session.get(IoC, ioc_id))
+            db.session.add(HuntingQuery(name=f"{value} query {i}", query_type="kql", query_text="q", ioc_id=ioc_id))
+        db.session.commit()
+        client.post(f'/api/iocs/{ioc_id}/sightings', json={'sightings': [{"source": "analyst"}] * related})
+        return ioc_id
+
+    counts = []
+    for value, related in (("one.com", 1), ("many.com", 10)):
+        ioc_id = create(value, related)
+        db.session.expunge_all()
+        with count_queries() as queries:
+            response = client.get(f'/api/iocs/{ioc_id}/full')
+        counts.append(queries.count)
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['ioc']['value'] == value
+        assert len(data['reports']) == related
+        assert len(data['hunting_queries']) == related
+        assert 'query_text' not in data['hunting_queries'][0]
+        assert data['sightings'] == related
+
+    # ETag version read, IoC with sighting total, hunting queries, reports
+    assert counts == [4, 4]
+
+    data = json.loads(client.get(f'/api/iocs/{ioc_id}/full?queries=full').data)
+    assert data['hunting_queries'][0]['query_text'] == "q"
+    assert client.get('/api/iocs/9999/full').status_code == 404
+    assert client.get(f'/api/iocs/{ioc_id}/full?queries=other').status_code == 400
+
+
+def test_add_iocs_matches_existing_in_one_batch(client, test_data):
+    """Existing IoCs, hashes in any case and repeats within the batch are all found"""
+    client.post('/api/iocs', json={'iocs': [{"value": "44d88612fea8a8f36de82e1278abb02f", "type": "hash_md5"}]})
+
+    response = client.post('/api/iocs', json={'iocs': [
+        {"value": "example.com", "type": "domain"},
+        {"value": "44D88612FEA8A8F36DE82E1278ABB02F", "type": "hash_md5"},
+        {"value": "fresh.com", "type": "domain"},
+        {"value": "fresh.com", "type": "domain"},
+        {"value": "example.com", "type": "url"},
+    ]})
+
+    data = json.loads(response.data)
+    assert [ioc['value'] for ioc in data['added']] == ["fresh.com", "example.com"]
+    assert [ioc['value'] for ioc in data['existing']] == \
+        ["example.com", "44d88612fea8a8f36de82e1278abb02f", "fresh.com"]
+    assert data['existing'][2]['id'] == data['added'][0]['id']
+
+
+def test_bulk_delete_by_ids_cascades(client, test_data, query_budget):
+    """Deleting IoCs takes their queries, report links and sightings along in a few statements"""
+    from datetime import datetime
+    from models import db, Report, Sighting, DailySightingRollup, IoCTombstone
+
+    iocs = {ioc.value: ioc.id for ioc in IoC.query.all()}
+    target = iocs["example.com"]
+    client.post(f'/api/iocs/{target}/generate_query')
+    Sighting.record([{'ioc_id': target, 'seen_at': datetime.utcnow(), 'source': 'analyst'}])
+    db.session.commit()
+    etag = client.get(f'/api/iocs/{target}').headers['ETag']
+
+    with query_budget(9):
+        response = client.delete('/api/iocs', json={'ids': [target, 9999]})
+    assert response.status_code == 200
+    assert json.loads(response.data)['deleted'] == [target]
+
+    db.session.expire_all()
+    assert db.session.get(IoC, target) is None
+    assert HuntingQuery.query.filter_by(ioc_id=target).count() == 0
+    assert Sighting.query.filter_by(ioc_id=target).count() == 0
+    assert DailySightingRollup.query.filter_by(ioc_id=target).count() == 0
+    assert [ioc.value for ioc in db.session.get(Report, test_data['report_id']).iocs] == ["192.168.1.1"]
+    assert [(t.ioc_id, t.value) for t in IoCTombstone.query.all()] == [(target, "example.com")]
+    assert client.get(f'/api/iocs/{target}', headers={'If-None-Match': etag}).status_code == 404
+    assert [ioc['id'] for ioc in json.loads(client.get('/api/iocs').data)['iocs']] == [iocs["192.168.1.1"]]
+
+
+def test_bulk_delete_by_filter(client, test_data):
+    client.post('/api/iocs', json={'iocs': [
+        {"value": "bad1.com", "type": "domain", "source": "bad import"},
+        {"value": "bad2.com", "type": "domain", "source": "bad import"},
+        {"value": "10.6.6.6", "type": "ip_address", "source": "bad import"},
+    ]})
+
+    response = client.delete('/api/iocs', json={'filter': {'source': 'bad import', 'type': 'domain'}})
+    assert json.loads(response.data)['message'] == "Deleted 2 IoCs"
+    assert sorted(ioc.value for ioc in IoC.query.all()) == ["10.6.6.6", "192.168.1.1", "example.com"]
+
+    response = client.delete('/api/iocs', json={'filter': {'report_id': test_data['report_id']}})
+    assert len(json.loads(response.data)['deleted']) == 2
+    assert [ioc.value for ioc in IoC.query.all()] == ["10.6.6.6"]
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    {'ids': [1], 'filter': {'type': 'domain'}},
+    {'ids': '1,2'},
+    {'filter': {}},
+    {'filter': {'value': 'x'}},
+    {'filter': {'created_after': 'yesterday'}},
+])
+def test_bulk_delete_rejects_bad_requests(client, test_data, body):
+    assert client.delete('/api/iocs', json=body).status_code == 400
+    assert IoC.query.count() == 2
+
+
+def test_bulk_delete_filter_converts_offsets_to_utc(client, test_data):
+    from datetime import datetime, timedelta, timezone
+    from models import db
+
+    created = datetime(2024, 5, 1, 12, 0)
+    IoC.query.update({IoC.created_at: created})
+    db.session.commit()
+
+    # 13:30+02:00 is 11:30 UTC, before both IoCs were created
+    before = (created - timedelta(minutes=30)).replace(tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=2)))
+    response = client.delete('/api/iocs', json={'filter': {'created_before': before.isoformat()}})
+    assert json.loads(response.data)['deleted'] == []
+
+    after = before.replace(hour=14, minute=30)
+    response = client.delete('/api/iocs', json={'filter': {'created_before': after.isoformat()}})
+    assert len(json.loads(response.data)['deleted']) == 2
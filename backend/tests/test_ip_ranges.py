@@ -0,0 +1,169 @@
+"""
+Tests for IPv6 / CIDR indicators and range-containment lookups.
+"""
+import json
+import threading
+import time
+from sqlalchemy import text
+from models import db, IoC
+from utils.ioc.detector import detect_ioc_type, IoC_Type
+from utils.ioc.index import IndicatorIndex, normalize_indicator, to_network
+from utils.ioc.ranges import NetworkIndex, covering_networks
+from utils.kql.query_generator import KQLQueryGenerator
+from api.iocs.lookup import indicator_index
+
+
+def test_detects_ipv6_and_ranges():
+    """IPv6 addresses and CIDR ranges get their own types"""
+    assert detect_ioc_type("2001:db8::1") == IoC_Type.IPV6_ADDRESS
+    assert detect_ioc_type("::ffff:10.0.0.1") == IoC_Type.IPV6_ADDRESS
+    assert detect_ioc_type("10.0.0.0/8") == IoC_Type.IP_RANGE
+    assert detect_ioc_type("2001:db8::/32") == IoC_Type.IP_RANGE
+    assert detect_ioc_type("10.0.0.0/33") != IoC_Type.IP_RANGE
+    assert detect_ioc_type("evil.com/8") == IoC_Type.URL
+    assert detect_ioc_type("10.0.0.1") == IoC_Type.IP_ADDRESS
+
+
+def test_normalizes_networks():
+    """Host bits are cleared and IPv6 is compressed"""
+    assert normalize_indicator("10.1.2.3/8") == ("10.0.0.0/8", IoC_Type.IP_RANGE)
+    assert normalize_indicator("2001:DB8:0:0::1") == ("2001:db8::1", IoC_Type.IPV6_ADDRESS)
+    assert to_network("192.168.1.1") == "192.168.1.1/32"
+    assert to_network("evil.com") is None
+
+
+def test_network_index_returns_nested_ranges_most_specific_first():
+    """Containment follows the nesting of the stored ranges"""
+    index = NetworkIndex()
+    index.add("10.0.0.0/8", 1)
+    index.add("10.1.0.0/16", 2)
+    index.add("10.1.2.0/24", 3)
+    index.add("10.2.0.0/16", 4)
+    index.add("11.0.0.0/8", 5)
+    index.add("2001:db8::/32", 6)
+
+    assert index.containing("10.1.2.3") == [("10.1.2.0/24", [3]), ("10.1.0.0/16", [2]), ("10.0.0.0/8", [1])]
+    # The last range starting before the address does not contain it, its parent does
+    assert index.containing("10.1.3.1") == [("10.1.0.0/16", [2]), ("10.0.0.0/8", [1])]
+    assert index.containing("10.3.0.1") == [("10.0.0.0/8", [1])]
+    assert index.containing("12.0.0.1") == []
+    assert index.containing("2001:db8::1") == [("2001:db8::/32", [6])]
+
+    index.remove("10.1.0.0/16", 2)
+    assert index.containing("10.1.2.3") == [("10.1.2.0/24", [3]), ("10.0.0.0/8", [1])]
+
+
+def test_network_index_rebuilds_once_for_concurrent_readers():
+    """Readers arriving during a re-sort wait for it instead of sorting again"""
+    index = NetworkIndex()
+    index.add("10.0.0.0/8", 1)
+    family = index._families[4]
+    rebuilds = []
+    rebuild = family._rebuild
+
+    def slow_rebuild():
+        rebuilds.append(True)
+        time.sleep(0.05)
+        rebuild()
+
+    family._rebuild = slow_rebuild
+    results = []
+    readers = [threading.Thread(target=lambda: results.append(index.containing("10.1.2.3"))) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    assert rebuilds == [True]
+    assert results == [[("10.0.0.0/8", [1])]] * 4
+
+
+def test_network_index_keeps_networks_added_during_a_rebuild():
+    """A network added after the rebuild read the networks is sorted in on the next lookup"""
+    index = NetworkIndex()
+    family = index._families[4]
+
+    class AddsWhileRead(dict):
+        def __iter__(self):
+            names = list(dict.__iter__(self))
+            if "10.1.0.0/16" not in self:
+                index.add("10.1.0.0/16", 2)
+            return iter(names)
+
+    family.networks = AddsWhileRead()
+    index.add("10.0.0.0/8", 1)
+    assert index.containing("10.1.2.3") == [("10.0.0.0/8", [1])]
+    assert index.containing("10.1.2.3") == [("10.1.0.0/16", [2]), ("10.0.0.0/8", [1])]
+
+
+def test_covering_networks_enumerates_every_prefix():
+    """An IPv4 address is covered by 33 candidate networks"""
+    networks = covering_networks("10.1.2.3")
+    assert len(networks) == 33
+    assert "10.0.0.0/8" in networks and "10.1.2.3/32" in networks
+
+
+def test_indicator_index_reports_range_hits():
+    """Looking up an address also returns the ranges containing it"""
+    index = IndicatorIndex.build([(1, "10.0.0.0/8"), (2, "10.0.0.1"), (3, "2001:db8::/32")])
+    assert sorted(index.lookup("10.0.0.1")) == [(1, "range", "10.0.0.0/8"), (2, "exact", "10.0.0.1")]
+    assert index.lookup("10.0.0.0/8") == [(1, "exact", "10.0.0.0/8")]
+    assert index.lookup("2001:db8::ff") == [(3, "range", "2001:db8::/32")]
+
+
+def test_kql_uses_range_functions():
+    """Ranges are hunted with ipv4_is_in_range / ipv6_is_in_range"""
+    queries = KQLQueryGenerator.generate_query("10.0.0.0/8")
+    assert 'ipv4_is_in_range(SourceIP, "10.0.0.0/8")' in queries["CommonSecurityLog"]
+    queries = KQLQueryGenerator.generate_query("2001:db8::/32")
+    assert 'ipv6_is_in_range(RemoteIP, "2001:db8::/32")' in queries["DeviceNetworkEvents"]
+
+
+def test_network_column_is_set(app):
+    """IP IoCs store their canonical network"""
+    ioc = IoC(value="10.1.2.3/8", type="ip_range")
+    db.session.add(ioc)
+    db.session.commit()
+    assert ioc.network == "10.0.0.0/8"
+
+
+def test_containing_endpoint_cold_then_warm(client):
+    """The same answer comes from SQL while the index is cold and from the index once built"""
+    indicator_index.reset()
+    client.post('/api/iocs', json={'iocs': [
+        {"value": "10.0.0.0/8", "type": "ip_range"},
+        {"value": "10.1.0.0/16", "type": "ip_range"},
+        {"value": "10.1.2.3", "type": "ip_address"},
+        {"value": "192.168.0.0/16", "type": "ip_range"},
+    ]})
+
+    results = []
+    for _ in range(2):
+        response = client.get('/api/iocs/containing?address=10.1.2.3')
+        assert response.status_code == 200
+        results.append(json.loads(response.data))
+
+    assert [r['source'] for r in results] == ['database', 'index']
+    for data in results:
+        assert [m['network'] for m in data['matches']] == ["10.1.2.3/32", "10.1.0.0/16", "10.0.0.0/8"]
+
+
+def test_containing_endpoint_rejects_non_addresses(client):
+    """Only IP addresses can be looked up"""
+    assert client.get('/api/iocs/containing?address=evil.com').status_code == 400
+    assert client.get('/api/iocs/containing').status_code == 400
+
+
+def test_backfill_networks_command(app):
+    """IP rows stored without a network are backfilled"""
+    db.session.execute(text(
+        "INSERT INTO iocs (value, type, created_at, updated_at) VALUES "
+        "('172.16.0.0/12', 'ip_range', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP), "
+        "('evil.com', 'domain', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+    ))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['backfill-networks'])
+    assert result.exit_code == 0, result.output
+    assert "Backfilled 1 IP IoCs" in result.output
+    db.session.expire_all()
+    assert IoC.query.filter_by(value="172.16.0.0/12").one().network == "172.16.0.0/12"
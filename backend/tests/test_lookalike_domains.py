@@ -0,0 +1,101 @@
+"""
+Tests for the BK-tree lookalike domain search.
+"""
+import json
+import random
+import pytest
+from api.iocs.lookup import indicator_index
+from utils.ioc.bktree import BKTree, levenshtein
+
+
+@pytest.fixture(autouse=True)
+def cold_index():
+    indicator_index.reset()
+    yield
+    indicator_index.reset()
+
+
+def test_levenshtein():
+    assert levenshtein("paypal.com", "paypal.com") == 0
+    assert levenshtein("paypal.com", "paypa1.com") == 1
+    assert levenshtein("paypal.com", "paypall.com") == 1
+    assert levenshtein("kitten", "sitting") == 3
+    assert levenshtein("", "abc") == 3
+
+
+def test_bktree_matches_brute_force():
+    """The tree returns exactly what a full scan would"""
+    rng = random.Random(7)
+    words = {''.join(rng.choice("abcde") for _ in range(rng.randint(3, 8))) + ".com" for _ in range(300)}
+    tree = BKTree()
+    for i, word in enumerate(sorted(words)):
+        tree.add(word, i)
+    ids = {word: i for i, word in enumerate(sorted(words))}
+
+    for query in ["abcd.com", "eeee.com", "abcabc.com"]:
+        for k in (0, 1, 2):
+            expected = sorted((levenshtein(query, w), w, [ids[w]]) for w in words if levenshtein(query, w) <= k)
+            assert tree.search(query, k) == expected
+
+
+def test_bktree_remove():
+    tree = BKTree()
+    tree.add("evil.com", 1)
+    tree.add("evi1.com", 2)
+    tree.remove("evil.com", 1)
+    assert tree.search("evil.com", 1) == [(1, "evi1.com", [2])]
+    assert len(tree) == 1
+
+
+def test_similar_domains_endpoint(client):
+    """Stored domains within k edits are returned closest first"""
+    client.post('/api/iocs', json={'iocs': [
+        {"value": "paypal.com", "type": "domain"},
+        {"value": "paypa1.com", "type": "domain"},
+        {"value": "example.org", "type": "domain"},
+    ]})
+
+    for _ in range(2):  # Cold fallback, then the warm index
+        response = client.get('/api/iocs/similar_domains?domain=paypall.com&k=2')
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert [(m['domain'], m['distance']) for m in data['matches']] == [("paypal.com", 1), ("paypa1.com", 2)]
+
+    assert client.get('/api/iocs/similar_domains?domain=paypal.com&k=9').status_code == 400
+    assert client.get('/api/iocs/similar_domains?domain=invoice.pdf').status_code == 400
+
+
+def test_add_ioc_reports_lookalikes(client):
+    """New domains close to stored ones are flagged in the add response"""
+    client.post('/api/iocs', json={'iocs': [{"value": "microsoft.com", "type": "domain"}]})
+    client.get('/api/iocs/similar_domains?domain=microsoft.com')  # Warm the index
+
+    response = client.post('/api/iocs', json={'iocs': [
+        {"value": "micros0ft.com", "type": "domain"},
+        {"value": "unrelated.net", "type": "domain"},
+    ]})
+    data = json.loads(response.data)
+    assert data['lookalikes_pending'] is False
+    assert len(data['lookalikes']) == 1
+    lookalike = data['lookalikes'][0]
+    assert lookalike['ioc']['value'] == "micros0ft.com"
+    assert [(m['domain'], m['distance']) for m in lookalike['matches']] == [("microsoft.com", 1)]
+
+
+def test_add_ioc_does_not_scan_for_lookalikes_when_index_is_cold(client):
+    """A cold index reports the check as pending instead of scanning every domain"""
+    from api.iocs.lookup import indicator_index
+
+    client.post('/api/iocs', json={'iocs': [{"value": "microsoft.com", "type": "domain"}]})
+    indicator_index.reset()
+
+    response = client.post('/api/iocs', json={'iocs': [{"value": "micros0ft.com", "type": "domain"}]})
+    data = json.loads(response.data)
+    assert data['lookalikes'] == []
+    assert data['lookalikes_pending'] is True
+
+    # The rebuild was scheduled, so the next insert is checked again
+    response = client.post('/api/iocs', json={'iocs': [{"value": "microsoft.co", "type": "domain"}]})
+    data = json.loads(response.data)
+    assert data['lookalikes_pending'] is False
+    assert [m['domain'] for m in data['lookalikes'][0]['matches']] == ["microsoft.com", "micros0ft.com"]
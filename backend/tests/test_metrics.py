@@ -0,0 +1,86 @@
+"""
+Tests for the request instrumentation and the /metrics endpoint.
+"""
+import pytest
+from api.metrics import registry
+from api.metrics.registry import Registry
+
+
+@pytest.fixture(autouse=True)
+def empty_registry():
+    registry.clear()
+    yield
+    registry.clear()
+
+
+def test_registry_renders_prometheus_text():
+    metrics = Registry()
+    requests = metrics.counter('jobs_total', 'Jobs run', ('queue',))
+    latency = metrics.histogram('job_seconds', 'Job latency', ('queue',), buckets=(0.1, 1.0))
+    requests.inc(queue='a "quoted" name')
+    latency.observe(0.05, queue='a')
+    latency.observe(0.5, queue='a')
+
+    assert metrics.render().splitlines() == [
+        '# HELP job_seconds Job latency',
+        '# TYPE job_seconds histogram',
+        'job_seconds_bucket{queue="a",le="0.1"} 1',
+        'job_seconds_bucket{queue="a",le="1.0"} 2',
+        'job_seconds_bucket{queue="a",le="+Inf"} 2',
+        'job_seconds_sum{queue="a"} 0.55',
+        'job_seconds_count{queue="a"} 2',
+        '# HELP jobs_total Jobs run',
+        '# TYPE jobs_total counter',
+        'jobs_total{queue="a \\"quoted\\" name"} 1',
+    ]
+    with pytest.raises(ValueError):
+        requests.inc(other='x')
+
+
+def test_requests_record_latency_sql_and_size(client, test_data):
+    from api.metrics.instrumentation import (request_duration, request_statements, request_rows,
+                                             response_size, statement_duration)
+    endpoint = 'api.reports.get_all_reports'
+    response = client.get('/api/reports')
+    assert response.status_code == 200
+
+    assert request_duration.count(endpoint=endpoint, method='GET', status='200') == 1
+    assert request_statements.sum(endpoint=endpoint) >= 1
+    assert request_rows.sum(endpoint=endpoint) >= 1
+    assert response_size.sum(endpoint=endpoint) == len(response.data)
+    assert statement_duration.count(endpoint=endpoint) == request_statements.sum(endpoint=endpoint)
+
+    client.get('/api/nowhere')
+    assert request_duration.count(endpoint='unmatched', method='GET', status='404') == 1
+
+    body = client.get('/metrics')
+    assert body.mimetype == 'text/plain'
+    text = body.data.decode()
+    assert f'http_request_duration_seconds_count{{endpoint="{endpoint}",method="GET",status="200"}} 1' in text
+    assert '# TYPE http_request_sql_statements histogram' in text
+
+
+def test_slow_requests_are_logged(app, client, caplog):
+    app.config['SLOW_REQUEST_SECONDS'] = 1e-9
+    client.get('/api/reports?page=1')
+    assert "Slow request: GET /api/reports?page=1 -> 200" in caplog.text
+
+    caplog.clear()
+    app.config['SLOW_REQUEST_SECONDS'] = 0
+    client.get('/api/reports')
+    assert "Slow request" not in caplog.text
+
+
+def test_pool_checkout_wait_and_timeouts():
+    from sqlalchemy import create_engine, exc
+    from api.metrics.instrumentation import MeteredQueuePool, pool_checkout_wait, pool_checkout_timeouts
+    engine = create_engine('sqlite://', poolclass=MeteredQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05)
+
+    with engine.connect():
+        assert pool_checkout_wait.count() == 1
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+    assert pool_checkout_timeouts.value() == 1
+    assert pool_checkout_wait.count() == 2
+    assert pool_checkout_wait.sum() >= 0.05
+    engine.dispose()
@@ -0,0 +1,90 @@
+"""
+Tests for the schema migrations and the migrate and seed commands.
+"""
+import importlib
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+import migrations
+from models import db, IoC
+
+
+def _schema(engine):
+    """Tables with their columns, indexes, foreign keys and primary keys, as reflected"""
+    inspector = inspect(engine)
+    return {table: {
+        'columns': sorted((c['name'], str(c['type']), c['nullable']) for c in inspector.get_columns(table)),
+        'indexes': sorted((i['name'], tuple(i['column_names']), bool(i['unique']),
+                           str(i.get('dialect_options', {}).get('sqlite_where', '')))
+                          for i in inspector.get_indexes(table)),
+        'foreign_keys': sorted((tuple(fk['constrained_columns']), fk['referred_table'], fk['options'].get('ondelete'))
+                               for fk in inspector.get_foreign_keys(table)),
+        'primary_key': inspector.get_pk_constraint(table)['constrained_columns'],
+    } for table in inspector.get_table_names() if table != migrations.schema_migrations.name}
+
+
+@pytest.fixture
+def engines(tmp_path):
+    created = {name: create_engine(f"sqlite:///{tmp_path / f'{name}.db'}") for name in ('models', 'migrated')}
+    yield created
+    for engine in created.values():
+        engine.dispose()
+
+
+def test_migrations_build_the_model_schema(engines):
+    """Changing a model without a migration fails here"""
+    db.metadata.create_all(engines['models'])
+    applied = migrations.upgrade(engines['migrated'])
+
+    assert applied == [migrations.version_of(m) for m in migrations.available()]
+    assert _schema(engines['migrated']) == _schema(engines['models'])
+    assert migrations.upgrade(engines['migrated']) == []
+
+
+def test_migrations_adopt_existing_databases(engines):
+    """Databases from create_all or from the first release are brought up to date"""
+    db.metadata.create_all(engines['models'])
+    before = _schema(engines['models'])
+    migrations.upgrade(engines['models'])
+    assert _schema(engines['models']) == before
+
+    baseline = importlib.import_module('migrations.versions.0001_baseline')
+    baseline.metadata.create_all(engines['migrated'])
+    with engines['migrated'].begin() as connection:
+        connection.execute(text("INSERT INTO iocs (value, type) VALUES ('evil.com', 'domain')"))
+    migrations.upgrade(engines['migrated'])
+    assert _schema(engines['migrated']) == before
+    with engines['migrated'].connect() as connection:
+        assert connection.execute(text("SELECT value, host FROM iocs")).all() == [('evil.com', None)]
+
+
+def test_create_app_leaves_the_database_alone(tmp_path):
+    from app import create_app
+    from config import TestConfig
+
+    class FileConfig(TestConfig):
+        TESTING = False
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'untouched.db'}"
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        assert inspect(db.engine).get_table_names() == []
+
+
+def test_migrate_and_seed_commands(app):
+    db.drop_all()
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['migrate', '--status'])
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith('pending  0001_baseline  Baseline schema')
+
+    result = runner.invoke(args=['migrate'])
+    assert result.exit_code == 0, result.output
+    assert "Applied 0001_baseline" in result.output
+    assert "Database is up to date" in runner.invoke(args=['migrate']).output
+
+    result = runner.invoke(args=['seed'])
+    assert result.exit_code == 0, result.output
+    assert IoC.query.count() > 0
+    assert "skipping seed" in runner.invoke(args=['seed']).output
@@ -0,0 +1,78 @@
+"""
+Tests for opt-in request profiling.
+"""
+import json
+import pstats
+import pytest
+from app import create_app
+from config import TestConfig
+from models import db
+from api.profiling import profiler
+
+
+@pytest.fixture
+def profiled_client(tmp_path):
+    config = type('ProfilingConfig', (TestConfig,), {'PROFILING_TOKEN': 'secret', 'PROFILE_DIR': str(tmp_path)})
+    app = create_app(config)
+    with app.app_context():
+        db.create_all()
+        yield app.test_client()
+        db.session.remove()
+        db.drop_all()
+
+
+def test_profile_is_stored_and_linked(profiled_client, tmp_path):
+    response = profiled_client.get('/api/reports', headers={'X-Profile': 'secret'})
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+    assert response.headers['X-Profile-Url'] == f'/api/profiles/{profile_id}'
+
+    profile = json.loads(profiled_client.get(response.headers['X-Profile-Url'], headers={'X-Profile': 'secret'}).data)
+    assert profile['endpoint'] == 'api.reports.get_all_reports'
+    assert profile['status'] == 200
+    assert any('FROM reports' in entry['statement'] for entry in profile['sql'])
+    assert any('get_all_reports' in entry['function'] for entry in profile['call_graph'])
+
+    raw = profiled_client.get(f'/api/profiles/{profile_id}/pstats', headers={'X-Profile': 'secret'})
+    assert raw.status_code == 200
+    path = tmp_path / 'download.pstats'
+    path.write_bytes(raw.data)
+    assert pstats.Stats(str(path)).total_calls > 0
+
+
+def test_profiling_requires_the_token(profiled_client, tmp_path):
+    for headers in ({}, {'X-Profile': 'wrong'}):
+        response = profiled_client.get('/api/reports', headers=headers)
+        assert 'X-Profile-Id' not in response.headers
+    assert list(tmp_path.iterdir()) == []
+
+    assert profiled_client.get('/api/profiles/0123456789abcdef').status_code == 403
+    assert profiled_client.get('/api/profiles/../etc', headers={'X-Profile': 'secret'}).status_code == 404
+
+
+def test_profiling_token_is_not_accepted_in_the_query_string(profiled_client, tmp_path):
+    """A token in the URL would end up in access logs and the stored profile"""
+    response = profiled_client.get('/api/reports?profile=secret')
+    assert 'X-Profile-Id' not in response.headers
+    assert list(tmp_path.iterdir()) == []
+    assert profiled_client.get('/api/profiles/0123456789abcdef?profile=secret').status_code == 403
+
+
+def test_one_request_is_profiled_at_a_time(profiled_client, tmp_path):
+    """cProfile allows one profiler per interpreter, a second profiled request is refused"""
+    with profiler._profile_lock:
+        response = profiled_client.get('/api/reports', headers={'X-Profile': 'secret'})
+        assert response.status_code == 409
+        assert 'X-Profile-Id' not in response.headers
+        assert profiled_client.get('/api/reports').status_code == 200
+
+    assert profiled_client.get('/api/reports', headers={'X-Profile': 'secret'}).status_code == 200
+    assert not profiler._profile_lock.locked()
+
+
+def test_profiling_is_off_without_a_token(client):
+    """No hooks are installed unless a token is configured"""
+    response = client.get('/api/reports', headers={'X-Profile': ''})
+    assert 'X-Profile-Id' not in response.headers
+    assert not any(f.__module__ == 'api.profiling.profiler'
+                   for f in client.application.before_request_funcs.get(None, []))
@@ -0,0 +1,154 @@
+"""
+SQL statement budgets for every API route.
+
+Each route is called against a small dataset with several related rows per
+IoC and report, so a query issued per item shows up both as a blown budget
+and as a repeated statement. Budgets count every statement sent, including
+the ETag version read and the writes of the flush; raise one only with a
+reason the reviewer can check.
+"""
+from datetime import datetime
+
+import pytest
+from conftest import count_queries
+from models import db, IoC, Report, HuntingQuery, Sighting
+
+
+REPORT_IOCS = [
+    {"type": "domain", "value": "evil.com"},
+    {"type": "domain", "value": "cdn.evil.com"},
+    {"type": "ip_address", "value": "10.0.0.1"},
+    {"type": "ip_range", "value": "10.0.0.0/24"},
+    {"type": "hash_md5", "value": "44d88612fea8a8f36de82e1278abb02f"},
+    {"type": "url", "value": "http://evil.com/payload.exe"},
+]
+
+PASTE = "evil[.]com, 10.0.0.1\n44D88612FEA8A8F36DE82E1278ABB02F\nevil.net\nhxxp://new.evil.org/x, 10.0.0.7"
+
+ALL_IDS = list(range(1, len(REPORT_IOCS) + 1)) + [999]
+
+# (method, rule, url, request options, budget). SQLite has no batched
+# INSERT ... RETURNING, so routes creating rows through the ORM spend one
+# statement per row; those budgets are spelled out per row.
+ROUTES = [
+    ('GET', '/api/events/stream', '/api/events/stream', {}, 0),
+    ('GET', '/metrics', '/metrics', {}, 0),
+    ('GET', '/api/profiles/<profile_id>', '/api/profiles/missing', {}, 0),
+    ('GET', '/api/profiles/<profile_id>/pstats', '/api/profiles/missing/pstats', {}, 0),
+    ('POST', '/api/iocs/detect', '/api/iocs/detect', {'json': {'input': PASTE}}, 0),
+
+    # Version read, then the rows
+    ('GET', '/api/iocs', '/api/iocs', {}, 2),
+    ('GET', '/api/iocs/<int:ioc_id>', '/api/iocs/1', {}, 2),
+    # Version read, IoC with sighting total, hunting queries, reports
+    ('GET', '/api/iocs/<int:ioc_id>/full', '/api/iocs/1/full', {}, 4),
+    ('GET', '/api/iocs/<int:ioc_id>/hunting_queries', '/api/iocs/1/hunting_queries', {}, 3),
+    ('GET', '/api/iocs/<int:ioc_id>/neighbours', '/api/iocs/1/neighbours?hops=2', {}, 6),
+    ('GET', '/api/iocs/<int:ioc_id>/sightings', '/api/iocs/1/sightings', {}, 3),
+    # Committed iocs version, then the IoCs and tombstones up to it
+    ('GET', '/api/iocs/changes', '/api/iocs/changes', {}, 3),
+    ('GET', '/api/iocs/snapshot', '/api/iocs/snapshot', {}, 4),
+    ('GET', '/api/iocs/containing', '/api/iocs/containing?address=10.0.0.1', {}, 4),
+    ('GET', '/api/iocs/similar_domains', '/api/iocs/similar_domains?domain=evil.co', {}, 4),
+    # Index version and build, then the matched IoCs and their reports
+    ('POST', '/api/iocs/lookup', '/api/iocs/lookup', {'json': {'input': PASTE}}, 5),
+    ('POST', '/api/iocs/check_duplicates', '/api/iocs/check_duplicates', {'json': {'input': PASTE}}, 7),
+    # Three of the pasted IoCs are new, each inserted with its hunting query
+    ('POST', '/api/iocs', '/api/iocs', {'json': {'input': PASTE, 'generate_queries': True}}, 7 + 2 * 3),
+    ('DELETE', '/api/iocs/<int:ioc_id>', '/api/iocs/1', {}, 10),
+    # Ids, then tombstones, delete and IoC versions for the one chunk, then the
+    # versions of the tables the database cascaded into
+    ('DELETE', '/api/iocs', '/api/iocs', {'json': {'ids': ALL_IDS}}, 6),
+    ('POST', '/api/iocs/<int:ioc_id>/sightings', '/api/iocs/1/sightings',
+     {'json': {'sightings': [{'count': 2}, {'count': 3}]}}, 5),
+    ('POST', '/api/iocs/<int:ioc_id>/generate_query', '/api/iocs/1/generate_query',
+     {'json': {'force_new': True}}, 5),
+    ('POST', '/api/iocs/bulk/generate_queries', '/api/iocs/bulk/generate_queries',
+     {'json': {'ioc_ids': ALL_IDS}}, 2 + len(REPORT_IOCS)),
+
+    ('GET', '/api/hunting_queries', '/api/hunting_queries', {}, 2),
+    ('GET', '/api/hunting_queries/<int:query_id>', '/api/hunting_queries/1', {}, 2),
+    ('POST', '/api/hunting_queries', '/api/hunting_queries',
+     {'json': {'name': 'Manual', 'query_text': 'DnsEvents', 'ioc_id': 1}}, 4),
+    ('PUT', '/api/hunting_queries/<int:query_id>', '/api/hunting_queries/1', {'json': {'name': 'Renamed'}}, 3),
+    ('DELETE', '/api/hunting_queries/<int:query_id>', '/api/hunting_queries/1', {}, 3),
+    ('POST', '/api/hunting_queries/bulk_generate', '/api/hunting_queries/bulk_generate',
+     {'json': {'ioc_ids': ALL_IDS}}, 2 + len(REPORT_IOCS)),
+
+    ('GET', '/api/reports', '/api/reports', {}, 2),
+    ('GET', '/api/reports/<int:report_id>', '/api/reports/1', {}, 2),
+    ('GET', '/api/reports/<int:report_id>/similar', '/api/reports/1/similar', {}, 3),
+    # A new IoC bumps the iocs version before its insert, which stores it as
+    # change_version, and its own version after the insert assigns its id
+    ('POST', '/api/reports', '/api/reports',
+     {'json': {'name': 'New', 'source': 'Unit Test', 'iocs': REPORT_IOCS + [{"type": "domain", "value": "x.org"}]}},
+     12),
+    ('PUT', '/api/reports/<int:report_id>', '/api/reports/1',
+     {'json': {'name': 'Renamed', 'iocs': [{"type": "domain", "value": "x.org"}]}}, 12),
+    ('DELETE', '/api/reports/<int:report_id>', '/api/reports/1', {}, 6),
+    ('POST', '/api/reports/<int:report_id>/generate_queries', '/api/reports/1/generate_queries', {'json': {}},
+     3 + len(REPORT_IOCS)),
+
+    ('POST', '/api/retrohunt', '/api/retrohunt', {'json': {'paths': ['.'], 'workers': 1}}, 5),
+]
+
+
+@pytest.fixture
+def dataset(app, tmp_path):
+    """A report of six IoCs, two hunting queries per IoC and some sightings"""
+    report = Report(name="Budget report", source="Unit Test")
+    db.session.add(report)
+    report.set_iocs(REPORT_IOCS)
+    other = Report(name="Overlapping report", source="Unit Test")
+    db.session.add(other)
+    other.set_iocs(REPORT_IOCS[:3])
+    for ioc in report.iocs:
+        for i in range(2):
+            db.session.add(HuntingQuery(name=f"Query {i} for {ioc.value}", query_type="kql",
+                                        query_text="DnsEvents", ioc_id=ioc.id, report_id=report.id))
+    db.session.commit()
+    Sighting.record([{'ioc_id': 1, 'seen_at': datetime.utcnow(), 'source': 'analyst'}] * 3)
+    db.session.commit()
+
+    (tmp_path / "DnsEvents.csv").write_text("TimeGenerated,Name\n2024-05-01T10:15:00Z,evil.com\n"
+                                            "2024-05-01T11:15:00Z,cdn.evil.com\n")
+    app.config['RETROHUNT_ROOT'] = str(tmp_path)
+
+
+def test_every_route_has_a_budget(app):
+    """New routes must declare a budget here"""
+    declared = {(method, rule) for method, rule, _, _, _ in ROUTES}
+    routes = {(method, rule.rule) for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+    assert routes - declared == set()
+    assert declared - routes == set()
+
+
+@pytest.mark.parametrize('method, rule, url, options, budget', ROUTES, ids=[f"{r[0]} {r[1]}" for r in ROUTES])
+def test_route_within_query_budget(client, dataset, query_budget, method, rule, url, options, budget):
+    with query_budget(budget):
+        if rule == '/api/events/stream':
+            response = client.get(url, buffered=False)
+            next(iter(response.response))
+            response.close()
+        else:
+            response = client.open(url, method=method, **options)
+    assert response.status_code < 500, response.data
+    if not rule.startswith('/api/profiles/'):
+        assert response.status_code < 400, response.data
+
+
+def test_query_budget_catches_repeated_statements(app, dataset):
+    """A lookup per item fails even when the total stays within budget"""
+    with count_queries() as queries:
+        for ioc_id in range(1, 4):
+            db.session.get(IoC, ioc_id)
+    assert queries.count == 3
+    with pytest.raises(AssertionError, match="Repeated SQL statements"):
+        queries.assert_budget(10)
+    queries.assert_budget(3, allow_repeats=2)
+
+    db.session.expunge_all()
+    with count_queries() as queries:
+        IoC.get_many(range(1, 4))
+    queries.assert_budget(1)
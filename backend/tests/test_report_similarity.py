@@ -0,0 +1,77 @@
+"""
+Tests for MinHash signatures and near-duplicate report search.
+"""
+import json
+from models import db, Report, ReportLSHBucket
+from utils.ioc.minhash import BANDS, minhash_signature, estimate_jaccard, lsh_buckets
+
+
+def _values(prefix, count):
+    return [f"{prefix}{i}.example.com" for i in range(count)]
+
+
+def test_signature_estimates_jaccard():
+    """Signature agreement tracks the true Jaccard similarity"""
+    a = set(_values("a", 100))
+    b = set(_values("a", 80)) | set(_values("b", 20))  # Jaccard 80 / 120
+    estimate = estimate_jaccard(minhash_signature(a), minhash_signature(b))
+    assert abs(estimate - 80 / 120) < 0.15
+    assert estimate_jaccard(minhash_signature(a), minhash_signature(a)) == 1.0
+    assert minhash_signature([]) is None
+
+
+def test_identical_sets_share_every_bucket():
+    signature = minhash_signature(_values("a", 10))
+    assert len(lsh_buckets(signature)) == BANDS
+    assert lsh_buckets(signature) == lsh_buckets(minhash_signature(list(reversed(_values("a", 10)))))
+
+
+def _create_report(client, name, values):
+    response = client.post('/api/reports', json={
+        "name": name, "source": "Vendor",
+        "iocs": [{"value": value, "type": "domain"} for value in values]
+    })
+    return json.loads(response.data)['report']['id']
+
+
+def test_similar_reports_endpoint(client):
+    """Overlapping reports are found through shared buckets, unrelated ones are not"""
+    campaign = _values("c2-", 40)
+    first = _create_report(client, "Vendor A", campaign)
+    second = _create_report(client, "Vendor B", campaign[:36] + _values("extra", 2))
+    _create_report(client, "Unrelated", _values("other", 40))
+
+    assert ReportLSHBucket.query.filter_by(report_id=first).count() == BANDS
+
+    data = json.loads(client.get(f'/api/reports/{first}/similar').data)
+    assert [entry['report']['id'] for entry in data['similar']] == [second]
+    assert data['similar'][0]['similarity'] >= 0.5
+
+    data = json.loads(client.get(f'/api/reports/{first}/similar?threshold=0.99').data)
+    assert data['similar'] == []
+
+
+def test_signature_follows_ioc_changes_and_deletes(client):
+    """Updating a report's IoCs refreshes its buckets; deleting it drops them"""
+    report_id = _create_report(client, "Growing", _values("g", 5))
+    before = db.session.get(Report, report_id).minhash
+
+    client.put(f'/api/reports/{report_id}', json={"iocs": [{"value": "new.example.org", "type": "domain"}]})
+    db.session.expire_all()
+    assert db.session.get(Report, report_id).minhash != before
+
+    client.delete(f'/api/reports/{report_id}')
+    assert ReportLSHBucket.query.filter_by(report_id=report_id).count() == 0
+
+
+def test_backfill_report_signatures_command(app, client):
+    """Reports stored without a signature get one"""
+    report_id = _create_report(client, "Legacy", _values("l", 5))
+    db.session.execute(ReportLSHBucket.__table__.delete())
+    db.session.execute(Report.__table__.update().values(minhash=None))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['backfill-report-signatures'])
+    assert result.exit_code == 0, result.output
+    assert "Computed signatures for 1 reports" in result.output
+    assert ReportLSHBucket.query.filter_by(report_id=report_id).count() == BANDS
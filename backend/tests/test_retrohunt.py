@@ -0,0 +1,170 @@
+"""
+Tests for the retro-hunt engine, endpoint and CLI command.
+"""
+import json
+import pytest
+from models import db, IoC, Sighting
+from utils.hunt.retrohunt import build_watchlist, detect_table, hunt_file, run_retrohunt
+
+
+WATCHLIST_IOCS = [
+    (1, "evil.com"),
+    (2, "10.0.0.1"),
+    (3, "44d88612fea8a8f36de82e1278abb02f"),
+]
+
+
+@pytest.fixture
+def exports(tmp_path):
+    """A JSON lines, a JSON array and a CSV export with known matches"""
+    (tmp_path / "DnsEvents_day1.jsonl").write_text("\n".join(json.dumps(row) for row in [
+        {"TimeGenerated": "2024-05-01T10:15:00Z", "Name": "EVIL.com", "IPAddresses": "1.1.1.1;10.0.0.1"},
+        {"TimeGenerated": "2024-05-01T10:45:00Z", "Name": "evil.com", "IPAddresses": ""},
+        {"TimeGenerated": "2024-05-01T11:00:00Z", "Name": "clean.org", "IPAddresses": "2.2.2.2"},
+    ]))
+    (tmp_path / "CommonSecurityLog.json").write_text(json.dumps([
+        {"TimeGenerated": "2024-05-02T08:00:00Z", "SourceIP": "10.0.0.1", "DestinationIP": "3.3.3.3"},
+    ]))
+    (tmp_path / "DeviceFileEvents.csv").write_text(
+        "Timestamp,MD5,FileName\n"
+        "2024-05-03T00:00:00Z,44D88612FEA8A8F36DE82E1278ABB02F,eicar.com\n"
+        "2024-05-03T01:00:00Z,00000000000000000000000000000000,clean.exe\n"
+    )
+    return tmp_path
+
+
+def test_build_watchlist_uses_table_mappings():
+    """Each IoC is watched in the tables and fields the KQL generator uses"""
+    watchlist = build_watchlist(WATCHLIST_IOCS)
+    assert watchlist["DnsEvents"]["Name"]["evil.com"] == [1]
+    assert watchlist["DnsEvents"]["IPAddresses"]["10.0.0.1"] == [2]
+    assert watchlist["CommonSecurityLog"]["SourceIP"]["10.0.0.1"] == [2]
+    assert watchlist["DeviceFileEvents"]["MD5"]["44d88612fea8a8f36de82e1278abb02f"] == [3]
+
+
+def test_detect_table():
+    tables = ["DeviceFileEvents", "DnsEvents", "CommonSecurityLog"]
+    assert detect_table("/x/dnsevents_2024.csv", tables) == "DnsEvents"
+    assert detect_table("/x/unknown.csv", tables) is None
+
+
+def test_hunt_file_aggregates_per_hour(exports):
+    """Matches in the same hour collapse into one sighting with a count"""
+    sightings = hunt_file(str(exports / "DnsEvents_day1.jsonl"), build_watchlist(WATCHLIST_IOCS))
+
+    by_ioc = {(key[0], key[2]): value for key, value in sightings.items()}
+    count, last_seen = by_ioc[(1, "Name")]
+    assert count == 2
+    assert last_seen.isoformat() == "2024-05-01T10:45:00"
+    assert by_ioc[(2, "IPAddresses")][0] == 1
+    assert len(sightings) == 2
+
+
+def test_hunt_file_converts_offsets_to_utc(tmp_path):
+    path = tmp_path / "DnsEvents.jsonl"
+    path.write_text(json.dumps({"TimeGenerated": "2024-05-01T10:15:00+02:00", "Name": "evil.com"}))
+    (key, (count, last_seen)), = hunt_file(str(path), build_watchlist(WATCHLIST_IOCS)).items()
+    assert key[3].isoformat() == "2024-05-01T08:00:00"
+    assert last_seen.isoformat() == "2024-05-01T08:15:00"
+
+
+def test_run_retrohunt_process_pool(exports):
+    """Files spread across worker processes give the same results"""
+    watchlist = build_watchlist(WATCHLIST_IOCS)
+    paths = sorted(str(path) for path in exports.iterdir())
+
+    assert run_retrohunt(paths, watchlist, workers=2) == run_retrohunt(paths, watchlist, workers=1)
+
+
+def test_hunt_parquet(tmp_path):
+    """Parquet exports are matched with pyarrow kernels"""
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    pq.write_table(pa.table({
+        "TimeGenerated": ["2024-05-01T10:00:00Z", "2024-05-01T12:00:00Z"],
+        "Name": ["a.org", "Evil.com"],
+        "IPAddresses": ["10.0.0.1; 9.9.9.9", None],
+    }), tmp_path / "DnsEvents.parquet")
+
+    sightings = hunt_file(str(tmp_path / "DnsEvents.parquet"), build_watchlist(WATCHLIST_IOCS))
+    assert {(key[0], key[2]) for key in sightings} == {(1, "Name"), (2, "IPAddresses")}
+
+
+def test_ranges_match_addresses_inside(tmp_path):
+    """A range IoC matches the addresses it contains, like ipv4_is_in_range"""
+    watchlist = build_watchlist([(4, "192.168.5.0/24"), (5, "192.168.5.7")])
+    assert "192.168.5.0/24" not in watchlist["CommonSecurityLog"]["SourceIP"]
+    (tmp_path / "CommonSecurityLog.jsonl").write_text("\n".join(json.dumps(row) for row in [
+        {"TimeGenerated": "2024-05-02T08:00:00Z", "SourceIP": "192.168.5.7", "DestinationIP": "192.168.6.1"},
+        {"TimeGenerated": "2024-05-02T08:30:00Z", "SourceIP": "not an ip", "DestinationIP": "192.168.5.200"},
+    ]))
+
+    sightings = hunt_file(str(tmp_path / "CommonSecurityLog.jsonl"), watchlist)
+    assert {(key[0], key[2]): value[0] for key, value in sightings.items()} == {
+        (4, "SourceIP"): 1, (5, "SourceIP"): 1, (4, "DestinationIP"): 1}
+    paths = [str(tmp_path / "CommonSecurityLog.jsonl")] * 2
+    assert run_retrohunt(paths, watchlist, workers=2) == run_retrohunt(paths, watchlist, workers=1)
+
+
+def test_hunt_parquet_matches_ranges(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    pq.write_table(pa.table({
+        "TimeGenerated": ["2024-05-01T10:00:00Z", "2024-05-01T12:00:00Z"],
+        "SourceIP": ["192.168.5.7", "192.168.6.1"],
+    }), tmp_path / "CommonSecurityLog.parquet")
+
+    sightings = hunt_file(str(tmp_path / "CommonSecurityLog.parquet"), build_watchlist([(4, "192.168.5.0/24")]))
+    assert {(key[0], key[2]) for key in sightings} == {(4, "SourceIP")}
+
+
+def _store_iocs():
+    iocs = [IoC(value=value, type="unknown") for _, value in WATCHLIST_IOCS]
+    db.session.add_all(iocs)
+    db.session.commit()
+    return {ioc.value: ioc.id for ioc in iocs}
+
+
+def test_retrohunt_endpoint_records_sightings(client, app, exports):
+    """The endpoint scans a directory under the root and writes sightings"""
+    ids = _store_iocs()
+    app.config['RETROHUNT_ROOT'] = str(exports)
+
+    # The pool size is not the client's to choose, whatever it sends
+    response = client.post('/api/retrohunt', json={'paths': ['.'], 'workers': 'all'})
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['iocs_matched'] == 3
+
+    sightings = Sighting.query.filter_by(ioc_id=ids["evil.com"]).all()
+    assert len(sightings) == 1
+    assert sightings[0].count == 2
+    assert sightings[0].table_name == "DnsEvents"
+    assert sightings[0].source == "retrohunt"
+
+
+def test_retrohunt_endpoint_rejects_paths_outside_root(client, app, exports):
+    app.config['RETROHUNT_ROOT'] = str(exports)
+    response = client.post('/api/retrohunt', json={'paths': ['../../etc']})
+    assert response.status_code == 400
+
+
+def test_retrohunt_endpoint_rejects_json_rows_that_are_not_objects(client, app, tmp_path):
+    _store_iocs()
+    app.config['RETROHUNT_ROOT'] = str(tmp_path)
+    (tmp_path / "DnsEvents.json").write_text("[1, 2]")
+    (tmp_path / "CommonSecurityLog.jsonl").write_text('{"SourceIP": "10.0.0.1"}\n"10.0.0.1"\n')
+
+    for name in ("DnsEvents.json", "CommonSecurityLog.jsonl"):
+        response = client.post('/api/retrohunt', json={'paths': [name]})
+        assert response.status_code == 400
+        assert "must be an object" in json.loads(response.data)['error']
+
+
+def test_retrohunt_cli(app, exports):
+    """flask retrohunt scans the given paths"""
+    _store_iocs()
+    result = app.test_cli_runner().invoke(args=['retrohunt', str(exports / "DeviceFileEvents.csv"), '--workers', '1'])
+    assert result.exit_code == 0, result.output
+    assert "Recorded 1 sightings for 1 IoCs" in result.output
+
@@ -0,0 +1,86 @@
+"""
+Tests for sightings and their hourly / daily rollups.
+"""
+import json
+from datetime import datetime, timedelta
+from models import db, IoC, Sighting, HourlySightingRollup, DailySightingRollup
+
+
+def _ioc_id(app):
+    ioc = IoC(value="seen.example.com", type="domain")
+    db.session.add(ioc)
+    db.session.commit()
+    return ioc.id
+
+
+def test_record_maintains_rollups(app):
+    """A batch is folded into both rollup tables, across several batches"""
+    ioc_id = _ioc_id(app)
+    day = datetime(2024, 5, 1)
+    Sighting.record([
+        {'ioc_id': ioc_id, 'seen_at': day.replace(hour=10, minute=5), 'source': 'test'},
+        {'ioc_id': ioc_id, 'seen_at': day.replace(hour=10, minute=50), 'count': 3, 'source': 'test'},
+        {'ioc_id': ioc_id, 'seen_at': day.replace(hour=13), 'source': 'test'},
+    ])
+    Sighting.record([{'ioc_id': ioc_id, 'seen_at': day.replace(hour=10, minute=30), 'source': 'test'}])
+    db.session.commit()
+
+    hourly = {r.bucket: (r.count, r.last_seen) for r in HourlySightingRollup.query.all()}
+    assert hourly[day.replace(hour=10)] == (5, day.replace(hour=10, minute=50))
+    assert hourly[day.replace(hour=13)] == (1, day.replace(hour=13))
+
+    daily = DailySightingRollup.query.one()
+    assert (daily.bucket, daily.count, daily.last_seen) == (day, 6, day.replace(hour=13))
+    assert Sighting.query.count() == 4
+
+
+def test_sightings_endpoint_reads_buckets(client, app):
+    """Analyst submissions show up in the range query"""
+    ioc_id = _ioc_id(app)
+    now = datetime.utcnow()
+    response = client.post(f'/api/iocs/{ioc_id}/sightings', json={'sightings': [
+        {'seen_at': (now - timedelta(days=2)).isoformat(), 'count': 2},
+        {'seen_at': (now - timedelta(days=200)).isoformat()},
+        {},
+    ]})
+    assert response.status_code == 201
+
+    data = json.loads(client.get(f'/api/iocs/{ioc_id}/sightings?range=90d').data)
+    assert data['bucket'] == 'day'
+    assert data['total'] == 3
+    assert len(data['buckets']) == 2
+    assert data['last_seen'] is not None
+
+    data = json.loads(client.get(f'/api/iocs/{ioc_id}/sightings?range=24h').data)
+    assert data['bucket'] == 'hour'
+    assert data['total'] == 1
+
+    sighting = Sighting.query.filter_by(ioc_id=ioc_id, count=2).one()
+    assert sighting.source == 'analyst'
+
+
+def test_sightings_endpoint_validation(client, app):
+    ioc_id = _ioc_id(app)
+    assert client.get('/api/iocs/9999/sightings').status_code == 404
+    assert client.get(f'/api/iocs/{ioc_id}/sightings?range=forever').status_code == 400
+    assert client.post(f'/api/iocs/{ioc_id}/sightings', json={'seen_at': 'yesterday'}).status_code == 400
+    assert client.post(f'/api/iocs/{ioc_id}/sightings', json={'source': 'x' * 51}).status_code == 400
+    assert client.post(f'/api/iocs/{ioc_id}/sightings', json={'location': ['a']}).status_code == 400
+    assert Sighting.query.count() == 0
+
+
+def test_sighting_offsets_are_converted_to_utc(client, app):
+    ioc_id = _ioc_id(app)
+    response = client.post(f'/api/iocs/{ioc_id}/sightings', json={'seen_at': '2024-05-01T23:30:00-02:00'})
+    assert response.status_code == 201
+    assert Sighting.query.one().seen_at == datetime(2024, 5, 2, 1, 30)
+    assert DailySightingRollup.query.one().bucket == datetime(2024, 5, 2)
+
+
+def test_sightings_range_is_bounded(client, app):
+    """Ranges past the limit are rejected instead of overflowing the date arithmetic"""
+    ioc_id = _ioc_id(app)
+    assert client.get(f'/api/iocs/{ioc_id}/sightings?range=3650d').status_code == 200
+    for range_param in ('3651d', '87601h', '9999999d', '99999999999999999999h'):
+        response = client.get(f'/api/iocs/{ioc_id}/sightings?range={range_param}')
+        assert response.status_code == 400, range_param
@@ -0,0 +1,9 @@
+"""
+Local threat hunting utilities.
+
+This package contains modules for hunting stored IoCs outside of Sentinel:
+- Retro-hunting over JSON, CSV and Parquet log exports
+"""
+from .retrohunt import build_watchlist, detect_table, expand_paths, hunt_file, run_retrohunt
+
+__all__ = ['build_watchlist', 'detect_table', 'expand_paths', 'hunt_file', 'run_retrohunt']
@@ -0,0 +1,330 @@
+"""
+Retro-hunt engine matching stored IoCs against local log exports.
+
+This module replays the hunting logic of the generated KQL queries over
+exports of Sentinel / Defender tables on disk. The same table and field
+mappings as KQLQueryGenerator.TABLE_MAPPINGS decide which columns are
+checked for which IoC type, and matches are case-insensitive like KQL's =~.
+IP range IoCs are matched by containment like ipv4_is_in_range, through a
+NetworkIndex per field.
+
+Files are streamed in batches and each batch is tested column by column
+against a per-field value set, so the cost is one set membership test per
+cell. Parquet files are read and matched with pyarrow compute kernels,
+which needs the optional pyarrow dependency.
+"""
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.ioc.detector import IoC_Type
+from utils.ioc.index import normalize_indicator
+from utils.ioc.ranges import NetworkIndex
+from utils.kql.query_generator import KQLQueryGenerator
+
+
+# Columns holding several values separated by ';' (e.g. DnsEvents.IPAddresses)
+MULTI_VALUE_FIELDS = {"IPAddresses"}
+
+# Columns used as the event time, in order of preference
+TIMESTAMP_FIELDS = ("TimeGenerated", "Timestamp")
+
+SUPPORTED_EXTENSIONS = ('.json', '.jsonl', '.ndjson', '.csv', '.parquet')
+
+
+class FieldWatch(dict):
+    """Normalized value -> ioc ids watched in one field, plus the watched ranges."""
+
+    def __init__(self):
+        super().__init__()
+        self.networks = NetworkIndex()
+
+    def match(self, item: str) -> List[int]:
+        """Ids of the IoCs equal to a lowercase cell value or containing it."""
+        ioc_ids = self.get(item, [])
+        if self.networks:
+            try:
+                containing = self.networks.containing(item)
+            except ValueError:
+                # Not an IP address
+                return ioc_ids
+            ioc_ids = ioc_ids + [ioc_id for _, ids in containing for ioc_id in ids]
+        return ioc_ids
+
+
+# table -> field -> watched values and ranges
+Watchlist = Dict[str, Dict[str, FieldWatch]]
+
+# (ioc id, table, field, hour bucket) -> [count, last seen]
+Sightings = Dict[Tuple[int, str, str, datetime], list]
+
+
+def build_watchlist(iocs: Iterable[Tuple[int, str]]) -> Watchlist:
+    """
+    Build the per-table, per-field value sets to match against.
+
+    Args:
+        iocs: (ioc id, value) pairs of the stored IoCs
+
+    Returns:
+        Nested dictionary of table -> field -> FieldWatch
+    """
+    watchlist: Watchlist = {}
+    for ioc_id, value in iocs:
+        normalized, ioc_type = normalize_indicator(value)
+        for mapping in KQLQueryGenerator.TABLE_MAPPINGS.get(ioc_type, []):
+            fields = watchlist.setdefault(mapping["table"], {})
+            for field in mapping["fields"]:
+                if field not in fields:
+                    fields[field] = FieldWatch()
+                watch = fields[field]
+                if ioc_type == IoC_Type.IP_RANGE:
+                    watch.networks.add(normalized, ioc_id)
+                else:
+                    watch.setdefault(normalized.lower(), []).append(ioc_id)
+    return watchlist
+
+
+def detect_table(path: str, tables: Iterable[str]) -> Optional[str]:
+    """
+    Guess the table an export belongs to from its file name.
+
+    'DnsEvents_2024-05-01.csv' and 'dnsevents.parquet' both map to DnsEvents.
+    """
+    name = os.path.basename(path).lower()
+    # Longest first so DeviceFileEvents is not shadowed by a shorter prefix
+    for table in sorted(tables, key=len, reverse=True):
+        if name.startswith(table.lower()):
+            return table
+    return None
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    """Naive UTC time of a timestamp cell, None if it is empty or unreadable"""
+    if not isinstance(value, datetime):
+        if not value:
+            return None
+        try:
+            value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _check_rows(path: str, rows: List) -> List[dict]:
+    """The rows of a JSON export, raising ValueError unless each one is an object"""
+    if not all(isinstance(row, dict) for row in rows):
+        raise ValueError(f"{path}: every row of a JSON export must be an object")
+    return rows
+
+
+def _iter_json(path: str, batch_size: int) -> Iterator[List[dict]]:
+    with open(path, encoding='utf-8') as f:
+        first = f.read(1)
+        while first and first.isspace():
+            first = f.read(1)
+        f.seek(0)
+        if first == '[':
+            # A single JSON array has to be loaded whole
+            rows = _check_rows(path, json.load(f))
+            for start in range(0, len(rows), batch_size):
+                yield rows[start:start + batch_size]
+            return
+        batch = []
+        for line in f:
+            if line.strip():
+                batch.append(json.loads(line))
+                if len(batch) == batch_size:
+                    yield _check_rows(path, batch)
+                    batch = []
+        if batch:
+            yield _check_rows(path, batch)
+
+
+def _iter_csv(path: str, batch_size: int) -> Iterator[List[dict]]:
+    with open(path, encoding='utf-8', newline='') as f:
+        batch = []
+        for row in csv.DictReader(f):
+            batch.append(row)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _record(sightings: Sightings, ioc_ids, table, field, seen_at, fallback_time):
+    seen_at = seen_at or fallback_time
+    bucket = seen_at.replace(minute=0, second=0, microsecond=0)
+    for ioc_id in ioc_ids:
+        entry = sightings.setdefault((ioc_id, table, field, bucket), [0, seen_at])
+        entry[0] += 1
+        entry[1] = max(entry[1], seen_at)
+
+
+def _match_rows(rows: List[dict], table: str, fields: Dict[str, FieldWatch],
+                sightings: Sightings, fallback_time: datetime):
+    """Match a batch of row dictionaries column by column."""
+    timestamps = None
+    for field, values in fields.items():
+        column = [row.get(field) for row in rows]
+        multi = field in MULTI_VALUE_FIELDS
+        for position, cell in enumerate(column):
+            if not cell:
+                continue
+            cells = str(cell).split(';') if multi else (str(cell),)
+            for item in cells:
+                ioc_ids = values.match(item.strip().lower())
+                if ioc_ids:
+                    if timestamps is None:
+                        timestamps = [_parse_timestamp(next((row[name] for name in TIMESTAMP_FIELDS if row.get(name)), None))
+                                      for row in rows]
+                    _record(sightings, ioc_ids, table, field, timestamps[position], fallback_time)
+
+
+def _hunt_parquet(path: str, table: str, fields: Dict[str, FieldWatch],
+                  batch_size: int, sightings: Sightings, fallback_time: datetime):
+    """Match a Parquet file with pyarrow's vectorized is_in kernel."""
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet exports require the optional 'pyarrow' package")
+
+    parquet = pq.ParquetFile(path)
+    available = set(parquet.schema_arrow.names)
+    hunted = [field for field in fields if field in available]
+    if not hunted:
+        return
+    time_field = next((name for name in TIMESTAMP_FIELDS if name in available), None)
+    columns = hunted + ([time_field] if time_field else [])
+    value_sets = {field: pa.array(list(fields[field]), pa.string()) for field in hunted}
+
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+        times = batch.column(time_field).to_pylist() if time_field else None
+        for field in hunted:
+            column = pc.utf8_lower(pc.cast(batch.column(field), pa.string()))
+            if field in MULTI_VALUE_FIELDS:
+                # Explode 'a;b;c' cells, remembering which row each item came from
+                split = pc.split_pattern(column, ';')
+                rows = pc.list_parent_indices(split)
+                column = pc.utf8_trim_whitespace(pc.list_flatten(split))
+            else:
+                rows = None
+            value_set = value_sets[field]
+            if fields[field].networks:
+                # Containment has no kernel: test each distinct value of the
+                # batch once and add the ones inside a range to the value set
+                inside = [value for value in pc.unique(column).to_pylist()
+                          if value and value not in fields[field] and fields[field].match(value)]
+                value_set = pa.concat_arrays([value_set, pa.array(inside, pa.string())])
+            mask = pc.is_in(column, value_set=value_set)
+            positions = pc.indices_nonzero(mask).to_pylist()
+            if not positions:
+                continue
+            matched = pc.take(column, positions).to_pylist()
+            row_positions = pc.take(rows, positions).to_pylist() if rows is not None else positions
+            for value, row in zip(matched, row_positions):
+                seen_at = _parse_timestamp(times[row]) if times else None
+                _record(sightings, fields[field].match(value), table, field, seen_at, fallback_time)
+
+
+def hunt_file(path: str, watchlist: Watchlist, table: Optional[str] = None,
+              batch_size: int = 50000) -> Sightings:
+    """
+    Match every row of one export file against the watchlist.
+
+    Args:
+        path: Path to a .json/.jsonl/.ndjson, .csv or .parquet export
+        watchlist: Output of build_watchlist
+        table: Table the export belongs to, guessed from the file name if None
+        batch_size: Rows held in memory at a time
+
+    Returns:
+        Sightings aggregated per IoC, table, field and hour
+    """
+    table = table or detect_table(path, KQLQueryGenerator.all_tables())
+    if table is None:
+        raise ValueError(f"Cannot tell which table {path} belongs to")
+
+    sightings: Sightings = {}
+    fields = watchlist.get(table)
+    if not fields:
+        return sightings
+
+    # Rows without a usable timestamp are attributed to the file's mtime
+    fallback_time = datetime.utcfromtimestamp(os.path.getmtime(path))
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.parquet':
+        _hunt_parquet(path, table, fields, batch_size, sightings, fallback_time)
+        return sightings
+
+    if extension in ('.json', '.jsonl', '.ndjson'):
+        batches = _iter_json(path, batch_size)
+    elif extension == '.csv':
+        batches = _iter_csv(path, batch_size)
+    else:
+        raise ValueError(f"Unsupported export format: {path}")
+
+    for rows in batches:
+        _match_rows(rows, table, fields, sightings, fallback_time)
+    return sightings
+
+
+# Watchlist shared by the worker processes, sent once per worker instead of per file
+_worker_watchlist: Optional[Watchlist] = None
+
+
+def _init_worker(watchlist: Watchlist):
+    global _worker_watchlist
+    _worker_watchlist = watchlist
+
+
+def _hunt_file_in_worker(path: str, table: Optional[str]):
+    return path, hunt_file(path, _worker_watchlist, table)
+
+
+def run_retrohunt(paths: List[str], watchlist: Watchlist, table: Optional[str] = None,
+                  workers: Optional[int] = None) -> Dict[str, Sightings]:
+    """
+    Retro-hunt a set of export files, spreading them across a process pool.
+
+    Args:
+        paths: Export files to scan
+        watchlist: Output of build_watchlist
+        table: Force every file to this table instead of guessing
+        workers: Pool size, defaults to the CPU count; 1 scans in-process
+
+    Returns:
+        Dictionary of file path -> sightings found in that file
+    """
+    workers = min(workers or os.cpu_count() or 1, len(paths)) if paths else 1
+    if workers <= 1:
+        return {path: hunt_file(path, watchlist, table) for path in paths}
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(watchlist,)) as pool:
+        for path, sightings in pool.map(_hunt_file_in_worker, paths, [table] * len(paths)):
+            results[path] = sightings
+    return results
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Expand directories to the supported export files they contain."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if name.lower().endswith(SUPPORTED_EXTENSIONS))
+        else:
+            files.append(path)
+    return files
@@ -3,12 +3,23 @@ IoC (Indicators of Compromise) utilities.
 
 This package contains modules for working with IoCs, including:
 - IoC type detection
+- Public suffix lookups for domain validation
 - IoC defanging and refanging
+- In-memory indexing for batch lookups
+- Interval indexing of IP ranges
+- Memory-mapped binary snapshots for offline sensors
 """
 from .detector import IoC_Type, detect_ioc_type, get_ioc_type_name
+from .suffix import public_suffix, registrable_domain
 from .defang import defang, refang, parse_ioc_input
+from .index import IndicatorIndex, normalize_indicator
+from .ranges import NetworkIndex
+from .snapshot import SnapshotReader, write_snapshot, merge_delta
 
 __all__ = [
     'IoC_Type', 'detect_ioc_type', 'get_ioc_type_name',
-    'defang', 'refang', 'parse_ioc_input'
+    'public_suffix', 'registrable_domain',
+    'defang', 'refang', 'parse_ioc_input',
+    'IndicatorIndex', 'normalize_indicator', 'NetworkIndex',
+    'SnapshotReader', 'write_snapshot', 'merge_delta'
 ]
\ No newline at end of file
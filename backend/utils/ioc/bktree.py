@@ -0,0 +1,117 @@
+"""
+BK-tree over domain names for typosquat and lookalike searches.
+
+A BK-tree stores each word under its parent at an edge labelled with their
+edit distance. By the triangle inequality, a search for words within k of a
+query only has to descend into edges labelled d-k..d+k, where d is the
+query's distance to the current node, so most of the tree is never visited
+for small k.
+"""
+from typing import Dict, List, Optional, Tuple
+
+
+def levenshtein(a: str, b: str) -> int:
+    """
+    Compute the edit distance between two strings.
+
+    Args:
+        a: First string
+        b: Second string
+
+    Returns:
+        Number of single character insertions, deletions and substitutions
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+class _Node:
+    __slots__ = ('word', 'ids', 'children')
+
+    def __init__(self, word: str, ioc_id: int):
+        self.word = word
+        self.ids = [ioc_id]
+        self.children: Dict[int, '_Node'] = {}
+
+
+class BKTree:
+    """Metric index of words under Levenshtein distance, built incrementally."""
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, word: str, ioc_id: int):
+        if self._root is None:
+            self._root = _Node(word, ioc_id)
+            self._size += 1
+            return
+        node = self._root
+        while True:
+            distance = levenshtein(word, node.word)
+            if distance == 0:
+                if ioc_id not in node.ids:
+                    node.ids.append(ioc_id)
+                    self._size += 1
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(word, ioc_id)
+                self._size += 1
+                return
+            node = child
+
+    def remove(self, word: str, ioc_id: int):
+        """
+        Remove an id from a word. The node stays in place to keep the tree
+        valid and is skipped by searches until the next rebuild.
+        """
+        node = self._root
+        while node is not None:
+            distance = levenshtein(word, node.word)
+            if distance == 0:
+                if ioc_id in node.ids:
+                    node.ids.remove(ioc_id)
+                    self._size -= 1
+                return
+            node = node.children.get(distance)
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str, List[int]]]:
+        """
+        Find the stored words within max_distance edits of a word.
+
+        Args:
+            word: Word to search around
+            max_distance: Largest edit distance to return
+
+        Returns:
+            List of (distance, stored word, ioc ids), closest first
+        """
+        if self._root is None:
+            return []
+        results = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = levenshtein(word, node.word)
+            if distance <= max_distance and node.ids:
+                results.append((distance, node.word, list(node.ids)))
+            # Copy the edges, a concurrent add() may grow the dictionary
+            for edge, child in list(node.children.items()):
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        results.sort()
+        return results
@@ -6,8 +6,11 @@ This module provides functionality to detect the type of IoCs
 """
 from enum import Enum, auto
 from typing import List, Dict, Union, Optional
+import ipaddress
 import re
 
+from .suffix import is_known_tld
+
 
 class IoC_Type(Enum):
     """Enumeration of supported IoC types."""
@@ -15,6 +18,8 @@ class IoC_Type(Enum):
     HASH_SHA1 = auto()
     HASH_SHA256 = auto()
     IP_ADDRESS = auto()
+    IPV6_ADDRESS = auto()
+    IP_RANGE = auto()  # IPv4 or IPv6 network in CIDR notation
     DOMAIN = auto()
     URL = auto()
     EMAIL = auto()
@@ -28,8 +33,8 @@ IOC_PATTERNS = {
     IoC_Type.HASH_SHA1: re.compile(r'^[a-fA-F0-9]{40}$'),
     IoC_Type.HASH_SHA256: re.compile(r'^[a-fA-F0-9]{64}$'),
     IoC_Type.IP_ADDRESS: re.compile(r'^(?:(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)\.){3}(?:25[0-5]|2[0-4][0-9]|[01]?[0-9][0-9]?)$'),
-    # Updated domain regex to match TLDs of any length (2 or more characters)
-    IoC_Type.DOMAIN: re.compile(r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,}$'),
+    # Label syntax only, the TLD itself is checked against the public suffix list
+    IoC_Type.DOMAIN: re.compile(r'^(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+(?:[a-zA-Z]{2,63}|xn--[a-zA-Z0-9-]{1,59})$'),
     IoC_Type.URL: re.compile(r'^(?:https?://)?(?:[-\w.]|(?:%[\da-fA-F]{2}))+(/[^/\s]*)*$'),
     IoC_Type.EMAIL: re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'),
     IoC_Type.REGISTRY_KEY: re.compile(r'^(HKLM|HKCU|HKCR|HKU|HKCC)\\'),
@@ -41,6 +46,8 @@ IOC_TYPE_NAMES = {
     IoC_Type.HASH_SHA1: "SHA1 Hash",
     IoC_Type.HASH_SHA256: "SHA256 Hash",
     IoC_Type.IP_ADDRESS: "IP Address",
+    IoC_Type.IPV6_ADDRESS: "IPv6 Address",
+    IoC_Type.IP_RANGE: "IP Range",
     IoC_Type.DOMAIN: "Domain",
     IoC_Type.URL: "URL",
     IoC_Type.EMAIL: "Email Address",
@@ -48,12 +55,31 @@ IOC_TYPE_NAMES = {
     IoC_Type.UNKNOWN: "Unknown"
 }
 
-# Common TLDs for domain detection
-COMMON_TLDS = {
-    'com', 'org', 'net', 'edu', 'gov', 'mil', 'int', 'io', 'co', 
-    'info', 'biz', 'name', 'pro', 'museum', 'us', 'uk', 'ca', 'au', 
-    'de', 'fr', 'jp', 'ru', 'cn', 'in', 'br', 'eu', 'fi'
-}
+
+def is_valid_domain(value: str) -> bool:
+    """Check whether a value is a domain name under a known public suffix."""
+    return bool(IOC_PATTERNS[IoC_Type.DOMAIN].match(value)) and is_known_tld(value.rsplit('.', 1)[-1])
+
+
+def is_ipv6_address(value: str) -> bool:
+    """Check whether a value is an IPv6 address."""
+    if ':' not in value:
+        return False
+    try:
+        ipaddress.IPv6Address(value)
+    except ValueError:
+        return False
+    return True
+
+
+def is_ip_range(value: str) -> bool:
+    """Check whether a value is an IPv4 or IPv6 network in CIDR notation."""
+    address, separator, prefix = value.partition('/')
+    if not separator or not prefix.isdigit():
+        return False
+    if IOC_PATTERNS[IoC_Type.IP_ADDRESS].match(address):
+        return int(prefix) <= 32
+    return is_ipv6_address(address) and int(prefix) <= 128
 
 
 def detect_ioc_type(ioc_value: str) -> IoC_Type:
@@ -75,13 +101,17 @@ def detect_ioc_type(ioc_value: str) -> IoC_Type:
     if cleaned_value.startswith(('http://', 'https://')):
         cleaned_value = re.sub(r'^https?://', '', cleaned_value)
     
+    # Check for CIDR ranges before URLs, '10.0.0.0/8' would look like a path
+    if is_ip_range(cleaned_value):
+        return IoC_Type.IP_RANGE
+    
     # Check for URL (includes cases like domain.com/path)
     if '/' in cleaned_value:
         # Split to get the domain part
         domain_part = cleaned_value.split('/', 1)[0]
         
         # Check if the domain part looks like a valid domain
-        if IOC_PATTERNS[IoC_Type.DOMAIN].match(domain_part):
+        if is_valid_domain(domain_part):
             return IoC_Type.URL
         
         # Also check if it matches the URL pattern
@@ -100,6 +130,9 @@ def detect_ioc_type(ioc_value: str) -> IoC_Type:
     if IOC_PATTERNS[IoC_Type.IP_ADDRESS].match(cleaned_value):
         return IoC_Type.IP_ADDRESS
     
+    if is_ipv6_address(cleaned_value):
+        return IoC_Type.IPV6_ADDRESS
+    
     # Check for hash values
     if IOC_PATTERNS[IoC_Type.HASH_MD5].match(cleaned_value):
         return IoC_Type.HASH_MD5
@@ -110,28 +143,11 @@ def detect_ioc_type(ioc_value: str) -> IoC_Type:
     if IOC_PATTERNS[IoC_Type.HASH_SHA256].match(cleaned_value):
         return IoC_Type.HASH_SHA256
     
-    # Check for domains with the standard regex pattern first
-    if IOC_PATTERNS[IoC_Type.DOMAIN].match(cleaned_value):
+    # Domains must end in a TLD from the public suffix list, so file names
+    # such as 'invoice.pdf' or 'LockBit_Ransom.exe' are not mistaken for them
+    if is_valid_domain(cleaned_value):
         return IoC_Type.DOMAIN
     
-    # Improved domain detection for edge cases
-    domain_parts = cleaned_value.split('.')
-    if len(domain_parts) >= 2:
-        # Check if the TLD is valid (2 or more chars)
-        tld = domain_parts[-1].lower()
-        if len(tld) >= 2:
-            # Check if all domain parts look valid
-            valid_domain = True
-            for part in domain_parts:
-                if not part or part.startswith('-') or part.endswith('-') or not all(c.isalnum() or c == '-' for c in part):
-                    valid_domain = False
-                    break
-            
-            if valid_domain:
-                # Additional validation - domain parts must follow standard domain naming rules
-                if all(re.match(r'^[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?$', part) for part in domain_parts[:-1]):
-                    return IoC_Type.DOMAIN
-    
     return IoC_Type.UNKNOWN
 
 
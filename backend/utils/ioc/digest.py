@@ -0,0 +1,41 @@
+"""
+Binary digest helpers for hash IoCs.
+
+MD5, SHA1 and SHA256 IoCs are stored and indexed as raw 16, 20 and 32 byte
+digests instead of hex text, halving the size of their keys. These helpers
+convert between the hex form used at the API boundary and the binary form
+used in the database.
+"""
+from typing import Optional
+
+from .detector import IOC_PATTERNS, IoC_Type
+
+HASH_TYPES_BY_LENGTH = {
+    32: IoC_Type.HASH_MD5,
+    40: IoC_Type.HASH_SHA1,
+    64: IoC_Type.HASH_SHA256,
+}
+
+
+def hash_digest(value: Optional[str]) -> Optional[bytes]:
+    """
+    Convert a hex hash value to its binary digest.
+
+    Args:
+        value: The IoC value, possibly with surrounding whitespace
+
+    Returns:
+        The raw digest bytes, or None if the value is not an MD5/SHA1/SHA256 hash
+    """
+    if not value:
+        return None
+    value = value.strip()
+    hash_type = HASH_TYPES_BY_LENGTH.get(len(value))
+    if hash_type is None or not IOC_PATTERNS[hash_type].match(value):
+        return None
+    return bytes.fromhex(value)
+
+
+def digest_hex(digest: bytes) -> str:
+    """Convert a binary digest back to lowercase hex."""
+    return digest.hex()
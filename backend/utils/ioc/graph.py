@@ -0,0 +1,188 @@
+"""
+IoC co-occurrence graph for pivoting between indicators.
+
+Two IoCs are adjacent when they appear in the same report, weighted by the
+number of reports they share. The adjacency is stored in compressed sparse
+row form: one array of neighbour ids and one of weights for all IoCs, plus
+per-IoC offsets into them, so millions of edges cost a few bytes each
+instead of a dictionary entry each.
+
+Report membership changes are applied incrementally as weight deltas in a
+small overlay, which is folded back into the arrays once it grows past a
+fraction of the base size. Folding publishes the new arrays and the emptied
+overlay together, so a reader never counts an overlay edge twice; writes
+must still not run alongside reads (IndexHolder serializes them).
+"""
+from array import array
+from itertools import combinations
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+# Fold the overlay into the arrays once it holds this many entries, or this
+# fraction of the base edges, whichever is larger
+COMPACT_MIN_ENTRIES = 100000
+COMPACT_RATIO = 0.25
+
+# (ioc ids) -> {ioc id: {neighbour id: shared reports}}
+NeighbourSource = Callable[[Set[int]], Dict[int, Dict[int, int]]]
+
+
+class CooccurrenceGraph:
+    """Weighted IoC adjacency, see the module docstring for the layout."""
+
+    def __init__(self):
+        # ((row of each IoC, offsets, neighbour ids, weights), overlay), swapped
+        # as one tuple so the overlay always matches the arrays it applies to
+        self._state = (({}, array('Q', [0]), array('I'), array('I')), {})
+        self._delta_size = 0
+        self._reports: Dict[int, FrozenSet[int]] = {}
+
+    @property
+    def edge_count(self) -> int:
+        """Number of directed base edges, excluding the pending overlay."""
+        return len(self._state[0][2])
+
+    @classmethod
+    def build(cls, memberships: Iterable[Tuple[int, int]]) -> 'CooccurrenceGraph':
+        """
+        Build the graph from (report id, ioc id) pairs.
+
+        Cost is the sum of squared report sizes, the number of edges written.
+        """
+        graph = cls()
+        reports: Dict[int, Set[int]] = {}
+        for report_id, ioc_id in memberships:
+            reports.setdefault(report_id, set()).add(ioc_id)
+
+        edges: Dict[int, Dict[int, int]] = {}
+        for report_id, members in reports.items():
+            graph._reports[report_id] = frozenset(members)
+            for a in members:
+                row = edges.setdefault(a, {})
+                for b in members:
+                    if b != a:
+                        row[b] = row.get(b, 0) + 1
+        graph._state = (cls._layout(edges), {})
+        return graph
+
+    @staticmethod
+    def _layout(edges: Dict[int, Dict[int, int]]) -> tuple:
+        rows, offsets, neighbours, weights = {}, array('Q', [0]), array('I'), array('I')
+        for row, ioc_id in enumerate(sorted(edges)):
+            rows[ioc_id] = row
+            items = sorted((b, w) for b, w in edges[ioc_id].items() if w > 0)
+            neighbours.extend(b for b, _ in items)
+            weights.extend(w for _, w in items)
+            offsets.append(len(neighbours))
+        return rows, offsets, neighbours, weights
+
+    def neighbours(self, ioc_id: int) -> Dict[int, int]:
+        """Map of neighbour id -> number of shared reports."""
+        (rows, offsets, neighbours, weights), overlay = self._state
+        result = {}
+        row = rows.get(ioc_id)
+        if row is not None:
+            start, end = offsets[row], offsets[row + 1]
+            result = dict(zip(neighbours[start:end], weights[start:end]))
+        delta = overlay.get(ioc_id)
+        if delta:
+            for b, change in list(delta.items()):
+                weight = result.get(b, 0) + change
+                if weight > 0:
+                    result[b] = weight
+                else:
+                    result.pop(b, None)
+        return result
+
+    def _bump(self, a: int, b: int, change: int):
+        overlay = self._state[1]
+        for x, y in ((a, b), (b, a)):
+            row = overlay.setdefault(x, {})
+            if y not in row:
+                self._delta_size += 1
+            row[y] = row.get(y, 0) + change
+
+    def set_report(self, report_id: int, ioc_ids: Iterable[int]):
+        """
+        Replace the IoC set of one report, adjusting only the affected edges.
+
+        Cost is O(report size x changed members).
+        """
+        new = frozenset(ioc_ids)
+        old = self._reports.get(report_id, frozenset())
+        if new == old:
+            return
+        added, removed, kept = new - old, old - new, old & new
+        for a in added:
+            for b in kept:
+                self._bump(a, b, 1)
+        for a, b in combinations(added, 2):
+            self._bump(a, b, 1)
+        for a in removed:
+            for b in kept:
+                self._bump(a, b, -1)
+        for a, b in combinations(removed, 2):
+            self._bump(a, b, -1)
+
+        if new:
+            self._reports[report_id] = new
+        else:
+            self._reports.pop(report_id, None)
+        if self._delta_size > max(COMPACT_MIN_ENTRIES, COMPACT_RATIO * self.edge_count):
+            self.compact()
+
+    def remove_member(self, report_id: int, ioc_id: int):
+        report = self._reports.get(report_id)
+        if report is not None and ioc_id in report:
+            self.set_report(report_id, report - {ioc_id})
+
+    def compact(self):
+        """Fold the overlay into the arrays."""
+        csr, overlay = self._state
+        edges = {ioc_id: self.neighbours(ioc_id) for ioc_id in set(csr[0]) | set(overlay)}
+        self._state = (self._layout(edges), {})
+        self._delta_size = 0
+
+    def source(self, frontier: Set[int]) -> Dict[int, Dict[int, int]]:
+        """Adjacency of a set of IoCs, as a NeighbourSource for k_hop_neighbours."""
+        return {ioc_id: self.neighbours(ioc_id) for ioc_id in frontier}
+
+
+def k_hop_neighbours(ioc_id: int, hops: int, source: NeighbourSource, min_weight: int = 1,
+                     limit: int = 100, max_nodes: int = 100000) -> List[Tuple[int, int, int]]:
+    """
+    Breadth-first search for the IoCs within a number of hops of an IoC.
+
+    Args:
+        ioc_id: IoC to start from
+        hops: Largest number of hops to follow
+        source: Returns the weighted adjacency of a frontier of IoCs
+        min_weight: Ignore edges with fewer shared reports
+        limit: Largest number of results
+        max_nodes: Stop expanding once this many IoCs have been reached
+
+    Returns:
+        List of (ioc id, hops, weight) ordered by hops then weight. The weight
+        of a direct neighbour is its number of shared reports; further out it
+        is the strongest path's weakest edge.
+    """
+    reached = {ioc_id: (0, float('inf'))}
+    frontier = {ioc_id}
+    for hop in range(1, hops + 1):
+        adjacency = source(frontier)
+        found: Dict[int, int] = {}
+        for a in frontier:
+            through = reached[a][1]
+            for b, weight in adjacency.get(a, {}).items():
+                if weight < min_weight or b in reached:
+                    continue
+                weight = min(through, weight)
+                if weight > found.get(b, 0):
+                    found[b] = weight
+        for b, weight in found.items():
+            reached[b] = (hop, weight)
+        frontier = set(found)
+        if not frontier or len(reached) > max_nodes:
+            break
+
+    results = sorted((hop, -weight, b) for b, (hop, weight) in reached.items() if b != ioc_id)
+    return [(b, hop, -negative) for hop, negative, b in results[:limit]]
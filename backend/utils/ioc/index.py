@@ -0,0 +1,343 @@
+"""
+In-memory indicator index for high volume lookups.
+
+This module provides an index over stored IoC values that answers
+"is this observable a known IoC" without touching the database:
+- hashes live in a hash map keyed by the lowercase hex digest
+- domains live in a reversed-label trie, so a lookup for a host also finds
+  every stored parent domain in O(labels); the hosts of stored URLs live in
+  a second trie, so a host also finds the URLs stored on it or its parents
+- IPv4 addresses live in a sorted integer array searched with bisect
+- domains are also kept in a BK-tree for lookalike (edit distance) searches
+- CIDR ranges live in a NetworkIndex, so an address also finds every stored
+  range containing it
+- everything else (URLs, emails, registry keys...) is matched exactly
+"""
+import ipaddress
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .defang import refang
+from .bktree import BKTree
+from .detector import IoC_Type, detect_ioc_type
+from .ranges import NetworkIndex
+
+
+HASH_TYPES = {IoC_Type.HASH_MD5, IoC_Type.HASH_SHA1, IoC_Type.HASH_SHA256}
+IP_TYPES = {IoC_Type.IP_ADDRESS, IoC_Type.IPV6_ADDRESS, IoC_Type.IP_RANGE}
+
+# Key under which a trie node stores the ids of IoCs ending at that node.
+# Domain labels are never empty, so it cannot clash with a child label.
+_TERMINAL = ''
+
+
+def normalize_indicator(value: str) -> Tuple[str, IoC_Type]:
+    """
+    Refang and canonicalize an indicator value.
+
+    Args:
+        value: Raw, possibly defanged, indicator value
+
+    Returns:
+        Tuple of the normalized value and its detected IoC_Type
+    """
+    value = refang(value.strip())
+    ioc_type = detect_ioc_type(value)
+
+    if ioc_type in HASH_TYPES or ioc_type in (IoC_Type.DOMAIN, IoC_Type.EMAIL):
+        value = value.lower().rstrip('.')
+    elif ioc_type == IoC_Type.IP_ADDRESS:
+        value = '.'.join(str(int(octet)) for octet in value.split('.'))
+    elif ioc_type == IoC_Type.IPV6_ADDRESS:
+        value = str(ipaddress.IPv6Address(value))
+    elif ioc_type == IoC_Type.IP_RANGE:
+        address, _, prefix = value.partition('/')
+        if ':' not in address:
+            address = '.'.join(str(int(octet)) for octet in address.split('.'))
+        value = ipaddress.ip_network(f'{address}/{prefix}', strict=False).with_prefixlen
+    elif ioc_type == IoC_Type.URL:
+        value = _normalize_url(value)
+
+    return value, ioc_type
+
+
+def indicator_host(value: Optional[str]) -> Optional[str]:
+    """
+    Get the host a domain, URL or email indicator refers to.
+
+    Args:
+        value: Raw, possibly defanged, indicator value
+
+    Returns:
+        The lowercase domain, URL host or email domain, or None for other types
+    """
+    if not value:
+        return None
+    normalized, ioc_type = normalize_indicator(value)
+    if ioc_type == IoC_Type.DOMAIN:
+        return normalized
+    if ioc_type == IoC_Type.URL:
+        return url_host(normalized)
+    if ioc_type == IoC_Type.EMAIL:
+        return normalized.rpartition('@')[2]
+    return None
+
+
+def to_network(value: Optional[str]) -> Optional[str]:
+    """
+    Convert an IP or CIDR indicator to its canonical network.
+
+    Single addresses become /32 or /128 networks, so every IP IoC can be
+    stored in one inet/cidr column.
+
+    Args:
+        value: Raw, possibly defanged, indicator value
+
+    Returns:
+        Network in CIDR notation, e.g. '10.0.0.0/8', or None for other types
+    """
+    if not value:
+        return None
+    normalized, ioc_type = normalize_indicator(value)
+    if ioc_type not in IP_TYPES:
+        return None
+    return ipaddress.ip_network(normalized, strict=False).with_prefixlen
+
+
+def ipv4_to_int(address: str) -> int:
+    """Convert a dotted IPv4 address to an integer, tolerating leading zeros."""
+    result = 0
+    for octet in address.split('.'):
+        result = (result << 8) | int(octet)
+    return result
+
+
+def _normalize_url(url: str) -> str:
+    """Lowercase the scheme and host of a URL, leaving the path untouched."""
+    scheme, separator, rest = url.partition('://')
+    if not separator:
+        scheme, rest = '', url
+    host, slash, path = rest.partition('/')
+    prefix = f'{scheme.lower()}://' if separator else ''
+    return f'{prefix}{host.lower()}{slash}{path}'
+
+
+def url_host(url: str) -> Optional[str]:
+    """Extract the lowercase host of a URL, with or without a scheme."""
+    if '://' not in url:
+        url = f'http://{url}'
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return None
+    return host.rstrip('.') if host else None
+
+
+class DomainTrie:
+    """A trie over reversed domain labels (com -> evil -> www)."""
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, domain: str, ioc_id: int):
+        node = self._root
+        for label in reversed(domain.split('.')):
+            node = node.setdefault(label, {})
+        ids = node.setdefault(_TERMINAL, [])
+        if ioc_id not in ids:
+            ids.append(ioc_id)
+            self._size += 1
+
+    def remove(self, domain: str, ioc_id: int):
+        path = [self._root]
+        for label in reversed(domain.split('.')):
+            node = path[-1].get(label)
+            if node is None:
+                return
+            path.append(node)
+        ids = path[-1].get(_TERMINAL, [])
+        if ioc_id not in ids:
+            return
+        ids.remove(ioc_id)
+        self._size -= 1
+        if not ids:
+            del path[-1][_TERMINAL]
+        # Prune nodes left without children or ids
+        labels = list(reversed(domain.split('.')))
+        for depth in range(len(labels), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][labels[depth - 1]]
+
+    def match(self, host: str) -> List[Tuple[str, List[int]]]:
+        """
+        Find the host and every parent domain of it that is stored.
+
+        Args:
+            host: Lowercase host name, e.g. 'a.b.evil.com'
+
+        Returns:
+            List of (stored domain, ioc ids), most specific first
+        """
+        labels = list(reversed(host.split('.')))
+        matches = []
+        node = self._root
+        for depth, label in enumerate(labels, 1):
+            node = node.get(label)
+            if node is None:
+                break
+            if _TERMINAL in node:
+                matches.append(('.'.join(reversed(labels[:depth])), node[_TERMINAL]))
+        matches.reverse()
+        return matches
+
+
+class IndicatorIndex:
+    """Index of stored IoC values, see the module docstring for the layout."""
+
+    def __init__(self):
+        self.hashes: Dict[str, List[int]] = {}
+        self.domains = DomainTrie()
+        self.url_hosts = DomainTrie()
+        self.domain_tree = BKTree()
+        self._ip_values = array('I')
+        self._ip_ids: List[int] = []
+        self.ranges = NetworkIndex()
+        self.exact: Dict[str, List[int]] = {}
+
+    def __len__(self):
+        return (sum(len(ids) for ids in self.hashes.values()) + len(self.domains)
+                + len(self._ip_ids) + len(self.ranges) + sum(len(ids) for ids in self.exact.values()))
+
+    @classmethod
+    def build(cls, rows: Iterable[Tuple[int, str]]) -> 'IndicatorIndex':
+        """
+        Build an index from (ioc id, value) pairs.
+
+        IPs are collected unsorted and sorted once at the end, which is much
+        cheaper than inserting them in order one by one.
+        """
+        index = cls()
+        ips = []
+        for ioc_id, value in rows:
+            normalized, ioc_type = normalize_indicator(value)
+            if ioc_type == IoC_Type.IP_ADDRESS:
+                ips.append((ipv4_to_int(normalized), ioc_id))
+            else:
+                index._add_normalized(ioc_id, normalized, ioc_type)
+        ips.sort()
+        index._ip_values = array('I', (ip for ip, _ in ips))
+        index._ip_ids = [ioc_id for _, ioc_id in ips]
+        return index
+
+    def add(self, ioc_id: int, value: str):
+        normalized, ioc_type = normalize_indicator(value)
+        if ioc_type == IoC_Type.IP_ADDRESS:
+            ip = ipv4_to_int(normalized)
+            position = bisect_left(self._ip_values, ip)
+            self._ip_values.insert(position, ip)
+            self._ip_ids.insert(position, ioc_id)
+        else:
+            self._add_normalized(ioc_id, normalized, ioc_type)
+
+    def _add_normalized(self, ioc_id: int, normalized: str, ioc_type: IoC_Type):
+        if ioc_type in HASH_TYPES:
+            self.hashes.setdefault(normalized, []).append(ioc_id)
+        elif ioc_type == IoC_Type.DOMAIN:
+            self.domains.add(normalized, ioc_id)
+            self.domain_tree.add(normalized, ioc_id)
+        elif ioc_type == IoC_Type.IP_RANGE:
+            self.ranges.add(normalized, ioc_id)
+        else:
+            self.exact.setdefault(normalized, []).append(ioc_id)
+            host = url_host(normalized) if ioc_type == IoC_Type.URL else None
+            if host:
+                self.url_hosts.add(host, ioc_id)
+
+    def remove(self, ioc_id: int, value: str):
+        """Remove one IoC, the reverse of add()."""
+        normalized, ioc_type = normalize_indicator(value)
+        if ioc_type == IoC_Type.IP_ADDRESS:
+            ip = ipv4_to_int(normalized)
+            position = bisect_left(self._ip_values, ip)
+            while position < len(self._ip_values) and self._ip_values[position] == ip:
+                if self._ip_ids[position] == ioc_id:
+                    del self._ip_values[position]
+                    del self._ip_ids[position]
+                    break
+                position += 1
+        elif ioc_type in HASH_TYPES:
+            _discard(self.hashes, normalized, ioc_id)
+        elif ioc_type == IoC_Type.DOMAIN:
+            self.domains.remove(normalized, ioc_id)
+            self.domain_tree.remove(normalized, ioc_id)
+        elif ioc_type == IoC_Type.IP_RANGE:
+            self.ranges.remove(normalized, ioc_id)
+        else:
+            _discard(self.exact, normalized, ioc_id)
+            host = url_host(normalized) if ioc_type == IoC_Type.URL else None
+            if host:
+                self.url_hosts.remove(host, ioc_id)
+
+    def lookup(self, value: str) -> List[Tuple[int, str, str]]:
+        """
+        Look up a single observable.
+
+        Args:
+            value: Raw, possibly defanged, observable
+
+        Returns:
+            List of (ioc id, match kind, matched value) where match kind is
+            'exact', 'host' (a stored domain is the host of the URL looked up),
+            'parent_domain', 'url_host' (a stored URL is on this host or a
+            parent of it) or 'range' (a stored CIDR range contains the address)
+        """
+        normalized, ioc_type = normalize_indicator(value)
+        hits = []
+
+        if ioc_type in HASH_TYPES:
+            hits.extend((ioc_id, 'exact', normalized) for ioc_id in self.hashes.get(normalized, ()))
+        elif ioc_type == IoC_Type.IP_ADDRESS:
+            ip = ipv4_to_int(normalized)
+            position = bisect_left(self._ip_values, ip)
+            while position < len(self._ip_values) and self._ip_values[position] == ip:
+                hits.append((self._ip_ids[position], 'exact', normalized))
+                position += 1
+        elif ioc_type == IoC_Type.IP_RANGE:
+            hits.extend((ioc_id, 'exact', normalized) for ioc_id in self.ranges.get(normalized))
+        else:
+            hits.extend((ioc_id, 'exact', normalized) for ioc_id in self.exact.get(normalized, ()))
+
+        if ioc_type in (IoC_Type.IP_ADDRESS, IoC_Type.IPV6_ADDRESS):
+            for network, ids in self.ranges.containing(normalized):
+                hits.extend((ioc_id, 'range', network) for ioc_id in ids)
+
+        host = normalized if ioc_type == IoC_Type.DOMAIN else None
+        if ioc_type == IoC_Type.URL:
+            host = url_host(normalized)
+        if host:
+            for domain, ids in self.domains.match(host):
+                if domain != host:
+                    kind = 'parent_domain'
+                else:
+                    kind = 'exact' if ioc_type == IoC_Type.DOMAIN else 'host'
+                hits.extend((ioc_id, kind, domain) for ioc_id in ids)
+            seen = {ioc_id for ioc_id, _, _ in hits}
+            for domain, ids in self.url_hosts.match(host):
+                hits.extend((ioc_id, 'url_host', domain) for ioc_id in ids if ioc_id not in seen)
+
+        return hits
+
+
+def _discard(mapping: Dict[str, List[int]], key: str, ioc_id: int):
+    ids = mapping.get(key)
+    if ids and ioc_id in ids:
+        ids.remove(ioc_id)
+        if not ids:
+            del mapping[key]
@@ -0,0 +1,80 @@
+"""
+MinHash signatures and LSH banding over IoC sets.
+
+A MinHash signature keeps, for each of NUM_PERM hash functions, the minimum
+hash over a set. The fraction of positions where two signatures agree is an
+unbiased estimate of the Jaccard similarity of the sets.
+
+For LSH the signature is cut into BANDS bands of ROWS values and each band is
+hashed to a bucket. Two sets share at least one bucket with probability
+1 - (1 - J^ROWS)^BANDS, an S-curve around (1 / BANDS)^(1 / ROWS) ~= 0.29, so
+candidates are found by bucket equality instead of comparing every pair.
+"""
+import struct
+from hashlib import blake2b
+from typing import Iterable, List, Optional
+
+ROWS = 3
+BANDS = 42
+NUM_PERM = ROWS * BANDS
+
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_SIGNATURE = struct.Struct(f'<{NUM_PERM}I')
+
+
+def _coefficient(name: str) -> int:
+    return int.from_bytes(blake2b(name.encode('ascii'), digest_size=8).digest(), 'little') % (_PRIME - 1) + 1
+
+
+# Derived from fixed names rather than a PRNG: stored signatures must stay
+# comparable across processes and Python releases
+_PERMUTATIONS = [(_coefficient(f'a{i}'), _coefficient(f'b{i}')) for i in range(NUM_PERM)]
+
+
+def _element_hash(value: str) -> int:
+    return int.from_bytes(blake2b(value.encode('utf-8'), digest_size=4).digest(), 'little')
+
+
+def minhash_signature(values: Iterable[str]) -> Optional[List[int]]:
+    """
+    Compute the MinHash signature of a set of values.
+
+    Args:
+        values: Canonical set members, e.g. normalized IoC values
+
+    Returns:
+        NUM_PERM minimum hashes, or None for an empty set
+    """
+    hashes = {_element_hash(value) for value in values}
+    if not hashes:
+        return None
+    return [min((a * h + b) % _PRIME for h in hashes) & _MAX_HASH for a, b in _PERMUTATIONS]
+
+
+def lsh_buckets(signature: List[int]) -> List[int]:
+    """
+    Hash each band of a signature to a bucket.
+
+    Returns:
+        One signed 63-bit bucket key per band, index = band number
+    """
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        digest = blake2b(struct.pack(f'<{ROWS}I', *rows), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'little') >> 1)
+    return buckets
+
+
+def estimate_jaccard(a: List[int], b: List[int]) -> float:
+    """Estimate the Jaccard similarity of two sets from their signatures."""
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def pack_signature(signature: List[int]) -> bytes:
+    return _SIGNATURE.pack(*signature)
+
+
+def unpack_signature(data: bytes) -> List[int]:
+    return list(_SIGNATURE.unpack(data))
@@ -0,0 +1,145 @@
+"""
+Interval index over IP networks for range-containment lookups.
+
+CIDR blocks are laminar: two networks are either disjoint or one contains
+the other. Sorting them by (start, -end) therefore places every network
+after the networks enclosing it, and the networks containing an address
+are exactly the ancestors of the last network starting at or before it.
+A lookup is one bisect plus a walk up at most one parent per prefix
+length, instead of a scan over every stored range.
+
+IPv4 and IPv6 networks are kept in separate families since their integer
+spaces overlap.
+"""
+import ipaddress
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Tuple
+
+
+def covering_networks(address: str) -> List[str]:
+    """
+    List every network that could contain an address, one per prefix length.
+
+    A containment query then becomes an exact-match IN query over an
+    ordinary B-tree index.
+    """
+    address = ipaddress.ip_address(address)
+    return [ipaddress.ip_network(f'{address}/{prefix}', strict=False).with_prefixlen
+            for prefix in range(address.max_prefixlen + 1)]
+
+
+class _Family:
+    """Sorted, parent-linked networks of one IP version."""
+
+    def __init__(self):
+        self.networks: Dict[str, List[int]] = {}
+        # (starts, ends, names, parents), swapped in as one tuple so readers
+        # never see a half rebuilt layout
+        self._sorted = ([], [], [], [])
+        # Changes to the set of networks, and how many the layout reflects.
+        # A counter rather than a flag: networks added while a rebuild reads
+        # the dictionary leave the layout behind instead of being lost
+        self.changes = 0
+        self._sorted_changes = 0
+        self._rebuild_lock = threading.Lock()
+
+    def __getstate__(self):
+        # Locks cannot be pickled, e.g. to send a retro-hunt watchlist to worker processes
+        state = self.__dict__.copy()
+        del state['_rebuild_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rebuild_lock = threading.Lock()
+
+    def mark_changed(self):
+        self.changes += 1
+
+    def _rebuild(self):
+        changes = self.changes
+        entries = []
+        for name in list(self.networks):
+            network = ipaddress.ip_network(name)
+            entries.append((int(network.network_address), -int(network.broadcast_address), name))
+        entries.sort()
+
+        starts = [start for start, _, _ in entries]
+        ends = [-end for _, end, _ in entries]
+        names = [name for _, _, name in entries]
+        # The parent of a network is the closest preceding one enclosing it
+        parents = []
+        stack = []
+        for position, end in enumerate(ends):
+            while stack and ends[stack[-1]] < end:
+                stack.pop()
+            parents.append(stack[-1] if stack else -1)
+            stack.append(position)
+        self._sorted = (starts, ends, names, parents)
+        self._sorted_changes = changes
+
+    def containing(self, address: int) -> List[Tuple[str, List[int]]]:
+        if self._sorted_changes != self.changes:
+            # Concurrent readers wait for one rebuild instead of each sorting
+            with self._rebuild_lock:
+                if self._sorted_changes != self.changes:
+                    self._rebuild()
+        starts, ends, names, parents = self._sorted
+        matches = []
+        position = bisect_right(starts, address) - 1
+        while position >= 0:
+            if ends[position] >= address:
+                matches.append((names[position], self.networks.get(names[position], [])))
+            position = parents[position]
+        return matches
+
+
+class NetworkIndex:
+    """Index of IP networks answering "which stored ranges contain this address"."""
+
+    def __init__(self):
+        self._families = {4: _Family(), 6: _Family()}
+
+    def __len__(self):
+        return sum(len(ids) for family in self._families.values() for ids in family.networks.values())
+
+    def add(self, network: str, ioc_id: int):
+        network = ipaddress.ip_network(network, strict=False)
+        family = self._families[network.version]
+        ids = family.networks.get(network.with_prefixlen)
+        if ids is None:
+            family.networks[network.with_prefixlen] = [ioc_id]
+            # Re-sorted lazily, so bulk loads cost a single sort
+            family.mark_changed()
+        elif ioc_id not in ids:
+            ids.append(ioc_id)
+
+    def remove(self, network: str, ioc_id: int):
+        network = ipaddress.ip_network(network, strict=False)
+        family = self._families[network.version]
+        ids = family.networks.get(network.with_prefixlen)
+        if not ids or ioc_id not in ids:
+            return
+        ids.remove(ioc_id)
+        if not ids:
+            del family.networks[network.with_prefixlen]
+            family.mark_changed()
+
+    def get(self, network: str) -> List[int]:
+        """Ids of the IoCs stored for exactly this network."""
+        network = ipaddress.ip_network(network, strict=False)
+        return self._families[network.version].networks.get(network.with_prefixlen, [])
+
+    def containing(self, address: str) -> List[Tuple[str, List[int]]]:
+        """
+        Find the stored networks containing an address.
+
+        Args:
+            address: IPv4 or IPv6 address
+
+        Returns:
+            List of (network, ioc ids), most specific first
+        """
+        address = ipaddress.ip_address(address)
+        return self._families[address.version].containing(int(address))
@@ -0,0 +1,288 @@
+"""
+Compact binary indicator snapshots for offline sensors.
+
+A snapshot packs the indicator set into one file that can be memory-mapped
+and binary-searched in place, without parsing or copying it:
+
+    header    magic, format version, flags, data version, base version,
+              section count
+    sections  table of (kind, record width, record count, offset, length)
+    data      one block per section
+
+Fixed-width sections hold sorted raw records: MD5, SHA1 and SHA256 digests
+and IPv4 addresses as 4 big-endian bytes, so byte order equals numeric
+order. Variable-width sections (domains and other exact values) hold a
+little-endian uint32 offset table followed by the sorted UTF-8 strings.
+Domains are stored with their labels reversed ('com.evil.www') so a host and
+all of its parents are found with one binary search per label.
+
+A delta snapshot carries the same sections for values added since its base
+and REMOVED sections for values deleted since then. merge_delta() applies
+it to a full snapshot to produce the next full snapshot.
+
+Example:
+    with SnapshotReader('iocs.snap') as snapshot:
+        'evil.com' in snapshot
+        snapshot.match_domain('a.b.evil.com')
+"""
+import json
+import mmap
+import struct
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from .detector import IoC_Type
+from .index import HASH_TYPES, ipv4_to_int, normalize_indicator, url_host
+
+MAGIC = b'OSHSNAP1'
+FORMAT_VERSION = 1
+FLAG_DELTA = 0x1
+
+HEADER = struct.Struct('<8sHHQQI4x')
+SECTION = struct.Struct('<HHIQQ')
+OFFSET = struct.Struct('<I')
+
+# Section kinds
+MD5 = 1
+SHA1 = 2
+SHA256 = 3
+IPV4 = 4
+DOMAIN = 5
+OTHER = 6
+METADATA = 0x7F
+REMOVED = 0x80  # OR-ed with a kind for values removed in a delta
+
+FIXED_WIDTHS = {MD5: 16, SHA1: 20, SHA256: 32, IPV4: 4}
+DATA_KINDS = (MD5, SHA1, SHA256, IPV4, DOMAIN, OTHER)
+_HASH_KINDS = {IoC_Type.HASH_MD5: MD5, IoC_Type.HASH_SHA1: SHA1, IoC_Type.HASH_SHA256: SHA256}
+
+
+def encode_value(value: str):
+    """
+    Convert an indicator to its section kind and binary record.
+
+    Args:
+        value: Raw, possibly defanged, indicator value
+
+    Returns:
+        Tuple of (section kind, record bytes)
+    """
+    normalized, ioc_type = normalize_indicator(value)
+    if ioc_type in HASH_TYPES:
+        return _HASH_KINDS[ioc_type], bytes.fromhex(normalized)
+    if ioc_type == IoC_Type.IP_ADDRESS:
+        return IPV4, ipv4_to_int(normalized).to_bytes(4, 'big')
+    if ioc_type == IoC_Type.DOMAIN:
+        return DOMAIN, _reverse_labels(normalized).encode()
+    return OTHER, normalized.encode()
+
+
+def _reverse_labels(domain: str) -> str:
+    return '.'.join(reversed(domain.split('.')))
+
+
+def decode_record(kind: int, record: bytes) -> str:
+    """Convert a binary record back to its display value."""
+    kind &= ~REMOVED
+    if kind in (MD5, SHA1, SHA256):
+        return record.hex()
+    if kind == IPV4:
+        return '.'.join(str(octet) for octet in record)
+    if kind == DOMAIN:
+        return _reverse_labels(record.decode())
+    return record.decode()
+
+
+def _pack_section(kind: int, records: Iterable[bytes]) -> bytes:
+    records = sorted(set(records))
+    if kind & ~REMOVED in FIXED_WIDTHS:
+        return b''.join(records)
+    offsets = [0]
+    for record in records:
+        offsets.append(offsets[-1] + len(record))
+    return struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(records)
+
+
+def write_snapshot(out: BinaryIO, values: Iterable[str], data_version: int = 0,
+                   removed: Iterable[str] = (), base_version: Optional[int] = None,
+                   metadata: Optional[dict] = None):
+    """
+    Write a snapshot of an indicator set.
+
+    Args:
+        out: Binary file object to write to
+        values: Indicator values in the snapshot (added values for a delta)
+        data_version: Version of the data the snapshot reflects
+        removed: Values removed since base_version (deltas only)
+        base_version: Version a delta applies on top of; None writes a full snapshot
+        metadata: Optional JSON serializable metadata stored with the snapshot
+    """
+    records: Dict[int, List[bytes]] = {}
+    for value in values:
+        kind, record = encode_value(value)
+        records.setdefault(kind, []).append(record)
+    for value in removed:
+        kind, record = encode_value(value)
+        records.setdefault(kind | REMOVED, []).append(record)
+
+    blocks = []
+    for kind in sorted(records):
+        count = len(set(records[kind]))
+        blocks.append((kind, FIXED_WIDTHS.get(kind & ~REMOVED, 0), count, _pack_section(kind, records[kind])))
+    if metadata:
+        blocks.append((METADATA, 0, 1, json.dumps(metadata).encode()))
+
+    flags = FLAG_DELTA if base_version is not None else 0
+    _write_blocks(out, flags, data_version, base_version or 0, blocks)
+
+
+def _write_blocks(out: BinaryIO, flags: int, data_version: int, base_version: int, blocks: list):
+    out.write(HEADER.pack(MAGIC, FORMAT_VERSION, flags, data_version, base_version, len(blocks)))
+    offset = HEADER.size + SECTION.size * len(blocks)
+    for kind, width, count, data in blocks:
+        out.write(SECTION.pack(kind, width, count, offset, len(data)))
+        offset += len(data)
+    for _, _, _, data in blocks:
+        out.write(data)
+
+
+class _Section:
+    """A sorted section viewed in place inside the mapped file."""
+
+    def __init__(self, buffer, kind: int, width: int, count: int, offset: int, length: int):
+        self.buffer = buffer
+        self.kind = kind
+        self.width = width
+        self.count = count
+        self.offset = offset
+        self.length = length
+        # Variable-width records start after the (count + 1) offsets
+        self.blob = offset + OFFSET.size * (count + 1)
+
+    def record(self, position: int) -> bytes:
+        if self.width:
+            start = self.offset + position * self.width
+            return self.buffer[start:start + self.width]
+        start = OFFSET.unpack_from(self.buffer, self.offset + position * OFFSET.size)[0]
+        end = OFFSET.unpack_from(self.buffer, self.offset + (position + 1) * OFFSET.size)[0]
+        return self.buffer[self.blob + start:self.blob + end]
+
+    def __contains__(self, record: bytes) -> bool:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.record(middle) < record:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self.count and self.record(low) == record
+
+    def __iter__(self) -> Iterator[bytes]:
+        return (self.record(position) for position in range(self.count))
+
+
+class SnapshotReader:
+    """Memory-mapped, read-only view of a snapshot file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, format_version, flags, self.version, base_version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a supported indicator snapshot")
+        self.is_delta = bool(flags & FLAG_DELTA)
+        self.base_version = base_version if self.is_delta else None
+        self.metadata = {}
+        self._sections: Dict[int, _Section] = {}
+        for i in range(count):
+            kind, width, records, offset, length = SECTION.unpack_from(self._map, HEADER.size + i * SECTION.size)
+            if kind == METADATA:
+                self.metadata = json.loads(self._map[offset:offset + length])
+            else:
+                self._sections[kind] = _Section(self._map, kind, width, records, offset, length)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._sections = {}
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __len__(self):
+        return sum(section.count for kind, section in self._sections.items() if not kind & REMOVED)
+
+    def _has(self, kind: int, record: bytes) -> bool:
+        section = self._sections.get(kind)
+        return section is not None and record in section
+
+    def __contains__(self, value: str) -> bool:
+        kind, record = encode_value(value)
+        if self._has(kind, record):
+            return True
+        if kind == DOMAIN:
+            return bool(self.match_domain(decode_record(kind, record)))
+        return False
+
+    def match_domain(self, host: str) -> List[str]:
+        """
+        Find the stored domains equal to host or a parent of it.
+
+        Args:
+            host: Host name or URL
+
+        Returns:
+            Matching stored domains, most specific first
+        """
+        host = url_host(host) if '/' in host else host.lower().rstrip('.')
+        if not host:
+            return []
+        labels = list(reversed(host.split('.')))
+        matches = []
+        for depth in range(1, len(labels) + 1):
+            if self._has(DOMAIN, '.'.join(labels[:depth]).encode()):
+                matches.append('.'.join(reversed(labels[:depth])))
+        matches.reverse()
+        return matches
+
+    def records(self, kind: int) -> Iterator[bytes]:
+        """Iterate over the sorted records of a section."""
+        section = self._sections.get(kind)
+        return iter(section) if section is not None else iter(())
+
+    def values(self, kind: Optional[int] = None) -> Iterator[str]:
+        """Iterate over stored values, of one kind or of every data kind."""
+        for current in ([kind] if kind is not None else DATA_KINDS):
+            for record in self.records(current):
+                yield decode_record(current, record)
+
+
+def merge_delta(base: SnapshotReader, delta: SnapshotReader, out: BinaryIO):
+    """
+    Apply a delta snapshot to a full snapshot, writing the new full snapshot.
+
+    Raises:
+        ValueError: If the delta does not apply on top of this base
+    """
+    if base.is_delta or not delta.is_delta:
+        raise ValueError("merge_delta needs a full base snapshot and a delta")
+    if delta.base_version != base.version:
+        raise ValueError(f"Delta applies to version {delta.base_version}, base is version {base.version}")
+
+    blocks = []
+    for kind in DATA_KINDS:
+        removed = set(delta.records(kind | REMOVED))
+        # Copy records out of the maps so both files may be closed afterwards
+        records = {bytes(r) for r in base.records(kind) if r not in removed}
+        records.update(bytes(r) for r in delta.records(kind))
+        if records:
+            blocks.append((kind, FIXED_WIDTHS.get(kind, 0), len(records), _pack_section(kind, records)))
+    metadata = delta.metadata
+    if metadata:
+        blocks.append((METADATA, 0, 1, json.dumps(metadata).encode()))
+
+    _write_blocks(out, 0, delta.version, 0, blocks)
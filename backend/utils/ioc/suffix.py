@@ -0,0 +1,108 @@
+"""
+Public suffix list lookups for domain validation.
+
+The Mozilla public suffix list is bundled in data/public_suffix_list.dat and
+compiled on first use into frozen sets of rules, wildcard parents and
+exceptions, so no network access is needed and importing costs nothing.
+Finding the public suffix of a domain is then one set lookup per label,
+which is what lets the detector reject values such as 'LockBit_Ransom.exe'
+whose last label is not a TLD.
+
+To update the list, replace the bundled file with a fresh copy of
+https://publicsuffix.org/list/public_suffix_list.dat.
+"""
+import os
+from functools import lru_cache
+from typing import FrozenSet, Optional, Tuple
+
+SUFFIX_LIST_PATH = os.path.join(os.path.dirname(__file__), 'data', 'public_suffix_list.dat')
+
+
+def _punycode(rule: str) -> Optional[str]:
+    prefix = rule[:2] if rule.startswith('*.') else rule[:1] if rule.startswith('!') else ''
+    try:
+        return prefix + rule[len(prefix):].encode('idna').decode('ascii')
+    except UnicodeError:
+        return None
+
+
+def _compile(path: str) -> Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str], FrozenSet[str]]:
+    """Parse the list into (rules, wildcard parents, exceptions, TLDs)."""
+    rules, wildcards, exceptions, tlds = set(), set(), set(), set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            rule = line.split(None, 1)[0] if line.strip() else ''
+            if not rule or rule.startswith('//'):
+                continue
+            rule = rule.lower()
+            # IDN rules are listed in Unicode, the detector sees punycode
+            forms = {rule} if rule.isascii() else {rule, _punycode(rule)}
+            for form in filter(None, forms):
+                if form.startswith('!'):
+                    exceptions.add(form[1:])
+                elif form.startswith('*.'):
+                    wildcards.add(form[2:])
+                else:
+                    rules.add(form)
+                tlds.add(form.rsplit('.', 1)[-1])
+    return frozenset(rules), frozenset(wildcards), frozenset(exceptions), frozenset(tlds)
+
+
+@lru_cache(maxsize=None)
+def compiled_rules() -> Tuple[FrozenSet[str], FrozenSet[str], FrozenSet[str], FrozenSet[str]]:
+    """
+    The bundled list, compiled once.
+
+    Returns:
+        Tuple of (rules, wildcard parents, exceptions, top-level labels)
+    """
+    return _compile(SUFFIX_LIST_PATH)
+
+
+def public_suffix(domain: str) -> Optional[str]:
+    """
+    Find the public suffix of a domain, e.g. 'co.uk' for 'evil.co.uk'.
+
+    Args:
+        domain: Lowercase domain name without a trailing dot
+
+    Returns:
+        The longest matching public suffix, or None if the top-level label
+        is not a known TLD
+    """
+    rules, wildcards, exceptions, tlds = compiled_rules()
+    labels = domain.split('.')
+    if labels[-1] not in tlds:
+        return None
+    suffix_start = len(labels) - 1
+    for start in range(len(labels) - 2, -1, -1):
+        candidate = '.'.join(labels[start:])
+        if candidate in exceptions:
+            # An exception rule makes the name itself registrable
+            return '.'.join(labels[start + 1:])
+        if candidate in rules or '.'.join(labels[start + 1:]) in wildcards:
+            suffix_start = start
+    return '.'.join(labels[suffix_start:])
+
+
+def registrable_domain(domain: str) -> Optional[str]:
+    """
+    Get the registrable domain (public suffix plus one label) of a domain.
+
+    Args:
+        domain: Domain name, e.g. 'a.b.evil.co.uk'
+
+    Returns:
+        The registrable domain, e.g. 'evil.co.uk', or None if the domain is
+        itself a public suffix or has an unknown TLD
+    """
+    domain = domain.lower().rstrip('.')
+    suffix = public_suffix(domain)
+    if suffix is None or len(suffix) >= len(domain):
+        return None
+    return domain[:len(domain) - len(suffix) - 1].rsplit('.', 1)[-1] + '.' + suffix
+
+
+def is_known_tld(label: str) -> bool:
+    """Check whether a label is a top-level domain on the public suffix list."""
+    return label.lower() in compiled_rules()[3]
@@ -41,6 +41,16 @@ class KQLQueryGenerator:
             {"table": "DnsEvents", "fields": ["IPAddresses"]},
             {"table": "AzureNetworkAnalytics_CL", "fields": ["SrcIP_s", "DestIP_s"]}
         ],
+        IoC_Type.IPV6_ADDRESS: [
+            {"table": "CommonSecurityLog", "fields": ["SourceIP", "DestinationIP"]},
+            {"table": "DnsEvents", "fields": ["IPAddresses"]},
+            {"table": "DeviceNetworkEvents", "fields": ["RemoteIP"]}
+        ],
+        IoC_Type.IP_RANGE: [
+            {"table": "CommonSecurityLog", "fields": ["SourceIP", "DestinationIP"]},
+            {"table": "AzureNetworkAnalytics_CL", "fields": ["SrcIP_s", "DestIP_s"]},
+            {"table": "DeviceNetworkEvents", "fields": ["RemoteIP"]}
+        ],
         IoC_Type.DOMAIN: [
             {"table": "DnsEvents", "fields": ["Name"]},
             {"table": "CommonSecurityLog", "fields": ["RequestURL"]},
@@ -60,6 +70,33 @@ class KQLQueryGenerator:
         ]
     }
     
+    @classmethod
+    def all_tables(cls) -> List[str]:
+        """
+        List every table referenced by the mappings, in first-seen order.
+        
+        Returns:
+            List of table names
+        """
+        tables = {}
+        for mappings in cls.TABLE_MAPPINGS.values():
+            for mapping in mappings:
+                tables.setdefault(mapping["table"], None)
+        return list(tables)
+    
+    @staticmethod
+    def field_condition(field: str, value: str, ioc_type: IoC_Type) -> str:
+        """
+        Build the KQL condition matching one field against one escaped IoC value.
+        
+        Ranges are matched with ipv4_is_in_range / ipv6_is_in_range, every
+        other type with a case-insensitive equality.
+        """
+        if ioc_type == IoC_Type.IP_RANGE:
+            function = "ipv6_is_in_range" if ':' in value else "ipv4_is_in_range"
+            return f"{function}({field}, \"{value}\")"
+        return f"{field} =~ \"{value}\""
+    
     @classmethod
     def generate_query(cls, ioc_value: str, ioc_type: Optional[IoC_Type] = None, 
                       time_range: str = "ago(7d)", limit: int = 100) -> Dict[str, str]:
@@ -101,7 +138,7 @@ search in (CommonSecurityLog, DnsEvents, DeviceFileEvents, DeviceNetworkEvents,
                 table_name = mapping["table"]
                 fields = mapping["fields"]
                 
-                field_conditions = " or ".join([f"{field} =~ \"{escaped_value}\"" for field in fields])
+                field_conditions = " or ".join([cls.field_condition(field, escaped_value, ioc_type) for field in fields])
                 
                 query = f"""
 // IoC Type: {ioc_type.name}
@@ -202,7 +239,7 @@ search in (CommonSecurityLog, DnsEvents, DeviceFileEvents, DeviceNetworkEvents,
                 # Create KQL condition for multiple IoCs across fields
                 field_conditions = []
                 for field in fields:
-                    values_condition = " or ".join([f"{field} =~ \"{value}\"" for value in escaped_values])
+                    values_condition = " or ".join([cls.field_condition(field, value, type_name) for value in escaped_values])
                     if values_condition:
                         field_conditions.append(f"({values_condition})")
                 
@@ -0,0 +1,29 @@
+"""
+WSGI entry point for the production server.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master process, so the app and
+the in-memory indexes are built once and shared copy-on-write by every forked
+worker. The database must be migrated first (flask migrate). python app.py
+remains the debug server for development.
+"""
+from app import create_app
+from config import ProductionConfig
+from models import db
+from api.iocs.lookup import indicator_index
+from api.iocs.graph import cooccurrence_graph
+from utils.ioc.suffix import compiled_rules
+
+app = create_app(ProductionConfig)
+
+if app.config['SERVER_WARM_INDEXES']:
+    compiled_rules()
+    with app.app_context():
+        indicator_index.rebuild()
+        cooccurrence_graph.rebuild()
+
+# The master never queries again, drop the connections opened while loading
+with app.app_context():
+    for engine in db.engines.values():
+        engine.dispose()